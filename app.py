@@ -1,90 +1,56 @@
 # app_working.py
 import streamlit as st
 import datetime
-import uuid
-import random
-import requests
-import json
-import os
+import time
 from pathlib import Path
-from xml_generator import generate_pain001_xml, generate_pacs008_xml, is_iban_country
+from bulk import BulkJob
+from fx import PREFETCH_CURRENCIES, get_service
+from ids import DEFAULT_ID_GENERATOR
+from metrics import METRICS
+from schema_validation import is_available as schema_validation_available
+from payment_rules import (CURRENCIES, TAX_PERIOD_MONTHS, TAX_TYPE_CODES, get_current_datetime_with_offset,
+                           needs_exchange_rate, get_account_field_help, get_account_field_label)
+from xml_generator import generate_pain001_xml, generate_pacs008_xml
+from validation import validate_account_fields, validate_routing_fields, validate_usaba_fields, validate_tax_fields
 
 st.set_page_config(layout="wide", page_title="ISO 20022 XML Payment Generator")
 
-# Global cache for exchange rates
-_rate_cache = {}
+# Exchange-rate cache shared by all sessions (persisted to exchange_rate_cache.json)
 _cache_file = "exchange_rate_cache.json"
 
 
-def load_cache_from_file():
-    """Load cached rates from file on startup"""
-    global _rate_cache
-    try:
-        if os.path.exists(_cache_file):
-            with open(_cache_file, 'r') as f:
-                data = json.load(f)
-                _rate_cache = data
-    except Exception as e:
-        print(f"Could not load cache file: {e}")
-        _rate_cache = {}
-
-
-def save_cache_to_file():
-    """Save current cache to file"""
-    try:
-        with open(_cache_file, 'w') as f:
-            json.dump(_rate_cache, f, indent=2, default=str)
-    except Exception as e:
-        print(f"Could not save cache file: {e}")
-
-
-def update_cache(base_currency, rates_data, timestamp):
-    """Update cache with successful API response"""
-    global _rate_cache
-
-    cache_entry = {
-        'rates': rates_data,
-        'timestamp': timestamp.isoformat(),
-        'base': base_currency
-    }
+@st.cache_resource
+def load_fx_service():
+    """The process-wide FX service, created once and shared by every rerun and session"""
+    # Tables are refreshed in the background before they expire; stale rates are served while refetching
+    return get_service(_cache_file, prefetch=PREFETCH_CURRENCIES, refresh=True, stale_while_revalidate=True)
 
-    # Store the full rates data keyed by base currency
-    _rate_cache[base_currency] = cache_entry
 
-    # Save to file for persistence
-    save_cache_to_file()
+fx_service = load_fx_service()
 
+# st.fragment reruns only the decorated section when one of its own widgets changes (Streamlit 1.37+;
+# experimental_fragment before that, a full rerun on versions without fragments)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+# Fragments can also rerun on a timer (run_every); without fragments, callers sleep and rerun the app themselves
+timed_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
 
-def get_cached_rate(from_currency, to_currency):
-    """Get rate from cache if available"""
-    # Try direct cache hit
-    if from_currency in _rate_cache:
-        cache_entry = _rate_cache[from_currency]
-        if to_currency in cache_entry['rates']:
-            cached_timestamp = datetime.datetime.fromisoformat(cache_entry['timestamp'])
-            return cache_entry['rates'][to_currency], cached_timestamp
 
-    # Try inverse calculation from cache
-    if to_currency in _rate_cache:
-        cache_entry = _rate_cache[to_currency]
-        if from_currency in cache_entry['rates']:
-            inverse_rate = 1 / cache_entry['rates'][from_currency]
-            cached_timestamp = datetime.datetime.fromisoformat(cache_entry['timestamp'])
-            return inverse_rate, cached_timestamp
+def load_cache_from_file():
+    """Load cached rates from file on startup"""
+    fx_service.load_file()
 
-    return None, None
 
+def get_cached_rate(from_currency, to_currency):
+    """Get rate from cache if available"""
+    return fx_service.get_cached_rate(from_currency, to_currency)
 
-def is_cache_fresh(timestamp, max_age_minutes=15):
-    """Check if cached data is still fresh"""
-    if not timestamp:
-        return False
 
-    age = datetime.datetime.now() - timestamp
-    return age.total_seconds() < (max_age_minutes * 60)
+def is_cache_fresh(timestamp, max_age_minutes=None):
+    """Check if cached data is still fresh (default: the service TTL)"""
+    return fx_service.is_fresh(timestamp, max_age_minutes)
 
 
-def get_exchange_rate(from_currency, to_currency, use_cache=True, max_cache_age_minutes=15):
+def get_exchange_rate(from_currency, to_currency, use_cache=True, max_cache_age_minutes=None):
     """
     Fetch current exchange rate with intelligent caching.
 
@@ -92,52 +58,309 @@ def get_exchange_rate(from_currency, to_currency, use_cache=True, max_cache_age_
         from_currency: Source currency code
         to_currency: Target currency code
         use_cache: Whether to use cached data if API fails
-        max_cache_age_minutes: How long to consider cache fresh
+        max_cache_age_minutes: How long to consider cache fresh (default: per-currency TTL)
 
     Returns:
         tuple: (rate, timestamp) or (None, None) if failed
     """
-    if from_currency == to_currency:
-        return 1.0, datetime.datetime.now()
+    # Concurrent sessions share one API request per base currency. This is the explicit
+    # "Fetch" path, so a stale rate is refetched now rather than served.
+    return fx_service.get_rate(
+        from_currency, to_currency, use_cache, max_cache_age_minutes, stale_while_revalidate=False,
+        on_error=lambda e: st.warning(f"API request failed: {e}"),
+        on_stale=lambda cached_timestamp: st.info(
+            f"Using cached rate from {cached_timestamp.strftime('%Y-%m-%d %H:%M:%S')} (API unavailable)"))
+
+
+@st.cache_data(show_spinner=False)
+def get_account_field_text(channel_type, fedwire_type, country_code, account_type):
+    """(label, help) for an account field, computed once per variant and country"""
+    return (get_account_field_label(channel_type, fedwire_type, country_code, account_type),
+            get_account_field_help(channel_type, fedwire_type, country_code))
+
+
+@fragment
+def fx_rate_panel(primary_ccy, secondary_ccy):
+    """
+    Cached, fetched or manually entered exchange rate for primary_ccy -> secondary_ccy.
+
+    Runs as a fragment: fetching a rate or editing it reruns this panel only,
+    and the whole page only when the rate changed (the settlement amount below
+    is derived from it).
+    """
+    pacs008 = st.session_state.form_data['pacs008']
+    rate_before = pacs008.get('exchangeRate')
+
+    # Check for cached rates first
+    cached_rate, cached_timestamp = get_cached_rate(primary_ccy, secondary_ccy)
+    if cached_rate and is_cache_fresh(cached_timestamp, fx_service.ttl_for(primary_ccy)):
+        st.markdown(
+            f'<div class="cache-info">📊 Fresh cached rate available: '
+            f'1 {primary_ccy} = {cached_rate:.6f} {secondary_ccy}<br>'
+            f'<small>Cached: {cached_timestamp.strftime("%Y-%m-%d %H:%M:%S")}</small></div>',
+            unsafe_allow_html=True)
+        pacs008['exchangeRate'] = cached_rate
+        pacs008['exchangeRateTimestamp'] = cached_timestamp
+    elif cached_rate:
+        # Show the stale rate now; the refetch runs in the background
+        fx_service.revalidate(primary_ccy)
+        st.markdown(
+            f'<div class="cache-info">⚠️ Stale cached rate available: '
+            f'1 {primary_ccy} = {cached_rate:.6f} {secondary_ccy}<br>'
+            f'<small>Cached: {cached_timestamp.strftime("%Y-%m-%d %H:%M:%S")} (Consider refreshing)</small></div>',
+            unsafe_allow_html=True)
+
+    # Fetch exchange rate
+    if st.button("🔄 Fetch Current Exchange Rate", key="fetch_fx_rate"):
+        with st.spinner("Fetching exchange rate..."):
+            rate, timestamp = get_exchange_rate(primary_ccy, secondary_ccy)
+            if rate:
+                pacs008['exchangeRate'] = rate
+                pacs008['exchangeRateTimestamp'] = timestamp
+                st.success(f"Exchange rate updated: 1 {primary_ccy} = {rate:.6f} {secondary_ccy}")
+            else:
+                st.error("Could not fetch exchange rate. Please enter manually.")
+
+    # Display current rate if available
+    current_rate = pacs008.get('exchangeRate')
+    if current_rate:
+        rate_timestamp = pacs008.get('exchangeRateTimestamp')
+        timestamp_str = rate_timestamp.strftime('%Y-%m-%d %H:%M:%S UTC') if rate_timestamp else 'Unknown'
+        st.markdown(
+            f'<div class="fx-rate-display">📊 Current Rate: 1 {primary_ccy} = {current_rate:.6f} {secondary_ccy}<br>'
+            f'<small>Last updated: {timestamp_str}</small></div>',
+            unsafe_allow_html=True)
+
+    # Manual rate input
+    manual_rate = st.number_input(
+        f"Exchange Rate ({primary_ccy} to {secondary_ccy})",
+        value=float(current_rate) if current_rate else 1.0,
+        min_value=0.000001,
+        step=0.000001,
+        format="%.6f",
+        key="pacs008_manual_exchange_rate",
+        help="Enter the exchange rate manually if needed"
+    )
+
+    if manual_rate != current_rate:
+        pacs008['exchangeRate'] = manual_rate
+        pacs008['exchangeRateTimestamp'] = datetime.datetime.now()
+
+    if pacs008.get('exchangeRate') != rate_before:
+        st.rerun()
+
 
-    # Check if we have fresh cached data first
-    if use_cache:
-        cached_rate, cached_timestamp = get_cached_rate(from_currency, to_currency)
-        if cached_rate and is_cache_fresh(cached_timestamp, max_cache_age_minutes):
-            return cached_rate, cached_timestamp
+@fragment
+def tax_payment_fields():
+    """Structured tax remittance fields; nothing else on the page depends on them, so they rerun on their own"""
+    pacs008 = st.session_state.form_data['pacs008']
+    st.markdown("### Tax Payment Information")
 
-    # Try to fetch from API
-    try:
-        url = f"https://api.exchangerate-api.com/v4/latest/{from_currency}"
-        response = requests.get(url, timeout=5)
+    col1, col2 = st.columns(2)
+    with col1:
+        pacs008['taxId'] = st.text_input(
+            "Tax ID (TIN/EIN) *",
+            value=pacs008['taxId'],
+            key="pacs008_taxId",
+            help="9-digit Tax Identification Number or Employer Identification Number",
+            max_chars=9
+        )
+
+        pacs008['taxType'] = st.selectbox(
+            "Tax Type Code *",
+            options=TAX_TYPE_CODES,
+            index=TAX_TYPE_CODES.index(pacs008['taxType']) if pacs008['taxType'] in TAX_TYPE_CODES else 0,
+            key="pacs008_taxType",
+            help="5-character tax type code as specified by IRS"
+        )
+
+    with col2:
+        current_year = datetime.datetime.now().year
+        pacs008['taxYear'] = st.text_input(
+            "Tax Year *",
+            value=pacs008['taxYear'] or str(current_year),
+            key="pacs008_taxYear",
+            help="4-digit tax year (YYYY)",
+            max_chars=4
+        )
 
-        if response.status_code == 200:
-            data = response.json()
-            if to_currency in data['rates']:
-                rate = data['rates'][to_currency]
-                timestamp = datetime.datetime.now()
+        period_options = [f"{code} ({month})" for code, month in TAX_PERIOD_MONTHS]
+        period_values = [code for code, month in TAX_PERIOD_MONTHS]
 
-                # Update cache with successful response
-                update_cache(from_currency, data['rates'], timestamp)
+        current_period_index = 0
+        if pacs008['taxPeriod'] in period_values:
+            current_period_index = period_values.index(pacs008['taxPeriod'])
+
+        selected_period = st.selectbox(
+            "Tax Period *",
+            options=period_options,
+            index=current_period_index,
+            key="pacs008_taxPeriod_select",
+            help="Select the tax month"
+        )
+
+        # Extract the code part (first 4 characters)
+        pacs008['taxPeriod'] = selected_period[:4]
+
+
+@fragment
+def generated_xml_preview():
+    """The generated message; its buttons rerun this section only"""
+    if not st.session_state.generated_xml:
+        return
+    st.markdown("---")
+    st.subheader("Generated XML")
+    st.code(st.session_state.generated_xml, language='xml')
 
-                return rate, timestamp
+    # st.code has its own copy button; the XML is never pasted into a script
+    st.download_button("Download XML", st.session_state.generated_xml,
+                       file_name=f"{st.session_state.message_type}.xml", mime="application/xml",
+                       key="download_xml_button")
 
-    except Exception as e:
-        st.warning(f"API request failed: {e}")
 
-    # Fallback to cached data (even if stale) if API fails
-    if use_cache:
-        cached_rate, cached_timestamp = get_cached_rate(from_currency, to_currency)
-        if cached_rate:
-            st.info(f"Using cached rate from {cached_timestamp.strftime('%Y-%m-%d %H:%M:%S')} (API unavailable)")
-            return cached_rate, cached_timestamp
+BULK_STAGES = {
+    'queued': "Starting",
+    'reading': "Reading rows",
+    'validating': "Validating rows",
+    'rendering': "Rendering messages",
+}
+# Seconds between progress redraws of a running bulk job
+BULK_POLL_INTERVAL = 0.5
 
-    # No rate available
-    return None, None
 
+def bulk_job_progress():
+    """Progress bar and Cancel button of the running bulk job; reruns the app once the job has finished"""
+    job = st.session_state.bulk_job
+    if job.finished:
+        # The results are drawn by bulk_upload_panel
+        st.rerun()
+    if st.button("Cancel", key="bulk_cancel_button"):
+        job.cancel()
+    label = f"{BULK_STAGES[job.stage]}: {job.done:,} of {job.total:,}" if job.total else BULK_STAGES[job.stage]
+    st.progress(job.progress, text=label)
+
+
+if timed_fragment is not None:
+    # Only this section reruns while the job runs; the script thread is never blocked waiting for it
+    bulk_job_progress = timed_fragment(run_every=BULK_POLL_INTERVAL)(bulk_job_progress)
+
+
+# Not a fragment itself: it contains the bulk_job_progress fragment, and in bulk mode the script stops after it anyway
+def bulk_upload_panel():
+    """Upload a payment file, validate and render it in a background thread, download the result"""
+    st.subheader("Bulk upload")
+    st.write("Upload a CSV, JSONL or Excel (.xlsx) file with one payment per row. Column names are the form field "
+             "names (`msgId`, `dbtrNm`, `cdtrAcctIBAN`, `instdAmt`, ...), as for `python -m cli`.")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        message_type = st.radio("Message type:", ('pacs008', 'pain001'), key="bulk_message_type", horizontal=True)
+    channel_type = fedwire_type = None
+    if message_type == 'pacs008':
+        with col2:
+            channel_type = st.radio("Channel type:", ('Fedwire', 'SWIFT'), key="bulk_channel_type",
+                                    horizontal=True).lower()
+        if channel_type == 'fedwire':
+            with col3:
+                fedwire_type = st.radio("Fedwire payment type:", ('Domestic', 'International', 'US Tax Payment'),
+                                        key="bulk_fedwire_type", horizontal=True)
+            fedwire_type = {'Domestic': 'domestic', 'International': 'international',
+                            'US Tax Payment': 'tax'}[fedwire_type]
+
+    uploaded = st.file_uploader("Payment file", type=['csv', 'jsonl', 'ndjson', 'json', 'xlsx'], key="bulk_file")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        output_mode = st.radio("Output:", ('zip', 'batch'), key="bulk_output_mode",
+                               format_func=lambda mode: {'zip': "Zip, one message per row",
+                                                         'batch': "One multi-transaction message"}[mode])
+    with col2:
+        skip_invalid = st.checkbox("Skip invalid rows", value=True, key="bulk_skip_invalid",
+                                   help="Otherwise nothing is generated when any row fails validation")
+    with col3:
+        compact = st.checkbox("Compact XML", key="bulk_compact", help="No indentation or line breaks")
+    with col4:
+        validate_schema = st.checkbox("Validate against XSD", key="bulk_validate_schema",
+                                      disabled=not schema_validation_available(),
+                                      help="Needs lxml" if not schema_validation_available() else None)
+
+    job = st.session_state.get('bulk_job')
+    running = job is not None and not job.finished
+    if st.button("Generate messages", key="bulk_generate_button", disabled=uploaded is None or running):
+        job = st.session_state.bulk_job = BulkJob(uploaded.getvalue(), uploaded.name, message_type, channel_type,
+                                                  fedwire_type, output_mode=output_mode, skip_invalid=skip_invalid,
+                                                  compact=compact, validate_schema=validate_schema).start()
+    if job is None:
+        return
+
+    if not job.finished:
+        bulk_job_progress()
+        if timed_fragment is None:
+            time.sleep(BULK_POLL_INTERVAL)
+            st.rerun()
+        return
+
+    if job.stage == 'done':
+        st.success(f"Generated {job.valid:,} {job.message_type} transaction(s) from {job.source_name}, "
+                   f"skipped {job.invalid:,} invalid row(s)")
+        st.download_button(f"Download {job.file_name}", job.output, file_name=job.file_name, mime=job.mime,
+                           key="bulk_download_button")
+    elif job.stage == 'cancelled':
+        st.warning("Generation cancelled.")
+    else:
+        st.error(job.error)
+
+    if job.errors:
+        st.markdown(f"**Invalid rows** ({job.invalid:,})")
+        st.dataframe([{'Row': row_number, 'Error': error} for row_number, error in job.errors],
+                     use_container_width=True)
+    if job.schema_errors:
+        st.markdown(f"**Schema errors** ({len({name for name, _ in job.schema_errors}):,} message(s))")
+        st.dataframe([{'Message': name, 'Error': error} for name, error in job.schema_errors],
+                     use_container_width=True)
+
+
+@fragment
+def diagnostics_panel():
+    """Timings and counters recorded by this server process (shared by all sessions)"""
+    with st.expander("📈 Diagnostics"):
+        # Snapshots are only built while the panel is switched on, not on every rerun of the form
+        if not st.checkbox("Show timings and counters", key="show_diagnostics"):
+            return
+        st.button("🔄 Refresh", key="refresh_diagnostics")
+        metrics_snapshot = METRICS.snapshot()
+        if metrics_snapshot['spans']:
+            st.markdown("**Timings** (rendering, validation, FX cache lookups and API fetches)")
+            st.table([{
+                'Span': span['name'],
+                'Labels': format_metric_labels(span['labels']),
+                'Count': span['count'],
+                'Mean (ms)': f"{span['mean_seconds'] * 1000:.3f}",
+                'p95 (ms)': f"{span['p95_seconds'] * 1000:.3f}",
+                'Max (ms)': f"{span['max_seconds'] * 1000:.3f}",
+            } for span in metrics_snapshot['spans']])
+        else:
+            st.write("Nothing recorded yet.")
+        if metrics_snapshot['counters']:
+            st.markdown("**Counters** (FX cache hits, API failures, stale fallbacks, ...)")
+            st.table([{
+                'Counter': counter['name'],
+                'Labels': format_metric_labels(counter['labels']),
+                'Value': counter['value'],
+            } for counter in metrics_snapshot['counters']])
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download JSON snapshot", METRICS.to_json(indent=2), file_name="metrics.json",
+                               mime="application/json", key="download_metrics_json")
+        with col2:
+            st.download_button("Download Prometheus text", METRICS.to_prometheus(), file_name="metrics.prom",
+                               mime="text/plain", key="download_metrics_prom")
+
+
+def format_metric_labels(labels):
+    """Metric labels as 'name=value, ...' for the diagnostics panel"""
+    return ', '.join(f"{name}={value}" for name, value in labels.items())
 
-# Initialize cache on module load
-load_cache_from_file()
 
 # Custom CSS for styling
 st.markdown("""
@@ -236,178 +459,12 @@ st.markdown("<h1 class='main-header'>ISO 20022 XML Payment Generator</h1>", unsa
 st.info(
     "💡 **Tip**: After entering values in text fields, press Enter or click outside the field to save your input before generating XML.")
 
-
-# Function to get current datetime in required format (+HH:MM offset)
-def get_current_datetime_with_offset():
-    now = datetime.datetime.now(datetime.timezone.utc)
-    # Format to YYYY-MM-DDTHH:MM:SS+00:00 for UTC, which is common for SWIFT CBPR+
-    return now.strftime('%Y-%m-%dT%H:%M:%S+00:00')
-
-
-def needs_exchange_rate(payment_type, origin, settlement_ccy, instructed_ccy):
-    """
-    Determine if exchange rate is needed based on the payment scenario.
-    Returns True if FX conversion is required.
-    """
-    if settlement_ccy == instructed_ccy:
-        return False
-
-    # Based on the PDF logic
-    if payment_type == 'fedwire_intl':
-        return settlement_ccy != instructed_ccy
-    elif payment_type == 'swift':
-        return settlement_ccy != instructed_ccy
-
-    return False
-
-
-def calculate_settlement_amount(instructed_amount, settlement_ccy, instructed_ccy, exchange_rate=None):
-    """
-    Calculate settlement amount based on currencies and exchange rate.
-    """
-    if settlement_ccy == instructed_ccy:
-        return instructed_amount
-
-    if exchange_rate:
-        # Settlement amount = Instructed amount * exchange rate
-        return round(instructed_amount * exchange_rate, 2)
-
-    return instructed_amount
-
-
-# Function to validate USABA agent fields
-def validate_usaba_fields(data, channel_type, fedwire_type):
-    """
-    Validates that when USABA Member IDs are used, corresponding name and address fields are provided.
-    Also validates country codes are 2 characters.
-    Returns list of error messages.
-    """
-    errors = []
-
-    if channel_type == 'fedwire':
-        # Check Debtor Agent
-        if data.get('dbtrAgtMmbId', '').strip():
-            if not data.get('dbtrAgtNm', '').strip():
-                errors.append("Debtor Agent Name is mandatory when USABA Member ID is provided")
-            if not data.get('dbtrAgtStrtNm', '').strip():
-                errors.append("Debtor Agent Street Name is mandatory when USABA Member ID is provided")
-            if not data.get('dbtrAgtTwnNm', '').strip():
-                errors.append("Debtor Agent Town Name is mandatory when USABA Member ID is provided")
-            if not data.get('dbtrAgtCtry', '').strip():
-                errors.append("Debtor Agent Country is mandatory when USABA Member ID is provided")
-            elif len(data.get('dbtrAgtCtry', '').strip()) != 2:
-                errors.append("Debtor Agent Country must be exactly 2 characters (ISO country code)")
-
-        # Validate country code length even if not mandatory
-        if data.get('dbtrAgtCtry', '').strip() and len(data.get('dbtrAgtCtry', '').strip()) != 2:
-            errors.append("Debtor Agent Country must be exactly 2 characters (ISO country code)")
-
-        # Check Creditor Agent for domestic payments or when USABA is used for international
-        if fedwire_type == 'domestic':
-            if data.get('cdtrAgtMmbId', '').strip():
-                if not data.get('cdtrAgtNm', '').strip():
-                    errors.append("Creditor Agent Name is mandatory when USABA Member ID is provided")
-                if not data.get('cdtrAgtStrtNm', '').strip():
-                    errors.append("Creditor Agent Street Name is mandatory when USABA Member ID is provided")
-                if not data.get('cdtrAgtTwnNm', '').strip():
-                    errors.append("Creditor Agent Town Name is mandatory when USABA Member ID is provided")
-                if not data.get('cdtrAgtCtry', '').strip():
-                    errors.append("Creditor Agent Country is mandatory when USABA Member ID is provided")
-                elif len(data.get('cdtrAgtCtry', '').strip()) != 2:
-                    errors.append("Creditor Agent Country must be exactly 2 characters (ISO country code)")
-
-        # Validate creditor agent country code length even if not mandatory
-        if data.get('cdtrAgtCtry', '').strip() and len(data.get('cdtrAgtCtry', '').strip()) != 2:
-            errors.append("Creditor Agent Country must be exactly 2 characters (ISO country code)")
-
-    return errors
-
-
-def validate_tax_fields(data):
-    """
-    Validates mandatory tax payment fields.
-    Returns list of error messages.
-    """
-    errors = []
-
-    # Tax ID validation
-    tax_id = data.get('taxId', '').strip()
-    if not tax_id:
-        errors.append("Tax ID (TIN/EIN) is mandatory for tax payments")
-    elif len(tax_id) != 9 or not tax_id.isdigit():
-        errors.append("Tax ID must be exactly 9 numeric characters")
-    elif tax_id in ['000000000', '999999999']:
-        errors.append("Tax ID cannot be '000000000' or '999999999'")
-
-    # Tax Type validation
-    tax_type = data.get('taxType', '').strip()
-    if not tax_type:
-        errors.append("Tax Type Code is mandatory for tax payments")
-    elif len(tax_type) != 5:
-        errors.append("Tax Type Code must be exactly 5 characters")
-
-    # Tax Year validation
-    tax_year = data.get('taxYear', '').strip()
-    if not tax_year:
-        errors.append("Tax Year is mandatory for tax payments")
-    elif len(tax_year) != 4 or not tax_year.isdigit():
-        errors.append("Tax Year must be exactly 4 numeric characters (YYYY)")
-
-    # Tax Period validation
-    tax_period = data.get('taxPeriod', '').strip()
-    valid_periods = ['MM01', 'MM02', 'MM03', 'MM04', 'MM05', 'MM06',
-                     'MM07', 'MM08', 'MM09', 'MM10', 'MM11', 'MM12']
-    if not tax_period:
-        errors.append("Tax Period is mandatory for tax payments")
-    elif tax_period not in valid_periods:
-        errors.append("Tax Period must be one of MM01-MM12 (e.g., MM08 for August)")
-
-    return errors
-
-
-def get_account_field_help(channel_type, fedwire_type, country_code, sender_country='US'):
-    """
-    Generate help text for account fields based on the payment scheme rules.
-    """
-    if channel_type == 'fedwire':
-        if fedwire_type in ['domestic', 'tax']:
-            return "Enter US account number (IBAN not used for Fedwire domestic/tax)"
-        elif fedwire_type == 'international':
-            if is_iban_country(country_code):
-                return "Enter IBAN (required for IBAN countries in Fedwire international)"
-            else:
-                return "Enter local account number (IBAN not available for this country)"
-    elif channel_type == 'swift':
-        if is_iban_country(country_code):
-            return "Enter IBAN (required for IBAN countries in SWIFT CBPR+)"
-        else:
-            return "Enter local account number (IBAN not available for this country)"
-
-    return "Enter account number or IBAN"
-
-
-def get_account_field_label(channel_type, fedwire_type, country_code, account_type='Debtor'):
-    """
-    Generate appropriate label for account fields.
-    """
-    base_label = f"{account_type} Account"
-
-    if channel_type == 'fedwire':
-        if fedwire_type in ['domestic', 'tax']:
-            return f"{base_label} Number"
-        elif fedwire_type == 'international':
-            if is_iban_country(country_code):
-                return f"{base_label} IBAN"
-            else:
-                return f"{base_label} Number"
-    elif channel_type == 'swift':
-        if is_iban_country(country_code):
-            return f"{base_label} IBAN"
-        else:
-            return f"{base_label} Number"
-
-    return f"{base_label} (IBAN/Number)"
-
+# The single-message form below is not run at all while the bulk upload is shown
+workflow = st.radio("Mode:", ("Single message", "Bulk upload"), key="workflow_selector", horizontal=True)
+if workflow == "Bulk upload":
+    bulk_upload_panel()
+    diagnostics_panel()
+    st.stop()
 
 # Initialize session state for form data and generated XML
 if 'form_data' not in st.session_state:
@@ -449,7 +506,7 @@ if 'form_data' not in st.session_state:
             'instdAgtBICFI': 'CDTRGB2LXXX',
             'instgAgtMmbId': '011104238',
             'instdAgtMmbId': '021040078',
-            'txId': f"TX{uuid.uuid4().hex[:14].upper()}",
+            'txId': DEFAULT_ID_GENERATOR.transaction_ids()['txId'],
             'dbtrNm': 'Debtor Name',
             'dbtrStrtNm': 'Debtor Street',
             'dbtrBldgNb': '123',
@@ -681,8 +738,8 @@ else:  # pacs008
         with col1:
             st.session_state.form_data['pacs008']['primaryCurrency'] = st.selectbox(
                 "Primary Currency (Settlement)",
-                ['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF'],
-                index=['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF'].index(
+                CURRENCIES,
+                index=CURRENCIES.index(
                     st.session_state.form_data['pacs008'].get('primaryCurrency', 'USD')),
                 key="pacs008_primaryCurrency",
                 help="Currency used for interbank settlement (IntrBkSttlmAmt)"
@@ -690,8 +747,8 @@ else:  # pacs008
         with col2:
             st.session_state.form_data['pacs008']['secondaryCurrency'] = st.selectbox(
                 "Secondary Currency (Instructed)",
-                ['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF'],
-                index=['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF'].index(
+                CURRENCIES,
+                index=CURRENCIES.index(
                     st.session_state.form_data['pacs008'].get('secondaryCurrency', 'USD')),
                 key="pacs008_secondaryCurrency",
                 help="Currency for the final payment to beneficiary (InstdAmt)"
@@ -710,56 +767,7 @@ else:  # pacs008
                 f'Settlement will be in {primary_ccy}, beneficiary receives {secondary_ccy}</div>',
                 unsafe_allow_html=True)
 
-            # Check for cached rates first
-            cached_rate, cached_timestamp = get_cached_rate(primary_ccy, secondary_ccy)
-            if cached_rate and is_cache_fresh(cached_timestamp, 15):
-                st.markdown(
-                    f'<div class="cache-info">📊 Fresh cached rate available: 1 {primary_ccy} = {cached_rate:.6f} {secondary_ccy}<br>'
-                    f'<small>Cached: {cached_timestamp.strftime("%Y-%m-%d %H:%M:%S")}</small></div>',
-                    unsafe_allow_html=True)
-                st.session_state.form_data['pacs008']['exchangeRate'] = cached_rate
-                st.session_state.form_data['pacs008']['exchangeRateTimestamp'] = cached_timestamp
-            elif cached_rate:
-                st.markdown(
-                    f'<div class="cache-info">⚠️ Stale cached rate available: 1 {primary_ccy} = {cached_rate:.6f} {secondary_ccy}<br>'
-                    f'<small>Cached: {cached_timestamp.strftime("%Y-%m-%d %H:%M:%S")} (Consider refreshing)</small></div>',
-                    unsafe_allow_html=True)
-
-            # Fetch exchange rate
-            if st.button("🔄 Fetch Current Exchange Rate", key="fetch_fx_rate"):
-                with st.spinner("Fetching exchange rate..."):
-                    rate, timestamp = get_exchange_rate(primary_ccy, secondary_ccy)
-                    if rate:
-                        st.session_state.form_data['pacs008']['exchangeRate'] = rate
-                        st.session_state.form_data['pacs008']['exchangeRateTimestamp'] = timestamp
-                        st.success(f"Exchange rate updated: 1 {primary_ccy} = {rate:.6f} {secondary_ccy}")
-                    else:
-                        st.error("Could not fetch exchange rate. Please enter manually.")
-
-            # Display current rate if available
-            current_rate = st.session_state.form_data['pacs008'].get('exchangeRate')
-            if current_rate:
-                rate_timestamp = st.session_state.form_data['pacs008'].get('exchangeRateTimestamp')
-                timestamp_str = rate_timestamp.strftime('%Y-%m-%d %H:%M:%S UTC') if rate_timestamp else 'Unknown'
-                st.markdown(
-                    f'<div class="fx-rate-display">📊 Current Rate: 1 {primary_ccy} = {current_rate:.6f} {secondary_ccy}<br>'
-                    f'<small>Last updated: {timestamp_str}</small></div>',
-                    unsafe_allow_html=True)
-
-            # Manual rate input
-            manual_rate = st.number_input(
-                f"Exchange Rate ({primary_ccy} to {secondary_ccy})",
-                value=float(current_rate) if current_rate else 1.0,
-                min_value=0.000001,
-                step=0.000001,
-                format="%.6f",
-                key="pacs008_manual_exchange_rate",
-                help="Enter the exchange rate manually if needed"
-            )
-
-            if manual_rate != current_rate:
-                st.session_state.form_data['pacs008']['exchangeRate'] = manual_rate
-                st.session_state.form_data['pacs008']['exchangeRateTimestamp'] = datetime.datetime.now()
+            fx_rate_panel(primary_ccy, secondary_ccy)
         else:
             st.markdown(
                 f'<div class="fx-info-box">✅ <strong>No FX Conversion:</strong> Both settlement and instruction in {primary_ccy}</div>',
@@ -786,19 +794,20 @@ else:  # pacs008
     st.markdown("### Group Header")
     col1, col2 = st.columns(2)
 
-    current_date = datetime.datetime.now().strftime('%Y%m%d')
-    if pacs008_channel_type_lower == 'fedwire':
-        unique_alpha = uuid.uuid4().hex[8:16].upper()
-        sequence_digits = str(random.randint(0, 999999)).zfill(6)
-        default_msg_id_pacs008 = f"{current_date}{unique_alpha}{sequence_digits}"
-    else:  # SWIFT
-        default_msg_id_pacs008 = f"{current_date}SWIFT{uuid.uuid4().hex[:10].upper()}"
+    # The default MsgId is generated once per session and channel, not on every rerun
+    default_msg_ids = st.session_state.setdefault('default_msg_ids', {})
+    if pacs008_channel_type_lower not in default_msg_ids:
+        current_date = datetime.datetime.now().strftime('%Y%m%d')
+        if pacs008_channel_type_lower == 'fedwire':
+            default_msg_ids['fedwire'] = DEFAULT_ID_GENERATOR.msg_id(current_date)
+        else:  # SWIFT
+            default_msg_ids['swift'] = DEFAULT_ID_GENERATOR.msg_id(f"{current_date}SWIFT")
 
     with col1:
         st.session_state.form_data['pacs008']['msgId'] = st.text_input(
             "Message ID (MsgId)",
-            value=default_msg_id_pacs008,
-            key="pacs008_msgId"
+            value=default_msg_ids[pacs008_channel_type_lower],
+            key=f"pacs008_msgId_{pacs008_channel_type_lower}"
         )
         st.session_state.form_data['pacs008']['sttlmMtd'] = st.selectbox(
             "Settlement Method (SttlmMtd)",
@@ -848,69 +857,7 @@ else:  # pacs008
 
     # Tax-specific fields
     if fedwire_type == 'tax':
-        st.markdown("### Tax Payment Information")
-
-        # Define valid tax type codes from the document
-        VALID_TAX_TYPES = [
-            '88042', '88047', '10400', '10402', '10404', '10406', '10407',
-            '72005', '72007', '09405', '09407', '94105', '94107', '94104',
-            '94405', '94407', '09455', '09457', '99046', '99047', '99042',
-            '10417', '10416', '10412', '10425', '10427', '11206', '11207',
-            '11202', '11200', '22907', '84894'
-        ]
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.session_state.form_data['pacs008']['taxId'] = st.text_input(
-                "Tax ID (TIN/EIN) *",
-                value=st.session_state.form_data['pacs008']['taxId'],
-                key="pacs008_taxId",
-                help="9-digit Tax Identification Number or Employer Identification Number",
-                max_chars=9
-            )
-
-            st.session_state.form_data['pacs008']['taxType'] = st.selectbox(
-                "Tax Type Code *",
-                options=VALID_TAX_TYPES,
-                index=VALID_TAX_TYPES.index(st.session_state.form_data['pacs008']['taxType']) if
-                st.session_state.form_data['pacs008']['taxType'] in VALID_TAX_TYPES else 0,
-                key="pacs008_taxType",
-                help="5-character tax type code as specified by IRS"
-            )
-
-        with col2:
-            current_year = datetime.datetime.now().year
-            st.session_state.form_data['pacs008']['taxYear'] = st.text_input(
-                "Tax Year *",
-                value=st.session_state.form_data['pacs008']['taxYear'] or str(current_year),
-                key="pacs008_taxYear",
-                help="4-digit tax year (YYYY)",
-                max_chars=4
-            )
-
-            tax_periods = [
-                ('MM01', 'January'), ('MM02', 'February'), ('MM03', 'March'), ('MM04', 'April'),
-                ('MM05', 'May'), ('MM06', 'June'), ('MM07', 'July'), ('MM08', 'August'),
-                ('MM09', 'September'), ('MM10', 'October'), ('MM11', 'November'), ('MM12', 'December')
-            ]
-
-            period_options = [f"{code} ({month})" for code, month in tax_periods]
-            period_values = [code for code, month in tax_periods]
-
-            current_period_index = 0
-            if st.session_state.form_data['pacs008']['taxPeriod'] in period_values:
-                current_period_index = period_values.index(st.session_state.form_data['pacs008']['taxPeriod'])
-
-            selected_period = st.selectbox(
-                "Tax Period *",
-                options=period_options,
-                index=current_period_index,
-                key="pacs008_taxPeriod_select",
-                help="Select the tax month"
-            )
-
-            # Extract the code part (first 4 characters)
-            st.session_state.form_data['pacs008']['taxPeriod'] = selected_period[:4]
+        tax_payment_fields()
 
     st.markdown("### Debtor Details")
     col1, col2, col3 = st.columns(3)
@@ -939,8 +886,8 @@ else:  # pacs008
     with col3:
         # Dynamic account field based on rules
         dbtr_country = st.session_state.form_data['pacs008'].get('dbtrCtry', 'US')
-        dbtr_acct_label = get_account_field_label(pacs008_channel_type_lower, fedwire_type, dbtr_country, 'Debtor')
-        dbtr_acct_help = get_account_field_help(pacs008_channel_type_lower, fedwire_type, dbtr_country)
+        dbtr_acct_label, dbtr_acct_help = get_account_field_text(pacs008_channel_type_lower, fedwire_type,
+                                                                 dbtr_country, 'Debtor')
 
         st.session_state.form_data['pacs008']['dbtrAcctIBAN'] = st.text_input(
             dbtr_acct_label,
@@ -1048,9 +995,8 @@ else:  # pacs008
 
             # Dynamic account field for creditor based on rules
             cdtr_country = st.session_state.form_data['pacs008'].get('cdtrCtry', 'GB')
-            cdtr_acct_label = get_account_field_label(pacs008_channel_type_lower, fedwire_type, cdtr_country,
-                                                      'Creditor')
-            cdtr_acct_help = get_account_field_help(pacs008_channel_type_lower, fedwire_type, cdtr_country)
+            cdtr_acct_label, cdtr_acct_help = get_account_field_text(pacs008_channel_type_lower, fedwire_type,
+                                                                     cdtr_country, 'Creditor')
 
             st.session_state.form_data['pacs008']['cdtrAcctIBAN'] = st.text_input(
                 cdtr_acct_label,
@@ -1223,6 +1169,14 @@ if st.button("Generate XML", key="generate_xml_button"):
             tax_errors = validate_tax_fields(st.session_state.form_data['pacs008'])
             validation_errors.extend(tax_errors)
 
+    if st.session_state.message_type == 'pacs008':
+        # IBAN length, format and check digits for accounts sent as <IBAN>
+        validation_errors.extend(validate_account_fields(st.session_state.form_data['pacs008'], 'pacs008',
+                                                         pacs008_channel_type_lower, fedwire_type))
+        # BIC structure and USABA routing number check digits
+        validation_errors.extend(validate_routing_fields(st.session_state.form_data['pacs008'], 'pacs008',
+                                                         pacs008_channel_type_lower, fedwire_type))
+
     if validation_errors:
         # Display errors
         st.markdown("### Warning Validation Errors")
@@ -1234,24 +1188,10 @@ if st.button("Generate XML", key="generate_xml_button"):
         if st.session_state.message_type == 'pain001':
             st.session_state.generated_xml = generate_pain001_xml(st.session_state.form_data['pain001'])
         else:
-            st.session_state.generated_xml = generate_pacs008_xml(st.session_state.form_data['pacs008'],
-                                                                  pacs008_channel_type_lower, fedwire_type)
-
-if st.session_state.generated_xml:
-    st.markdown("---")
-    st.subheader("Generated XML")
-    st.code(st.session_state.generated_xml, language='xml')
+            # Fresh InstrId/EndToEndId/UETR per generated message
+            pacs008_data = DEFAULT_ID_GENERATOR.fill(st.session_state.form_data['pacs008'])
+            st.session_state.generated_xml = generate_pacs008_xml(pacs008_data, pacs008_channel_type_lower,
+                                                                  fedwire_type)
 
-    if st.button("Copy to Clipboard", key="copy_xml_button", help="Click to copy the XML to your clipboard"):
-        st.components.v1.html(
-            f"""
-            <script>
-                navigator.clipboard.writeText(`{st.session_state.generated_xml}`).then(function() {{
-                    alert('XML copied to clipboard!');
-                }}, function(err) {{
-                    alert('Could not copy XML: ', err);
-                }});
-            </script>
-            """,
-            height=0
-        )
\ No newline at end of file
+generated_xml_preview()
+diagnostics_panel()
@@ -0,0 +1,199 @@
+"""
+Golden-file regression and throughput check for every message variant.
+
+Messages are rendered from seeded synthetic rows (synthetic.py), so the
+output is the same on every run apart from the UETR and the creation
+timestamps, which are normalised before comparing. The golden files live
+in benchmarks/golden/; after an intended change to the output, rewrite
+them with --update and review the diff.
+
+Throughput is reported as messages (or batch transactions) per second and
+output bytes per second. With --save-baseline the rates are stored in a
+baseline file; later runs fail if a rate drops more than --tolerance below
+it. Baselines depend on the machine, so record one per machine.
+
+Usage:
+    python benchmarks/bench_golden.py                   # golden check + throughput
+    python benchmarks/bench_golden.py --update          # rewrite the golden files
+    python benchmarks/bench_golden.py --save-baseline   # record the throughput baseline
+    python benchmarks/bench_golden.py --skip-throughput
+
+Exits with 1 on a golden mismatch or a throughput regression.
+"""
+import argparse
+import copy
+import difflib
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import VARIANTS, SyntheticPayments  # noqa: E402
+from xml_generator import (generate_pacs008_xml, generate_pain001_xml, iter_pacs008_xml,  # noqa: E402
+                           iter_pain001_xml)
+
+GOLDEN_DIR = os.path.join(ROOT, 'benchmarks', 'golden')
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'throughput_baseline.json')
+GOLDEN_SEED = 20250102
+BATCH_SIZE = 3
+
+# Values that change on every run
+VOLATILE = [
+    (re.compile(r'<UETR>[^<]*</UETR>'), '<UETR>UETR</UETR>'),
+    (re.compile(r'<(CreDt|CreDtTm)>[^<]*</\1>'), r'<\1>TIMESTAMP</\1>'),
+]
+
+
+def normalize(xml):
+    """Replace the UETR and the creation timestamps with fixed placeholders."""
+    for pattern, replacement in VOLATILE:
+        xml = pattern.sub(replacement, xml)
+    return xml
+
+
+def variant_name(message_type, channel_type, fedwire_type):
+    return '_'.join(part for part in (message_type, channel_type, fedwire_type) if part)
+
+
+def render_single(message_type, channel_type, fedwire_type, row, compact=False):
+    if message_type == 'pain001':
+        return generate_pain001_xml(row, compact=compact)
+    return generate_pacs008_xml(row, channel_type, fedwire_type, compact=compact)
+
+
+def iter_batch(message_type, channel_type, fedwire_type, rows, compact=False):
+    """One multi-transaction message, streamed in chunks."""
+    if message_type == 'pain001':
+        return iter_pain001_xml(rows, compact=compact)
+    return iter_pacs008_xml(rows, channel_type, fedwire_type, compact=compact)
+
+
+def golden_cases():
+    """
+    Yields:
+        tuple: (file name, rendered and normalised XML) for every golden file.
+    """
+    payments = SyntheticPayments(GOLDEN_SEED)
+    for variant in VARIANTS:
+        name = variant_name(*variant)
+        rows = list(payments.rows(*variant, count=BATCH_SIZE))
+        yield f"{name}.xml", normalize(render_single(*variant, copy.deepcopy(rows[0])))
+        yield f"{name}_compact.xml", normalize(render_single(*variant, copy.deepcopy(rows[0]), compact=True))
+        yield f"{name}_batch.xml", normalize(''.join(iter_batch(*variant, copy.deepcopy(rows))))
+
+
+def check_golden(update=False):
+    """
+    Compare (or with update, rewrite) the golden files.
+
+    Returns:
+        int: Number of mismatching or missing golden files.
+    """
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    failures = 0
+    for file_name, xml in golden_cases():
+        path = os.path.join(GOLDEN_DIR, file_name)
+        if update:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(xml)
+            print(f"{file_name:<40} written")
+            continue
+        if not os.path.exists(path):
+            failures += 1
+            print(f"{file_name:<40} MISSING (run with --update)")
+            continue
+        with open(path, encoding='utf-8', newline='') as f:
+            expected = f.read()
+        if xml == expected:
+            print(f"{file_name:<40} ok")
+            continue
+        failures += 1
+        print(f"{file_name:<40} MISMATCH")
+        diff = difflib.unified_diff(expected.splitlines(True), xml.splitlines(True), f"golden/{file_name}", 'rendered')
+        print(''.join(list(diff)[:40]))
+    return failures
+
+
+def best_of(repeat, func):
+    """Fastest of repeat runs of func(), in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def measure_throughput(number, pool_size, repeat):
+    """
+    Render number single messages (cycling over pool_size rows) and one batch of
+    number transactions per variant.
+
+    Returns:
+        dict: {case: {'rate': messages or transactions per second, 'bytes': bytes per second}}.
+    """
+    payments = SyntheticPayments(GOLDEN_SEED)
+    results = {}
+    for variant in VARIANTS:
+        name = variant_name(*variant)
+        pool = list(payments.rows(*variant, count=pool_size))
+        rows = [pool[index % pool_size] for index in range(number)]
+
+        size = sum(len(render_single(*variant, row).encode('utf-8')) for row in pool) * number / pool_size
+        seconds = best_of(repeat, lambda: [render_single(*variant, row) for row in rows])
+        results[name] = {'rate': number / seconds, 'bytes': size / seconds}
+
+        size = len(''.join(iter_batch(*variant, rows)).encode('utf-8'))
+        seconds = best_of(repeat, lambda: [chunk for chunk in iter_batch(*variant, rows)])
+        results[f"{name}_batch"] = {'rate': number / seconds, 'bytes': size / seconds}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--update', action='store_true', help='Rewrite the golden files instead of checking them')
+    parser.add_argument('--skip-throughput', action='store_true', help='Only check the golden files')
+    parser.add_argument('--number', type=int, default=5000, help='Messages (batch transactions) per variant')
+    parser.add_argument('--pool', type=int, default=200, help='Distinct synthetic rows the messages cycle through')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats per case; the fastest one is reported')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Throughput baseline file (JSON)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the measured rates as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline before failing (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    failed = check_golden(update=args.update) > 0
+    if args.update or args.skip_throughput:
+        return 1 if failed else 0
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print()
+    results = measure_throughput(args.number, args.pool, args.repeat)
+    for case, result in results.items():
+        unit = 'tx/s ' if case.endswith('_batch') else 'msg/s'
+        line = f"{case:<36} {result['rate']:10.0f} {unit} {result['bytes'] / 1e6:8.2f} MB/s"
+        expected = baseline.get(case)
+        if expected:
+            change = result['rate'] / expected['rate'] - 1
+            regressed = change < -args.tolerance
+            failed = failed or regressed
+            line += f"  {change:+7.1%} vs baseline{'  REGRESSION' if regressed else ''}"
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
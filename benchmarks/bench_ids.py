@@ -0,0 +1,43 @@
+"""
+ID generation throughput: IdGenerator modes vs. uuid.uuid4() per UETR.
+
+Usage:
+    python benchmarks/bench_ids.py [--count 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ids import ID_MODES, IdGenerator  # noqa: E402
+
+
+def timed(label, count, func):
+    started = time.perf_counter()
+    values = func()
+    seconds = time.perf_counter() - started
+    unique = 'unique' if len(set(values)) == len(values) else 'DUPLICATES'
+    print(f"{label:<28} {seconds:8.2f} s  {count / seconds / 1e6:6.2f} M/s  {unique}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    args = parser.parse_args()
+    count = args.count
+
+    timed('uuid.uuid4()', count, lambda: [str(uuid.uuid4()) for _ in range(count)])
+    timed('random_uetrs (one block)', count, lambda: IdGenerator.random_uetrs(count))
+    for mode in ID_MODES:
+        ids = IdGenerator(mode, seed=0)
+        timed(f"{mode} uetr()", count, lambda: [ids.uetr() for _ in range(count)])
+        ids = IdGenerator(mode, seed=0)
+        timed(f"{mode} transaction_ids()", count,
+              lambda: [ids.transaction_ids()['endToEndId'] for _ in range(count)])
+
+
+if __name__ == '__main__':
+    main()
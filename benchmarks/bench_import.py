@@ -0,0 +1,71 @@
+"""
+Cold-import benchmark for the modules batch workers and the CLI load.
+
+Each module is imported in a fresh interpreter so nothing is cached in
+sys.modules. The check also fails if an import pulls in Streamlit, starts a
+thread or creates files in the working directory.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 7]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('iban', 'routing', 'ids', 'metrics', 'schema_validation', 'templates', 'xml_generator', 'message_model',
+           'synthetic', 'xml_reader', 'validation', 'payment_rules', 'rate_store', 'fx', 'parallel', 'cli', 'bulk')
+
+PROBE = """
+import os, sys, threading, time
+sys.path.insert(0, {root!r})
+before = set(os.listdir('.'))
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(__import__('json').dumps({{
+    'seconds': elapsed,
+    'streamlit': 'streamlit' in sys.modules,
+    'threads': threading.active_count(),
+    'new_files': sorted(set(os.listdir('.')) - before),
+}}))
+"""
+
+
+def probe(module):
+    """Import module in a fresh interpreter (in an empty directory) and return the probe result."""
+    with tempfile.TemporaryDirectory() as workdir:
+        output = subprocess.run([sys.executable, '-c', PROBE.format(root=ROOT, module=module)], cwd=workdir,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=7, help='Fresh interpreters per module; the fastest is reported')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        results = [probe(module) for _ in range(args.repeat)]
+        best = min(result['seconds'] for result in results)
+        problems = []
+        if any(result['streamlit'] for result in results):
+            problems.append('imports streamlit')
+        if any(result['threads'] > 1 for result in results):
+            problems.append('starts threads')
+        if any(result['new_files'] for result in results):
+            problems.append(f"creates {results[0]['new_files']}")
+        failed = failed or bool(problems)
+        print(f"{module:<16} {best * 1000:8.2f} ms  {', '.join(problems) or 'ok'}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
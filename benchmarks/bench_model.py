@@ -0,0 +1,68 @@
+"""
+Batch rendering benchmark: compiled templates vs. the typed message model (--engine model).
+
+Both engines render the same synthetic pacs.008 batch per variant; the model's
+Interner stats show how many parties, agents and accounts were shared instead
+of built again.
+
+Usage:
+    python benchmarks/bench_model.py [--rows 20000] [--population 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_model import Interner, iter_pacs008_model_xml  # noqa: E402
+from synthetic import VARIANTS, SyntheticPayments  # noqa: E402
+from xml_generator import iter_pacs008_xml  # noqa: E402
+
+
+def best(repeat, func):
+    """Fastest of repeat runs of func(), in seconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in func():
+            pass
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000, help='Transactions per batch')
+    parser.add_argument('--population', type=int, default=500,
+                        help='Parties per country in the synthetic data; fewer means more repeats')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats per engine; the fastest one is reported')
+    parser.add_argument('--compact', action='store_true', help='Render minified XML')
+    args = parser.parse_args()
+
+    synthetic = SyntheticPayments(population=args.population)
+    for message_type, channel_type, fedwire_type in VARIANTS:
+        if message_type != 'pacs008':
+            continue
+        rows = list(synthetic.rows(message_type, channel_type, fedwire_type, args.rows))
+        label = f"pacs008 {channel_type}/{fedwire_type or '-'}"
+
+        seconds = best(args.repeat, lambda: iter_pacs008_xml(rows, channel_type, fedwire_type, compact=args.compact))
+        print(f"{label:<30} template {args.rows / seconds:10.0f} tx/s")
+
+        interners = []
+
+        def model():
+            interners.append(Interner())
+            return iter_pacs008_model_xml(rows, channel_type, fedwire_type, compact=args.compact,
+                                          interner=interners[-1])
+
+        seconds = best(args.repeat, model)
+        stats = interners[-1].stats
+        print(f"{label:<30} model    {args.rows / seconds:10.0f} tx/s  shared hits {stats['hits']:>8} "
+              f"misses {stats['misses']:>8} evictions {stats['evictions']:>6} "
+              f"hit rate {interners[-1].hit_rate:6.1%}")
+
+
+if __name__ == '__main__':
+    main()
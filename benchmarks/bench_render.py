@@ -0,0 +1,74 @@
+"""
+Per-message rendering benchmark for the pacs.008 / pain.001 generators.
+
+Usage:
+    python benchmarks/bench_render.py [--number 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xml_generator import generate_pacs008_xml, generate_pain001_xml  # noqa: E402
+
+PACS008_SAMPLE = {
+    'msgId': '20250101ABCDEF12123456', 'intrBkSttlmDt': '2025-01-02', 'sttlmMtd': 'CLRG',
+    'instgAgtBICFI': 'INSTGB2LXXX', 'instdAgtBICFI': 'CDTRGB2LXXX',
+    'instgAgtMmbId': '011104238', 'instdAgtMmbId': '021040078',
+    'dbtrNm': 'Debtor Name', 'dbtrStrtNm': 'Debtor Street', 'dbtrBldgNb': '123', 'dbtrPstCd': '12345',
+    'dbtrTwnNm': 'Debtor City', 'dbtrCtry': 'US', 'dbtrAcctIBAN': '123456789012',
+    'dbtrAgtBICFI_tx': 'DBTRUS33XXX', 'cdtrAgtBICFI_tx': 'CDTRGB2LXXX',
+    'dbtrAgtMmbId': '011104238', 'cdtrAgtMmbId': '021040078',
+    'dbtrAgtNm': 'Debtor Bank', 'dbtrAgtStrtNm': 'Main Street', 'dbtrAgtBldgNb': '1', 'dbtrAgtPstCd': '10001',
+    'dbtrAgtTwnNm': 'New York', 'dbtrAgtCtry': 'US',
+    'cdtrAgtNm': 'Creditor Bank', 'cdtrAgtStrtNm': 'High Street', 'cdtrAgtBldgNb': '2', 'cdtrAgtPstCd': '20001',
+    'cdtrAgtTwnNm': 'Washington', 'cdtrAgtCtry': 'US',
+    'cdtrNm': 'Creditor Name', 'cdtrStrtNm': 'Creditor Street', 'cdtrBldgNb': '456', 'cdtrPstCd': 'SW1A0AA',
+    'cdtrTwnNm': 'London', 'cdtrCtry': 'GB', 'cdtrAcctIBAN': 'GB33BUKB20201555555555',
+    'instdAmt': 100.00, 'intrBkSttlmAmt': 90.50, 'ustrdRmtInf': 'Invoice 67890',
+    'primaryCurrency': 'USD', 'secondaryCurrency': 'EUR', 'exchangeRate': 1.105,
+    'initgPtyNm': 'Initiating Co', 'ultmtDbtrNm': '', 'ultmtCdtrNm': '', 'chrgBr': 'CRED',
+    'taxId': '123456789', 'taxType': '94105', 'taxYear': '2024', 'taxPeriod': 'MM03',
+}
+
+PAIN001_SAMPLE = {
+    'msgId': 'MSG20250101', 'creDtTm': '2025-01-01T10:00:00+00:00', 'initgPtyNm': 'Originator Company',
+    'pmtInfId': 'PMTINF20250101', 'pmtMtd': 'TRF', 'btchBookg': True, 'reqdExctnDt': '2025-01-02',
+    'dbtrNm': 'Debtor Name', 'dbtrStrtNm': 'Debtor Street', 'dbtrBldgNb': '10', 'dbtrPstCd': '10001',
+    'dbtrTwnNm': 'New York', 'dbtrCtry': 'US', 'dbtrAcctIBAN': 'US12345678901234567890',
+    'dbtrAgtBICFI': 'DBTRUS33XXX', 'cdtrAgtBICFI': 'CDTRGB2LXXX', 'cdtrNm': 'Creditor Name',
+    'cdtrStrtNm': 'Creditor Street', 'cdtrBldgNb': '20', 'cdtrPstCd': 'SW1A0AA', 'cdtrTwnNm': 'London',
+    'cdtrCtry': 'GB', 'cdtrAcctIBAN': 'GB33BUKB20201555555555', 'instdAmt': 100.00,
+    'ustrdRmtInf': 'Payment for services rendered', 'currency': 'EUR',
+}
+
+VARIANTS = [
+    ('swift', None),
+    ('fedwire', 'domestic'),
+    ('fedwire', 'international'),
+    ('fedwire', 'tax'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='Messages rendered per variant and repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats per variant; the fastest one is reported')
+    args = parser.parse_args()
+
+    def best(func):
+        return min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+
+    for channel_type, fedwire_type in VARIANTS:
+        seconds = best(lambda: generate_pacs008_xml(PACS008_SAMPLE, channel_type, fedwire_type))
+        label = f"pacs008 {channel_type}/{fedwire_type or '-'}"
+        print(f"{label:<32} {seconds / args.number * 1e6:8.2f} us/msg  {args.number / seconds:10.0f} msg/s")
+
+    seconds = best(lambda: generate_pain001_xml(PAIN001_SAMPLE))
+    print(f"{'pain001':<32} {seconds / args.number * 1e6:8.2f} us/msg  {args.number / seconds:10.0f} msg/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+XSD validation cost: schema compilation, per-message validation and streaming batch validation.
+
+Usage:
+    python benchmarks/bench_schema.py [--number 2000] [--batch 20000]
+
+Needs lxml (pip install lxml).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_render import PACS008_SAMPLE, PAIN001_SAMPLE, VARIANTS  # noqa: E402
+from schema_validation import MESSAGE_SCHEMAS, StreamValidator, is_available, load_schema, validate_message  # noqa: E402
+from xml_generator import (generate_pacs008_xml, generate_pain001_xml, iter_pacs008_xml,  # noqa: E402
+                           iter_pain001_xml)
+
+
+def best_of(repeat, func):
+    """Fastest of repeat runs of func(), in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def stream_batch(message_type, chunks):
+    validator = StreamValidator(message_type)
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        validator.feed(chunk)
+    return validator.close(), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='Single messages validated per variant and repeat')
+    parser.add_argument('--batch', type=int, default=20000, help='Transactions in the streamed batch message')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats; the fastest one is reported')
+    args = parser.parse_args()
+
+    if not is_available():
+        raise SystemExit("bench_schema needs lxml: pip install lxml")
+
+    for name in MESSAGE_SCHEMAS.values():
+        started = time.perf_counter()
+        load_schema(name)
+        print(f"compile {name:<24} {(time.perf_counter() - started) * 1e3:8.1f} ms (once per process)")
+
+    cases = [(f"pacs008 {channel_type}/{fedwire_type or '-'}", 'pacs008',
+              lambda ch=channel_type, fw=fedwire_type: generate_pacs008_xml(PACS008_SAMPLE, ch, fw),
+              lambda rows, ch=channel_type, fw=fedwire_type: iter_pacs008_xml(rows, ch, fw))
+             for channel_type, fedwire_type in VARIANTS]
+    cases.append(('pain001', 'pain001', lambda: generate_pain001_xml(PAIN001_SAMPLE), iter_pain001_xml))
+
+    print(f"{'':<32} {'render':>9} {'validate':>9} {'stream':>9}  (us per message / transaction)")
+    for label, message_type, render, iter_batch in cases:
+        messages = [render() for _ in range(args.number)]
+        render_seconds = best_of(args.repeat, lambda: [render() for _ in range(args.number)])
+        validate_seconds = best_of(args.repeat, lambda: [validate_message(xml, message_type) for xml in messages])
+
+        rows = [PAIN001_SAMPLE if message_type == 'pain001' else PACS008_SAMPLE] * args.batch
+        errors, size = stream_batch(message_type, iter_batch(rows))
+        stream_seconds = best_of(args.repeat, lambda: stream_batch(message_type, iter_batch(rows)))
+
+        note = 'valid' if not validate_message(messages[0], message_type) and not errors else 'INVALID'
+        print(f"{label:<32} {render_seconds / args.number * 1e6:9.1f} {validate_seconds / args.number * 1e6:9.1f} "
+              f"{stream_seconds / args.batch * 1e6:9.1f}  {size / stream_seconds / 1e6:6.1f} MB/s  {note}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+Background bulk generation for the Streamlit upload tab.
+
+A BulkJob takes the bytes of an uploaded CSV, JSONL or Excel file and runs in
+its own thread: rows are read and validated with the same rules as the CLI
+(cli.iter_checked_rows), then rendered either into a zip archive of one message
+per row or into a single multi-transaction message. The thread only updates
+plain attributes (stage, done, total, ...), so the UI can poll them and draw a
+progress bar without blocking reruns; the output is kept in memory until it is
+downloaded.
+
+    job = BulkJob(uploaded.getvalue(), uploaded.name, 'pacs008', 'swift')
+    job.start()
+    ...
+    if job.finished and not job.error:
+        job.output, job.file_name, job.mime
+"""
+import io
+import tempfile
+import threading
+import zipfile
+
+from cli import guess_input_format, iter_checked_rows, parse_rows, read_xlsx_rows
+from ids import IdGenerator
+from metrics import METRICS
+from parallel import message_file_name
+from schema_validation import StreamValidator, validate_message, validating_chunks
+from xml_generator import generate_pacs008_xml, generate_pain001_xml, iter_pacs008_xml, iter_pain001_xml, write_chunks
+
+OUTPUT_MODES = ('zip', 'batch')
+# Errors kept for display; the counts cover every invalid row
+MAX_REPORTED_ERRORS = 1000
+# Output stays in memory up to this size, then spills to a temporary file while it is written
+SPOOL_SIZE = 32 * 1024 * 1024
+
+
+def read_upload(data, file_name, input_format=None):
+    """
+    Lazily read payment rows from the bytes of an uploaded file.
+
+    Args:
+        data (bytes): File contents.
+        file_name (str): Uploaded file name, used to guess the format.
+        input_format (str): 'csv', 'jsonl' or 'xlsx'. Guessed from file_name if omitted.
+    Yields:
+        dict: One row per payment, keyed like the form data.
+    """
+    input_format = input_format or guess_input_format(file_name)
+    if input_format == 'xlsx':
+        yield from read_xlsx_rows(io.BytesIO(data))
+        return
+    # utf-8-sig drops the byte order mark Excel writes at the start of CSV exports
+    yield from parse_rows(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', newline=''), input_format)
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class BulkJob:
+    """
+    Validate and render an uploaded payment file in a background thread.
+
+    Args:
+        data (bytes): Uploaded CSV, JSONL or Excel file.
+        file_name (str): Uploaded file name.
+        message_type (str): 'pacs008' or 'pain001'.
+        channel_type (str): 'fedwire' or 'swift' (pacs008 only).
+        fedwire_type (str): 'domestic', 'international' or 'tax' (fedwire only).
+        output_mode (str): 'zip' for one message per row, 'batch' for one multi-transaction message.
+        skip_invalid (bool): Render the valid rows when some rows fail validation
+                             (otherwise the job fails without output).
+        compact (bool): Render minified XML.
+        validate_schema (bool): Validate the generated XML against the bundled XSDs (needs lxml).
+        input_format (str): 'csv', 'jsonl' or 'xlsx'. Guessed from file_name if omitted.
+    """
+
+    def __init__(self, data, file_name, message_type, channel_type=None, fedwire_type=None, output_mode='zip',
+                 skip_invalid=True, compact=False, validate_schema=False, input_format=None):
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode: {output_mode}")
+        if message_type == 'pain001' or channel_type == 'swift':
+            fedwire_type = None
+        self.data = data
+        self.source_name = file_name
+        self.input_format = input_format
+        self.message_type = message_type
+        self.channel_type = channel_type
+        self.fedwire_type = fedwire_type
+        self.output_mode = output_mode
+        self.skip_invalid = skip_invalid
+        self.compact = compact
+        self.validate_schema = validate_schema
+
+        # Progress, read by the UI while the thread runs
+        self.stage = 'queued'
+        self.done = 0
+        self.total = 0
+        self.valid = 0
+        self.invalid = 0
+        self.errors = []
+        self.schema_errors = []
+        self.error = None
+        self.output = None
+        self.file_name = None
+        self.mime = None
+
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"bulk-{message_type}", daemon=True)
+
+    @property
+    def finished(self):
+        return self.stage in ('done', 'failed', 'cancelled')
+
+    @property
+    def progress(self):
+        """Fraction of the current stage that is done, between 0 and 1."""
+        if self.stage == 'done':
+            return 1.0
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Ask the thread to stop after the current row."""
+        self._cancelled.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise _Cancelled
+
+    def _run(self):
+        try:
+            with METRICS.span('bulk_job', message=self.message_type, output=self.output_mode):
+                rows = self._validate()
+                self._render(rows)
+            self.stage = 'done'
+        except _Cancelled:
+            self.stage = 'cancelled'
+        except Exception as e:
+            # Reported by the UI; a thread has nobody else to raise to
+            self.error = f"{type(e).__name__}: {e}"
+            self.stage = 'failed'
+        finally:
+            # The upload is no longer needed once the rows are read
+            self.data = None
+
+    def _validate(self):
+        self.stage = 'reading'
+        rows = list(read_upload(self.data, self.source_name, self.input_format))
+        if not rows:
+            raise ValueError(f"No payment rows found in {self.source_name}")
+
+        self.stage = 'validating'
+        self.total = len(rows)
+        valid_rows = []
+        for row_number, data, errors in iter_checked_rows(rows, self.message_type, self.channel_type,
+                                                          self.fedwire_type):
+            self._check_cancelled()
+            self.done = row_number
+            if errors:
+                self.invalid += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.extend((row_number, error) for error in errors)
+                continue
+            self.valid += 1
+            valid_rows.append(data)
+
+        if self.invalid and not self.skip_invalid:
+            raise ValueError(f"{self.invalid} row(s) failed validation; allow skipping invalid rows to render the rest")
+        if not valid_rows:
+            raise ValueError("No valid rows to render")
+        return valid_rows
+
+    def _render(self, rows):
+        self.stage = 'rendering'
+        self.done = 0
+        self.total = len(rows)
+        ids = IdGenerator()
+        stem = self.source_name.rsplit('.', 1)[0] or self.message_type
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as buffer:
+            if self.output_mode == 'zip':
+                self._write_zip(buffer, rows, ids)
+                self.file_name, self.mime = f"{stem}_{self.message_type}.zip", 'application/zip'
+            else:
+                self._write_batch(buffer, rows, ids)
+                self.file_name, self.mime = f"{stem}_{self.message_type}_batch.xml", 'application/xml'
+            buffer.seek(0)
+            self.output = buffer.read()
+
+    def _write_zip(self, buffer, rows, ids):
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for index, data in enumerate(rows, start=1):
+                self._check_cancelled()
+                data = ids.fill(data)
+                if self.message_type == 'pacs008':
+                    xml = generate_pacs008_xml(data, self.channel_type, self.fedwire_type, compact=self.compact)
+                else:
+                    xml = generate_pain001_xml(data, compact=self.compact)
+                name = message_file_name(self.message_type, index)
+                archive.writestr(name, xml)
+                if self.validate_schema:
+                    self.schema_errors.extend((name, error) for error in validate_message(xml, self.message_type))
+                self.done = index
+
+    def _counted(self, rows):
+        for index, data in enumerate(rows, start=1):
+            self._check_cancelled()
+            yield data
+            self.done = index
+
+    def _write_batch(self, buffer, rows, ids):
+        rows = self._counted(rows)
+        if self.message_type == 'pacs008':
+            chunks = iter_pacs008_xml(rows, self.channel_type, self.fedwire_type, compact=self.compact, ids=ids)
+        else:
+            chunks = iter_pain001_xml(rows, compact=self.compact, ids=ids)
+        if not self.validate_schema:
+            write_chunks(buffer, chunks)
+            return
+        validator = StreamValidator(self.message_type)
+        write_chunks(buffer, validating_chunks(chunks, validator))
+        self.schema_errors.extend(('batch', error) for error in validator.close())
@@ -0,0 +1,437 @@
+"""
+Headless command-line entry point for bulk ISO 20022 message generation.
+
+Reads payment rows from CSV, JSONL or Excel using the same keys as the Streamlit form
+(st.session_state.form_data['pacs008'] / ['pain001']), validates them and writes
+the generated XML without importing Streamlit.
+
+Examples:
+    python -m cli pacs008 --channel fedwire --fedwire-type domestic -i rows.csv -o out/
+    python -m cli pacs008 --channel swift -i rows.jsonl --batch out/pacs008_batch.xml
+    python -m cli pain001 -i rows.csv -o out/
+    python -m cli pacs008 --channel swift -i rows.csv --batch out/batch.xml --engine model
+"""
+import argparse
+import csv
+import datetime
+import io
+import itertools
+import json
+import os
+import sys
+import time
+
+from ids import ID_MODES, IdGenerator
+from message_model import Interner, iter_pacs008_model_xml, write_pacs008_model_xml
+from metrics import write_metrics
+from parallel import DEFAULT_CHUNK_SIZE, message_file_name, run_sharded, summarize_by_worker
+from routing import open_directory
+from schema_validation import StreamValidator, validate_message, validating_chunks
+from schema_validation import is_available as schema_validation_available
+from validation import (compile_rules, validate_account_fields, validate_routing_fields, validate_usaba_fields,
+                        validate_tax_fields)
+from xml_generator import (COMPRESSION_SUFFIXES, compression_for_path, generate_pacs008_xml, generate_pain001_xml,
+                           iter_pacs008_xml, iter_pain001_xml, open_output, write_chunks, write_pacs008_xml,
+                           write_pain001_xml)
+
+IRS_ROUTING_NUMBER = '091036164'
+VALIDATION_CHUNK_SIZE = 4096
+
+
+INPUT_FORMATS = ('csv', 'jsonl', 'xlsx')
+# template: the compiled xml_generator templates; model: the message_model objects, sharing repeated parties
+ENGINES = ('template', 'model')
+
+
+def guess_input_format(file_name):
+    """Input format for a file name: 'jsonl' for .jsonl/.ndjson/.json, 'xlsx' for Excel workbooks, else 'csv'."""
+    name = file_name.lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith(('.xlsx', '.xlsm')):
+        return 'xlsx'
+    return 'csv'
+
+
+def parse_rows(f, input_format):
+    """
+    Lazily parse payment rows from an open text file.
+
+    Args:
+        f (file object): CSV or JSONL text (opened with newline='' for CSV).
+        input_format (str): 'csv' or 'jsonl'.
+    Yields:
+        dict: One row per payment, keyed like the form data.
+    """
+    if input_format == 'csv':
+        yield from csv.DictReader(f)
+        return
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Whole numbers come back as floats (1500.0); routing and account numbers must stay digits
+        return str(int(value))
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def read_xlsx_rows(f):
+    """
+    Lazily read payment rows from the active sheet of an Excel workbook (needs openpyxl).
+
+    The first row holds the field names. Cells are returned as text, like CSV
+    values; numbers typed into the sheet lose leading zeros, so routing and
+    account number columns should be formatted as text.
+
+    Args:
+        f (str or file object): Workbook path or seekable binary file.
+    Yields:
+        dict: One row per non-empty sheet row.
+    """
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("Excel input needs openpyxl: pip install openpyxl") from None
+
+    workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    try:
+        sheet_rows = workbook.active.iter_rows(values_only=True)
+        header = next(sheet_rows, None)
+        if header is None:
+            return
+        keys = [_cell_text(key).strip() for key in header]
+        for values in sheet_rows:
+            if all(value is None or value == '' for value in values):
+                continue
+            yield {key: _cell_text(value) for key, value in zip(keys, values) if key}
+    finally:
+        workbook.close()
+
+
+def read_rows(path, input_format=None):
+    """
+    Lazily read payment rows from a CSV, JSONL or Excel file.
+
+    Args:
+        path (str): Input file path, or '-' for stdin.
+        input_format (str): 'csv', 'jsonl' or 'xlsx'. Guessed from the file extension if omitted.
+    Yields:
+        dict: One row per payment, keyed like the form data.
+    """
+    if input_format is None:
+        input_format = guess_input_format(path)
+
+    if input_format == 'xlsx':
+        # Workbooks are zip files and need a seekable input
+        yield from read_xlsx_rows(io.BytesIO(sys.stdin.buffer.read()) if path == '-' else path)
+        return
+
+    f = sys.stdin if path == '-' else open(path, 'r', newline='', encoding='utf-8')
+    try:
+        yield from parse_rows(f, input_format)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _to_float(value, default=None):
+    if value is None or value == '':
+        return default
+    return float(value)
+
+
+def prepare_row(row, message_type, channel_type=None, fedwire_type=None):
+    """
+    Coerce a raw CSV/JSONL row into the value types the generators expect and
+    apply the same fixed values the Streamlit form enforces (e.g. tax payments).
+    """
+    data = {key: ('' if value is None else value) for key, value in row.items()}
+
+    if message_type == 'pain001':
+        data['instdAmt'] = _to_float(data.get('instdAmt'), 0.00)
+        btch_bookg = data.get('btchBookg', False)
+        if isinstance(btch_bookg, str):
+            btch_bookg = btch_bookg.strip().lower() in ('true', '1', 'yes')
+        data['btchBookg'] = btch_bookg
+        return data
+
+    data['instdAmt'] = _to_float(data.get('instdAmt'), 0.00)
+    data['exchangeRate'] = _to_float(data.get('exchangeRate'))
+
+    if channel_type == 'fedwire' and fedwire_type != 'international':
+        # Fedwire domestic and tax payments settle in USD without FX, as in the form (and the XML always says USD),
+        # so an exchangeRate column must not convert the settlement amount
+        data['primaryCurrency'] = 'USD'
+        data['secondaryCurrency'] = 'USD'
+        data['exchangeRate'] = None
+        if fedwire_type == 'tax':
+            # Tax payments go to the US Treasury
+            data['instdAgtMmbId'] = IRS_ROUTING_NUMBER
+
+    settlement_amount = _to_float(data.get('intrBkSttlmAmt'))
+    if settlement_amount is None:
+        # Same rule as the form: settlement amount = instructed amount / exchange rate
+        settlement_amount = data['instdAmt']
+        if data['exchangeRate'] and data.get('primaryCurrency', 'USD') != data.get('secondaryCurrency', 'USD'):
+            settlement_amount = round(data['instdAmt'] / data['exchangeRate'], 2)
+    data['intrBkSttlmAmt'] = settlement_amount
+
+    return data
+
+
+def validate_row(data, message_type, channel_type, fedwire_type, aba_directory=None, bic_directory=None):
+    """Run the same validation the Generate XML button runs. Returns a list of error messages."""
+    errors = []
+    if message_type == 'pacs008' and channel_type == 'fedwire':
+        errors = validate_usaba_fields(data, channel_type, fedwire_type)
+        if fedwire_type == 'tax':
+            errors.extend(validate_tax_fields(data))
+    errors.extend(validate_account_fields(data, message_type, channel_type, fedwire_type))
+    errors.extend(validate_routing_fields(data, message_type, channel_type, fedwire_type, aba_directory, bic_directory))
+    return errors
+
+
+def iter_checked_rows(rows, message_type, channel_type, fedwire_type, aba_index=None, bic_index=None,
+                      chunk_size=VALIDATION_CHUNK_SIZE):
+    """
+    Prepare and validate rows.
+
+    Rows are validated a chunk at a time with the compiled rule set for the
+    variant (same rules and messages as validate_row).
+
+    Yields:
+        tuple: (row number from 1, prepared row or None, list of error messages) for every row.
+    """
+    rules = compile_rules(message_type, channel_type, fedwire_type, aba_index, bic_index)
+    rows = enumerate(rows, start=1)
+
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        prepared = []
+        for row_number, row in chunk:
+            try:
+                prepared.append((row_number, prepare_row(row, message_type, channel_type, fedwire_type), None))
+            except ValueError as e:
+                prepared.append((row_number, None, [f"Invalid number: {e}"]))
+
+        result = rules.validate_rows([data for _, data, errors in prepared if errors is None])
+        valid_index = 0
+        for row_number, data, errors in prepared:
+            if errors is None:
+                errors = result.errors(valid_index) if result.masks[valid_index] else []
+                valid_index += 1
+            yield row_number, data, errors
+
+
+def iter_valid_rows(rows, args, stats, chunk_size=VALIDATION_CHUNK_SIZE):
+    """Prepare and validate rows (see iter_checked_rows), reporting and skipping invalid ones."""
+    checked = iter_checked_rows(rows, args.message_type, args.channel, args.fedwire_type, args.aba_index,
+                                args.bic_index, chunk_size)
+    for row_number, data, errors in checked:
+        if errors:
+            stats['invalid'] += 1
+            for error in errors:
+                print(f"row {row_number}: {error}", file=sys.stderr)
+            if not args.skip_invalid:
+                raise SystemExit(f"Aborting: row {row_number} failed validation (use --skip-invalid to continue)")
+            continue
+
+        stats['valid'] += 1
+        yield data
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m cli', description='Generate ISO 20022 pacs.008 / pain.001 XML from CSV, JSONL or Excel rows.')
+    parser.add_argument('message_type', choices=['pacs008', 'pain001'])
+    parser.add_argument('-i', '--input', required=True,
+                        help="CSV, JSONL or Excel (.xlsx) file with one payment per row ('-' for stdin)")
+    parser.add_argument('--format', dest='input_format', choices=INPUT_FORMATS,
+                        help='Input format (default: guessed from the file extension); xlsx needs openpyxl')
+    parser.add_argument('--channel', choices=['fedwire', 'swift'], default='swift',
+                        help='pacs.008 channel type (default: swift)')
+    parser.add_argument('--fedwire-type', choices=['domestic', 'international', 'tax'], default='domestic',
+                        help='Fedwire payment type (default: domestic)')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('-o', '--output-dir', help='Write one XML message per row into this directory')
+    output.add_argument('--batch', help='Write a single multi-transaction message to this file')
+    parser.add_argument('--skip-invalid', action='store_true',
+                        help='Skip rows that fail validation instead of aborting')
+    parser.add_argument('--aba-directory',
+                        help='Reject USABA routing numbers not listed in this directory file (one routing number '
+                             'per line, e.g. a FedACH/Fedwire directory export); a sorted .idx index is built next '
+                             'to it')
+    parser.add_argument('--bic-directory',
+                        help='Reject BICs not listed in this directory file (one BIC per line)')
+    parser.add_argument('--validate-schema', action='store_true',
+                        help='Validate every generated message against the bundled ISO 20022 XSDs (needs lxml); '
+                             'exits with status 1 if any message is invalid')
+    parser.add_argument('--compact', action='store_true',
+                        help='Write minified XML without indentation or line breaks (about half the size)')
+    parser.add_argument('--compress', choices=sorted(set(COMPRESSION_SUFFIXES.values())),
+                        help='Compress the output files (default: guessed from a .gz/.zst --batch file name); '
+                             'zstd needs Python 3.14+ or the zstandard package')
+    parser.add_argument('--ids', choices=ID_MODES,
+                        help='How InstrId/EndToEndId/UETR are generated for rows without them: uuid (random, '
+                             'the default), seeded (reproducible, see --seed) or sequence (numbered)')
+    parser.add_argument('--seed', help='Seed for reproducible IDs (implies --ids seeded)')
+    parser.add_argument('--id-prefix', default='', help='Tag inserted into every generated InstrId/EndToEndId')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='Render with this many worker processes (0 = one per CPU). With --batch, '
+                             'each shard is written as its own file: <name>.part-00001.xml, ...')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Rows per shard when --workers is used (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--engine', choices=ENGINES, default='template',
+                        help='Render with the compiled templates (default) or the typed message model, which '
+                             'builds parties, agents and accounts repeated across rows once (pacs008 --batch only)')
+    parser.add_argument('--metrics',
+                        help='Write render/validation timings and counters to this file when done: '
+                             'Prometheus text for .prom/.txt, a JSON snapshot otherwise')
+    return parser
+
+
+def run_parallel(rows, args):
+    """
+    Render rows with a process pool and report per-worker throughput on stderr.
+
+    Returns:
+        list: The (file name, error message) schema errors reported by the workers.
+    """
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    results = run_sharded(rows, args.message_type, args.channel, args.fedwire_type, workers=args.workers or None,
+                          chunk_size=args.chunk_size, batch_path=args.batch, output_dir=args.output_dir,
+                          validate_schema=args.validate_schema, compact=args.compact, compression=args.compress,
+                          ids=args.id_generator, engine=args.engine)
+    elapsed = time.perf_counter() - started
+
+    for worker in summarize_by_worker(results):
+        print(f"worker {worker['pid']}: {worker['rows']} row(s) in {worker['shards']} shard(s), "
+              f"{worker['seconds']:.2f}s busy, {worker['rows_per_sec']:.0f} rows/s", file=sys.stderr)
+    total_rows = sum(result['rows'] for result in results)
+    if elapsed:
+        print(f"total: {total_rows} row(s) in {elapsed:.2f}s, {total_rows / elapsed:.0f} rows/s", file=sys.stderr)
+    if args.engine == 'model':
+        report_interner({key: sum(result['interner'][key] for result in results)
+                         for key in ('hits', 'misses', 'evictions')})
+    return [error for result in results for error in result['schema_errors']]
+
+
+def write_batch(f, rows, args):
+    """
+    Write the batch message, validating it against its XSD while it is written
+    when --validate-schema is given.
+
+    Returns:
+        list: Schema error messages.
+    """
+    if not args.validate_schema:
+        if args.engine == 'model':
+            write_pacs008_model_xml(f, rows, args.channel, args.fedwire_type, compact=args.compact,
+                                    ids=args.id_generator, interner=args.interner)
+        elif args.message_type == 'pacs008':
+            write_pacs008_xml(f, rows, args.channel, args.fedwire_type, compact=args.compact, ids=args.id_generator)
+        else:
+            write_pain001_xml(f, rows, compact=args.compact, ids=args.id_generator)
+        return []
+
+    validator = StreamValidator(args.message_type)
+    if args.engine == 'model':
+        chunks = iter_pacs008_model_xml(rows, args.channel, args.fedwire_type, compact=args.compact,
+                                        ids=args.id_generator, interner=args.interner)
+    elif args.message_type == 'pacs008':
+        chunks = iter_pacs008_xml(rows, args.channel, args.fedwire_type, compact=args.compact, ids=args.id_generator)
+    else:
+        chunks = iter_pain001_xml(rows, compact=args.compact, ids=args.id_generator)
+    write_chunks(f, validating_chunks(chunks, validator))
+    return validator.close()
+
+
+def report_interner(stats):
+    """Print how many shared model objects the --engine model run reused."""
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / lookups if lookups else 0.0
+    print(f"model engine: {stats['hits']} shared object(s) reused, {stats['misses']} built, "
+          f"{stats['evictions']} evicted ({hit_rate:.0%} hit rate)", file=sys.stderr)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.message_type == 'pain001' or args.channel == 'swift':
+        args.fedwire_type = None
+    if args.validate_schema and not schema_validation_available():
+        raise SystemExit("--validate-schema needs lxml: pip install lxml")
+    if args.engine == 'model' and (args.message_type != 'pacs008' or not args.batch):
+        raise SystemExit("--engine model only writes pacs008 --batch files")
+    args.interner = Interner() if args.engine == 'model' else None
+    if args.compress is None and args.batch:
+        args.compress = compression_for_path(args.batch)
+    try:
+        args.id_generator = IdGenerator(args.ids or ('seeded' if args.seed is not None else 'uuid'), args.seed,
+                                        args.id_prefix)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    args.aba_index = open_directory(args.aba_directory, 'aba') if args.aba_directory else None
+    args.bic_index = open_directory(args.bic_directory, 'bic') if args.bic_directory else None
+
+    stats = {'valid': 0, 'invalid': 0}
+    rows = iter_valid_rows(read_rows(args.input, args.input_format), args, stats)
+    schema_errors = []
+
+    if args.workers != 1:
+        schema_errors = run_parallel(rows, args)
+    elif args.batch:
+        try:
+            with open_output(args.batch, args.compress) as f:
+                schema_errors = [(args.batch, error) for error in write_batch(f, rows, args)]
+        except ValueError as e:
+            os.remove(args.batch)
+            raise SystemExit(f"Aborting: {e}")
+        except SystemExit:
+            # Do not leave a truncated batch file behind
+            os.remove(args.batch)
+            raise
+        if args.interner is not None:
+            report_interner(args.interner.stats)
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for index, data in enumerate(rows, start=1):
+            data = args.id_generator.fill(data)
+            if args.message_type == 'pacs008':
+                xml = generate_pacs008_xml(data, args.channel, args.fedwire_type, compact=args.compact)
+            else:
+                xml = generate_pain001_xml(data, compact=args.compact)
+            path = os.path.join(args.output_dir, message_file_name(args.message_type, index, args.compress))
+            with open_output(path, args.compress) as f:
+                write_chunks(f, (xml,))
+            if args.validate_schema:
+                schema_errors += [(path, error) for error in validate_message(xml, args.message_type)]
+
+    print(f"Generated {stats['valid']} {args.message_type} transaction(s), skipped {stats['invalid']} invalid row(s)",
+          file=sys.stderr)
+    if args.metrics:
+        write_metrics(args.metrics)
+
+    if schema_errors:
+        for path, error in schema_errors:
+            print(f"{path}: {error}", file=sys.stderr)
+        print(f"Schema validation failed for {len({path for path, _ in schema_errors})} file(s)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
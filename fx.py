@@ -0,0 +1,639 @@
+"""
+Exchange-rate lookups shared by the Streamlit app and batch jobs.
+
+ExchangeRateService keeps the latest rate table per base currency in a bounded
+LRU cache with a freshness window (TTL). Concurrent requests for the same base
+currency are coalesced so only one HTTP request per base is in flight at a time
+(single flight), and hit/miss/stale counters make cache behaviour visible.
+Pairs not covered by a cached table directly are answered through a cross-rate
+index over all cached tables (e.g. EUR->JPY via USD). Cache lookups and API
+fetches are timed in metrics.METRICS (fx_lookup, fx_fetch spans), and the
+counters of services created by get_service are exported there as fx_*.
+
+Tables can be prefetched concurrently (prefetch_rates / start_prefetch) and
+kept fresh by a RateRefresher thread; with stale_while_revalidate a stale table
+is served immediately while it is refetched in the background. fetch_rates is
+a blocking call, so concurrent fetches run on a thread pool sharing one pooled
+HTTP session. Failed background fetches are reported through the service's
+on_error callback.
+
+Importing this module has no side effects and does not load thread pools; they
+are imported when prefetching or revalidating first needs them.
+
+Cache entries use the same layout as exchange_rate_cache.json:
+    {'USD': {'rates': {'EUR': 0.86, ...}, 'timestamp': '2025-...', 'base': 'USD'}}
+"""
+import datetime
+import random
+import threading
+from collections import OrderedDict
+
+from metrics import METRICS
+from rate_store import JsonRateStore
+
+API_URL = "https://api.exchangerate-api.com/v4/latest/{base}"
+REQUEST_TIMEOUT = 5
+DEFAULT_TTL_MINUTES = 15
+DEFAULT_MAX_BASES = 64
+PIVOT_CURRENCY = 'USD'
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REFRESH_JITTER = 0.1
+REFRESH_RETRY_SECONDS = 30
+# Base currencies worth having before the first user asks (the form's currency list)
+PREFETCH_CURRENCIES = ('USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF')
+
+
+def fetch_rates_http(base_currency, api_url=API_URL, timeout=REQUEST_TIMEOUT, session=None):
+    """
+    Fetch the rate table for base_currency from the exchange-rate API.
+
+    Args:
+        session: Optional requests.Session to reuse pooled keep-alive connections.
+    Returns:
+        dict: Currency code -> units of that currency per 1 base_currency.
+    Raises:
+        Exception: On network errors, non-200 responses or malformed payloads.
+    """
+    if session is None:
+        import requests
+        session = requests
+
+    response = session.get(api_url.format(base=base_currency), timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code} from exchange-rate API")
+    return response.json()['rates']
+
+
+class PooledRateFetcher:
+    """
+    fetch_rates callable that keeps one requests.Session, so repeated and
+    concurrent fetches reuse pooled keep-alive connections instead of opening
+    a new connection per call.
+    """
+
+    def __init__(self, api_url=API_URL, timeout=REQUEST_TIMEOUT, pool_size=DEFAULT_CONCURRENCY):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def __call__(self, base_currency):
+        return fetch_rates_http(base_currency, self.api_url, self.timeout, self.session)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class _Flight:
+    """A fetch in progress that other callers can wait on."""
+    __slots__ = ('done', 'entry', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class CrossRateIndex:
+    """
+    Cross rates for every currency reachable from the cached tables via a pivot.
+
+    Each currency is stored once as units per 1 pivot currency, together with the
+    timestamp of the oldest table it was derived from, so any pair is answered
+    in O(1) as units[to] / units[from]. When several tables cover a currency the
+    freshest derivation wins.
+
+    Args:
+        entries (dict): Cache entries keyed by base currency.
+        pivot (str): Currency every rate is expressed against.
+    """
+    __slots__ = ('pivot', 'units', 'timestamps')
+
+    def __init__(self, entries, pivot=PIVOT_CURRENCY):
+        self.pivot = pivot
+        self.units = {}
+        self.timestamps = {}
+
+        pivot_entry = entries.get(pivot)
+        for base_currency, entry in entries.items():
+            rates, timestamp = entry['rates'], entry['timestamp']
+
+            # How many units of base_currency one pivot unit buys, from this table or the pivot table
+            if base_currency == pivot:
+                base_units = 1.0
+            elif rates.get(pivot):
+                base_units = 1 / rates[pivot]
+            elif pivot_entry is not None and pivot_entry['rates'].get(base_currency):
+                base_units = pivot_entry['rates'][base_currency]
+                timestamp = min(timestamp, pivot_entry['timestamp'])
+            else:
+                continue
+
+            for currency, rate in rates.items():
+                if currency == pivot or not rate:
+                    continue
+                known = self.timestamps.get(currency)
+                if known is None or timestamp > known:
+                    self.units[currency] = rate * base_units
+                    self.timestamps[currency] = timestamp
+
+    def rate(self, from_currency, to_currency):
+        """
+        Return (rate, timestamp) for from_currency -> to_currency, or (None, None)
+        if either currency cannot be reached. The timestamp is that of the oldest leg.
+        """
+        pivot = self.pivot
+        if from_currency == pivot:
+            from_units, from_timestamp = 1.0, None
+        else:
+            from_units = self.units.get(from_currency)
+            if from_units is None:
+                return None, None
+            from_timestamp = self.timestamps[from_currency]
+
+        if to_currency == pivot:
+            to_units, to_timestamp = 1.0, None
+        else:
+            to_units = self.units.get(to_currency)
+            if to_units is None:
+                return None, None
+            to_timestamp = self.timestamps[to_currency]
+
+        if from_timestamp is None:
+            timestamp = to_timestamp
+        elif to_timestamp is None:
+            timestamp = from_timestamp
+        else:
+            timestamp = min(from_timestamp, to_timestamp)
+        return to_units / from_units, timestamp
+
+
+class ExchangeRateService:
+    """
+    In-memory FX rate cache with TTL/LRU eviction and single-flight fetching.
+
+    Args:
+        fetch_rates (callable): fetch_rates(base_currency) -> rates dict. Defaults to a
+                                PooledRateFetcher; pass a stand-in for tests or offline use.
+        ttl_minutes (float): How long a rate table is considered fresh.
+        ttl_overrides (dict): Per base currency TTLs in minutes, e.g. {'JPY': 5}.
+        stale_while_revalidate (bool): Serve stale cached rates immediately from
+                                       get_rate and refetch them in the background.
+        max_bases (int): Maximum number of base-currency tables kept in memory.
+        cache_file (str): Optional JSON file the cache is loaded from and saved to
+                          (through a JsonRateStore journal).
+        pivot (str): Pivot currency for cross rates between cached tables.
+        on_error (callable): Called with (base_currency, exception) when a background fetch
+                             (prefetch, revalidation, refresh) fails or the cache file cannot be
+                             read or written (base_currency is None for the whole file). Default: print.
+    """
+
+    def __init__(self, fetch_rates=None, ttl_minutes=DEFAULT_TTL_MINUTES, max_bases=DEFAULT_MAX_BASES,
+                 cache_file=None, pivot=PIVOT_CURRENCY, ttl_overrides=None, stale_while_revalidate=False,
+                 on_error=None):
+        self.fetch_rates = fetch_rates or PooledRateFetcher()
+        self.on_error = on_error
+        self.ttl_minutes = ttl_minutes
+        self.ttl_overrides = dict(ttl_overrides or {})
+        self.stale_while_revalidate = stale_while_revalidate
+        self.refresher = None
+        self.max_bases = max_bases
+        self.cache_file = cache_file
+        self.store = JsonRateStore(cache_file) if cache_file else None
+        self.pivot = pivot
+        self._entries = OrderedDict()
+        self._cross_rates = None
+        self._in_flight = {}
+        self._revalidator = None
+        self._lock = threading.Lock()
+        # stale counts every stale rate served; fallbacks the ones served because the API failed
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'fallbacks': 0, 'fetches': 0, 'coalesced': 0, 'errors': 0,
+                      'evictions': 0, 'cross_builds': 0, 'revalidations': 0}
+
+    # Cache entries
+
+    def _store(self, base_currency, rates, timestamp):
+        """Insert or refresh a rate table; caller holds the lock."""
+        entry = {'rates': rates, 'timestamp': timestamp, 'base': base_currency}
+        self._entries[base_currency] = entry
+        self._cross_rates = None
+        self._entries.move_to_end(base_currency)
+        while len(self._entries) > self.max_bases:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        return entry
+
+    def update(self, base_currency, rates, timestamp=None):
+        """Store a freshly fetched rate table and persist it if a cache file is configured."""
+        with self._lock:
+            entry = self._store(base_currency, rates, timestamp or datetime.datetime.now())
+        if self.store is not None:
+            try:
+                self.store.save_entry(base_currency, {'rates': rates, 'timestamp': entry['timestamp'].isoformat(),
+                                                      'base': base_currency})
+            except Exception as e:
+                self.report_error(base_currency, e, f"Could not save cache file: {e}")
+        return entry
+
+    def load(self, data):
+        """Load entries in exchange_rate_cache.json layout (timestamps as ISO strings or datetimes)."""
+        with self._lock:
+            for base_currency, entry in data.items():
+                timestamp = entry['timestamp']
+                if isinstance(timestamp, str):
+                    timestamp = datetime.datetime.fromisoformat(timestamp)
+                self._store(entry.get('base', base_currency), entry['rates'], timestamp)
+
+    def snapshot(self):
+        """Return the cache in exchange_rate_cache.json layout."""
+        with self._lock:
+            return {base: {'rates': entry['rates'], 'timestamp': entry['timestamp'].isoformat(), 'base': base}
+                    for base, entry in self._entries.items()}
+
+    def load_file(self):
+        """Load cached rates from cache_file, ignoring a missing or unreadable file."""
+        try:
+            self.load(self.store.load())
+        except Exception as e:
+            self.report_error(None, e, f"Could not load cache file: {e}")
+
+    def save_file(self):
+        """Compact the persisted cache into a single snapshot file."""
+        try:
+            self.store.compact()
+        except Exception as e:
+            self.report_error(None, e, f"Could not save cache file: {e}")
+
+    # Lookups
+
+    @METRICS.timed('fx_lookup')
+    def get_cached_rate(self, from_currency, to_currency):
+        """
+        Get a rate from the cache: a direct hit on the from_currency table, the
+        inverse from the to_currency table, or a cross rate via the pivot currency.
+
+        Returns:
+            tuple: (rate, timestamp) or (None, None) if the cached tables cannot
+                   price the pair. Cross rates carry the timestamp of their oldest leg.
+        """
+        with self._lock:
+            entry = self._entries.get(from_currency)
+            if entry is not None and to_currency in entry['rates']:
+                self._entries.move_to_end(from_currency)
+                return entry['rates'][to_currency], entry['timestamp']
+
+            entry = self._entries.get(to_currency)
+            if entry is not None and entry['rates'].get(from_currency):
+                self._entries.move_to_end(to_currency)
+                return 1 / entry['rates'][from_currency], entry['timestamp']
+
+            if self._cross_rates is None:
+                self._cross_rates = CrossRateIndex(self._entries, self.pivot)
+                self.stats['cross_builds'] += 1
+            return self._cross_rates.rate(from_currency, to_currency)
+
+    def cached_timestamps(self):
+        """Return {base currency: timestamp} for every cached table."""
+        with self._lock:
+            return {base: entry['timestamp'] for base, entry in self._entries.items()}
+
+    def ttl_for(self, base_currency):
+        """Freshness window in minutes for base_currency's table."""
+        return self.ttl_overrides.get(base_currency, self.ttl_minutes)
+
+    def is_fresh(self, timestamp, max_age_minutes=None):
+        """Check if cached data from timestamp is still within the TTL."""
+        if not timestamp:
+            return False
+        if max_age_minutes is None:
+            max_age_minutes = self.ttl_minutes
+        age = datetime.datetime.now() - timestamp
+        return age.total_seconds() < max_age_minutes * 60
+
+    def revalidate(self, base_currency):
+        """
+        Refetch base_currency's table in the background without waiting for it.
+
+        Returns:
+            bool: False if a fetch for base_currency was already in flight.
+        """
+        with self._lock:
+            if base_currency in self._in_flight:
+                return False
+            if self._revalidator is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='fx-revalidate')
+            self.stats['revalidations'] += 1
+        self._revalidator.submit(self._fetch_quietly, base_currency)
+        return True
+
+    def _fetch_quietly(self, base_currency):
+        try:
+            return self.fetch(base_currency)
+        except Exception as e:
+            self.report_error(base_currency, e)
+
+    def report_error(self, base_currency, error, message=None):
+        """
+        Report a failed background fetch or cache file operation to on_error.
+
+        Without on_error, message (default: "Could not fetch <base> rates: <error>") is printed.
+        """
+        if self.on_error is None:
+            print(message or f"Could not fetch {base_currency} rates: {error}")
+        else:
+            self.on_error(base_currency, error)
+
+    def fetch(self, base_currency):
+        """
+        Fetch the rate table for base_currency, sharing one request between all
+        concurrent callers asking for the same base.
+
+        Returns:
+            dict: The new cache entry.
+        Raises:
+            Exception: Whatever fetch_rates raised, re-raised in every waiting caller.
+        """
+        with self._lock:
+            flight = self._in_flight.get(base_currency)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[base_currency] = _Flight()
+                self.stats['fetches'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+
+        try:
+            with METRICS.span('fx_fetch', base=base_currency):
+                rates = self.fetch_rates(base_currency)
+            flight.entry = self.update(base_currency, rates)
+            return flight.entry
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[base_currency]
+            flight.done.set()
+
+    def fetch_rate(self, from_currency, to_currency):
+        """
+        Fetch a fresh rate from the API (single flight per from_currency).
+
+        Returns:
+            tuple: (rate, timestamp), or (None, None) if the API has no such pair.
+        """
+        entry = self.fetch(from_currency)
+        if to_currency in entry['rates']:
+            return entry['rates'][to_currency], entry['timestamp']
+        return None, None
+
+    def get_rate(self, from_currency, to_currency, use_cache=True, max_age_minutes=None, on_error=None,
+                 on_stale=None, stale_while_revalidate=None):
+        """
+        Return a rate, preferring fresh cache, then the API, then stale cache.
+
+        Args:
+            from_currency: Source currency code
+            to_currency: Target currency code
+            use_cache: Whether to use cached data (fresh, or stale if the API fails)
+            max_age_minutes: Freshness window (default: ttl_for(from_currency))
+            on_error: Called with the exception when the API request fails (default: the
+                      service's on_error, else print)
+            on_stale: Called with the cache timestamp when a stale rate is returned
+                      because the API failed
+            stale_while_revalidate: Return a stale cached rate at once and refetch it in
+                                    the background (default: the service setting)
+        Returns:
+            tuple: (rate, timestamp) or (None, None) if failed
+        """
+        if from_currency == to_currency:
+            return 1.0, datetime.datetime.now()
+
+        if max_age_minutes is None:
+            max_age_minutes = self.ttl_for(from_currency)
+        if stale_while_revalidate is None:
+            stale_while_revalidate = self.stale_while_revalidate
+
+        if use_cache:
+            cached_rate, cached_timestamp = self.get_cached_rate(from_currency, to_currency)
+            if cached_rate and self.is_fresh(cached_timestamp, max_age_minutes):
+                self._count('hits')
+                return cached_rate, cached_timestamp
+            if cached_rate and stale_while_revalidate:
+                self._count('stale')
+                self.revalidate(from_currency)
+                return cached_rate, cached_timestamp
+
+        self._count('misses')
+        try:
+            rate, timestamp = self.fetch_rate(from_currency, to_currency)
+            if rate:
+                return rate, timestamp
+        except Exception as e:
+            if on_error is None:
+                self.report_error(from_currency, e, f"API request failed: {e}")
+            else:
+                on_error(e)
+
+        # Fallback to cached data (even if stale) if API fails
+        if use_cache:
+            cached_rate, cached_timestamp = self.get_cached_rate(from_currency, to_currency)
+            if cached_rate:
+                self._count('stale')
+                self._count('fallbacks')
+                if on_stale is not None:
+                    on_stale(cached_timestamp)
+                return cached_rate, cached_timestamp
+
+        return None, None
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+def prefetch_rates(service, base_currencies=PREFETCH_CURRENCIES, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Fetch the rate tables for base_currencies concurrently into service.
+
+    fetch_rates blocks on the network, so the fetches run on at most
+    `concurrency` threads (sharing the pooled session of a PooledRateFetcher).
+    They go through service.fetch and share the single-flight guard with
+    on-demand lookups.
+
+    Returns:
+        dict: base currency -> cache entry, or the exception its fetch raised.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    base_currencies = list(dict.fromkeys(base_currencies))
+    if not base_currencies:
+        return {}
+    workers = max(1, min(concurrency, len(base_currencies)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fx-prefetch') as executor:
+        futures = {base: executor.submit(service.fetch, base) for base in base_currencies}
+    return {base: future.exception() or future.result() for base, future in futures.items()}
+
+
+def start_prefetch(service, base_currencies=PREFETCH_CURRENCIES, concurrency=DEFAULT_CONCURRENCY):
+    """Run prefetch_rates in a daemon thread and return the thread immediately; failures go to service.on_error."""
+    def run():
+        for base, result in prefetch_rates(service, base_currencies, concurrency).items():
+            if isinstance(result, Exception):
+                service.report_error(base, result)
+
+    thread = threading.Thread(target=run, name='fx-prefetch', daemon=True)
+    thread.start()
+    return thread
+
+
+class RateRefresher:
+    """
+    Background thread that refetches cached tables shortly before they expire.
+
+    Each table is refreshed at timestamp + TTL * (1 - jitter * random()), so
+    tables fetched together do not all expire and refetch in the same instant,
+    and lookups keep finding fresh data without waiting on the network. Failed
+    refreshes are retried after REFRESH_RETRY_SECONDS (also jittered).
+
+    Args:
+        service (ExchangeRateService): Service whose cache is kept fresh; its
+                                       ttl_for() gives the per-currency TTL.
+        base_currencies (iterable): Tables to keep fresh even before they are cached.
+        jitter (float): Fraction of the TTL by which refreshes are brought forward at random.
+    """
+
+    def __init__(self, service, base_currencies=(), jitter=DEFAULT_REFRESH_JITTER):
+        self.service = service
+        self.base_currencies = tuple(base_currencies)
+        self.jitter = jitter
+        self._schedule = {}
+        self._retry_at = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due_at(self, base_currency, timestamp):
+        """Jittered refresh time for a table fetched at timestamp (stable per timestamp)."""
+        scheduled = self._schedule.get(base_currency)
+        if scheduled is None or scheduled[0] != timestamp:
+            ttl_seconds = self.service.ttl_for(base_currency) * 60
+            refresh_after = ttl_seconds * (1 - self.jitter * random.random())
+            scheduled = (timestamp, timestamp + datetime.timedelta(seconds=refresh_after))
+            self._schedule[base_currency] = scheduled
+        return scheduled[1]
+
+    def refresh_due(self, now=None):
+        """
+        Refresh every table that is due (concurrently) and return the seconds
+        until the next one is.
+        """
+        now = now or datetime.datetime.now()
+        timestamps = self.service.cached_timestamps()
+        due = {}
+        for base_currency in dict.fromkeys(self.base_currencies + tuple(timestamps)):
+            timestamp = timestamps.get(base_currency)
+            due_at = self.due_at(base_currency, timestamp) if timestamp else now
+            due[base_currency] = max(due_at, self._retry_at.get(base_currency, due_at))
+
+        expired = [base_currency for base_currency, due_at in due.items() if due_at <= now]
+        if expired:
+            for base_currency, result in prefetch_rates(self.service, expired).items():
+                if isinstance(result, Exception):
+                    self.service.report_error(base_currency, result)
+                    retry_seconds = REFRESH_RETRY_SECONDS * (1 + self.jitter * random.random())
+                    due[base_currency] = self._retry_at[base_currency] = now + datetime.timedelta(
+                        seconds=retry_seconds)
+                else:
+                    self._retry_at.pop(base_currency, None)
+                    due[base_currency] = self.due_at(base_currency, result['timestamp'])
+
+        if not due:
+            return REFRESH_RETRY_SECONDS
+        return max(1.0, (min(due.values()) - datetime.datetime.now()).total_seconds())
+
+    def run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.refresh_due())
+
+    def start(self):
+        """Start the refresher in a daemon thread (no-op if already running)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='fx-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_service(cache_file=None, prefetch=(), refresh=False, **options):
+    """
+    Return the process-wide ExchangeRateService for cache_file.
+
+    Streamlit re-runs app.py for every interaction and session; keeping the
+    service here means all of them share one cache and one in-flight fetch per
+    base currency. The first call loads cache_file and starts prefetching the
+    `prefetch` base currencies in the background; with refresh=True a
+    RateRefresher then keeps those and every other cached table fresh. The
+    service's stats are exported through METRICS (fx_hits, fx_errors, ...).
+    Other options (ttl_minutes, on_error, ...) are passed to ExchangeRateService.
+
+    Raises:
+        ValueError: If the service for cache_file was created with different
+                    prefetch, refresh or service options.
+    """
+    settings = {'prefetch': tuple(prefetch), 'refresh': refresh, **options}
+    with _services_lock:
+        if cache_file in _services:
+            service, created_with = _services[cache_file]
+            if settings != created_with:
+                raise ValueError(f"The exchange-rate service for {cache_file or 'memory'} already exists with "
+                                 f"other options: {created_with}")
+            return service
+
+        service = ExchangeRateService(cache_file=cache_file, **options)
+        _services[cache_file] = service, settings
+        METRICS.add_collector('fx', lambda: dict(service.stats), cache=cache_file or 'memory')
+        if cache_file:
+            service.load_file()
+        if refresh:
+            # The refresher's first pass fetches whatever is missing or stale
+            service.refresher = RateRefresher(service, prefetch).start()
+        elif prefetch:
+            start_prefetch(service, prefetch)
+        return service
@@ -0,0 +1,186 @@
+"""
+IBAN registry and checksum validation.
+
+IBAN_REGISTRY maps each IBAN country to its total IBAN length and BBAN
+structure in the notation of the SWIFT IBAN registry: a run length followed by
+n (digits), a (upper-case letters) or c (letters and digits), e.g. DE is
+'8n10n' (bank code, account number). The set of IBAN countries, the length
+index and the BBAN patterns are all derived from this one table.
+
+iban_error() checks a single IBAN in electronic format (no spaces) and
+iban_errors() a batch, testing every distinct value once.
+"""
+import re
+
+IBAN_REGISTRY = {
+    'AD': (24, '4n4n12c'),
+    'AE': (23, '3n16n'),
+    'AL': (28, '8n16c'),
+    'AT': (20, '5n11n'),
+    'AZ': (28, '4a20c'),
+    'BA': (20, '3n3n8n2n'),
+    'BE': (16, '3n7n2n'),
+    'BG': (22, '4a4n2n8c'),
+    'BH': (22, '4a14c'),
+    'BR': (29, '8n5n10n1a1c'),
+    'BY': (28, '4c4n16c'),
+    'CH': (21, '5n12c'),
+    'CR': (22, '4n14n'),
+    'CY': (28, '3n5n16c'),
+    'CZ': (24, '4n6n10n'),
+    'DE': (22, '8n10n'),
+    'DK': (18, '4n9n1n'),
+    'DO': (28, '4c20n'),
+    'EE': (20, '2n2n11n1n'),
+    'EG': (29, '4n4n17n'),
+    'ES': (24, '4n4n1n1n10n'),
+    'FI': (18, '3n11n'),
+    'FO': (18, '4n9n1n'),
+    'FR': (27, '5n5n11c2n'),
+    'GB': (22, '4a6n8n'),
+    'GE': (22, '2a16n'),
+    'GI': (23, '4a15c'),
+    'GL': (18, '4n9n1n'),
+    'GR': (27, '3n4n16c'),
+    'GT': (28, '4c20c'),
+    'HR': (21, '7n10n'),
+    'HU': (28, '3n4n1n15n1n'),
+    'IE': (22, '4a6n8n'),
+    'IL': (23, '3n3n13n'),
+    'IS': (26, '4n2n6n10n'),
+    'IT': (27, '1a5n5n12c'),
+    'JO': (30, '4a4n18c'),
+    'KW': (30, '4a22c'),
+    'KZ': (20, '3n13c'),
+    'LB': (28, '4n20c'),
+    'LC': (32, '4a24c'),
+    'LI': (21, '5n12c'),
+    'LT': (20, '5n11n'),
+    'LU': (20, '3n13c'),
+    'LV': (21, '4a13c'),
+    'MC': (27, '5n5n11c2n'),
+    'MD': (24, '2c18c'),
+    'ME': (22, '3n13n2n'),
+    'MK': (19, '3n10c2n'),
+    'MR': (27, '5n5n11n2n'),
+    'MT': (31, '4a5n18c'),
+    'MU': (30, '4a2n2n12n3n3a'),
+    'NL': (18, '4a10n'),
+    'NO': (15, '4n6n1n'),
+    'PK': (24, '4a16c'),
+    'PL': (28, '8n16n'),
+    'PS': (29, '4a21c'),
+    'PT': (25, '4n4n11n2n'),
+    'QA': (29, '4a21c'),
+    'RO': (24, '4a16c'),
+    'RS': (22, '3n13n2n'),
+    'SA': (24, '2n18c'),
+    'SE': (24, '3n16n1n'),
+    'SI': (19, '5n8n2n'),
+    'SK': (24, '4n6n10n'),
+    'SM': (27, '1a5n5n12c'),
+    'TN': (24, '2n3n13n2n'),
+    'TR': (26, '5n1n16c'),
+    'UA': (29, '6n19c'),
+    'VG': (24, '4a16n'),
+    'XK': (20, '4n10n2n'),
+}
+
+IBAN_COUNTRIES = frozenset(IBAN_REGISTRY)
+IBAN_LENGTHS = {country: length for country, (length, _) in IBAN_REGISTRY.items()}
+
+# Error codes returned by iban_error()
+IBAN_ERROR_COUNTRY = 'country'
+IBAN_ERROR_LENGTH = 'length'
+IBAN_ERROR_FORMAT = 'format'
+IBAN_ERROR_CHECKSUM = 'checksum'
+
+_BBAN_CHARACTERS = {'n': '[0-9]', 'a': '[A-Z]', 'c': '[A-Za-z0-9]'}
+
+# Letters are replaced by two digits (A=10 ... Z=35) for the mod-97 check
+_LETTER_DIGITS = str.maketrans({chr(code): str(code - 55) for code in range(ord('A'), ord('Z') + 1)})
+
+
+def is_iban_country(country_code):
+    """Check if a country code is part of the IBAN registry."""
+    return country_code.upper() in IBAN_COUNTRIES
+
+
+def bban_pattern(structure):
+    """
+    Translate a registry BBAN structure into a regular expression.
+
+    Args:
+        structure (str): e.g. '4a6n8n'.
+    Returns:
+        str: e.g. '[A-Z]{4}[0-9]{6}[0-9]{8}'.
+    """
+    return ''.join(f"{_BBAN_CHARACTERS[kind]}{{{count}}}"
+                   for count, kind in re.findall(r'(\d+)([nac])', structure))
+
+
+class _IbanPatterns(dict):
+    """Memo: country -> compiled full IBAN pattern, compiled on first use."""
+
+    def __missing__(self, country):
+        pattern = self[country] = re.compile(f"{country}[0-9]{{2}}{bban_pattern(IBAN_REGISTRY[country][1])}")
+        return pattern
+
+
+_iban_patterns = _IbanPatterns()
+
+
+def iban_checksum(iban):
+    """Return the ISO 7064 mod-97 remainder of an IBAN (1 for valid check digits)."""
+    return int((iban[4:] + iban[:4]).upper().translate(_LETTER_DIGITS)) % 97
+
+
+def iban_error(iban):
+    """
+    Validate one IBAN in electronic format (no spaces).
+
+    Args:
+        iban (str): e.g. 'GB33BUKB20201555555555'.
+    Returns:
+        str: None when valid, else IBAN_ERROR_COUNTRY, IBAN_ERROR_LENGTH,
+             IBAN_ERROR_FORMAT or IBAN_ERROR_CHECKSUM.
+    """
+    country = iban[:2]
+    length = IBAN_LENGTHS.get(country)
+    if length is None:
+        return IBAN_ERROR_COUNTRY
+    if len(iban) != length:
+        return IBAN_ERROR_LENGTH
+    if _iban_patterns[country].fullmatch(iban) is None:
+        return IBAN_ERROR_FORMAT
+    if iban_checksum(iban) != 1:
+        return IBAN_ERROR_CHECKSUM
+    return None
+
+
+def is_valid_iban(iban):
+    """Check length, BBAN structure and check digits of an IBAN."""
+    return iban_error(iban) is None
+
+
+def iban_errors(ibans):
+    """
+    Validate a batch of IBANs.
+
+    Each distinct value is checked once, so columns with repeated accounts
+    (e.g. one debtor account for a whole file) cost one check per account.
+
+    Args:
+        ibans (iterable): IBAN strings.
+    Returns:
+        list: iban_error() result per value, None for valid IBANs.
+    """
+    memo = {}
+    results = []
+    for iban in ibans:
+        try:
+            results.append(memo[iban])
+        except KeyError:
+            error = memo[iban] = iban_error(iban)
+            results.append(error)
+    return results
@@ -0,0 +1,798 @@
+"""
+Typed pacs.008 message model with a single serializer.
+
+Every message component (group header, transaction, agents, parties, accounts,
+...) is a small __slots__ class whose CHILDREN table lists its XML child
+elements in schema order. serialize() and serialize_pacs008() walk the objects
+and write either indented (pretty) or minified XML; text and attribute values
+are escaped with the same functions as the xml_generator templates.
+
+Components are plain values, so a batch can reuse one object for data that
+repeats across transactions (the same debtor, agent or account on thousands
+of rows). Objects passed through an Interner are shared between transactions
+and remember their serialized text, so a shared agent is rendered once per
+batch instead of once per transaction.
+
+build_pacs008_message() maps the form/CLI data dicts onto the model with the
+same scheme rules as xml_generator.generate_pacs008_xml. iter_pacs008_model_xml()
+and write_pacs008_model_xml() stream a batch through the model, a transaction at
+a time, like xml_generator.iter_pacs008_xml (the CLI's --engine model).
+"""
+from collections import OrderedDict
+
+from iban import is_iban_country
+from ids import DEFAULT_ID_GENERATOR
+from metrics import METRICS
+from templates import escape_attribute, escape_text
+from xml_generator import (IRS_CREDITOR_AGENT, _iter_batch_chunks, _with_ids, get_pacs008_creation_time,
+                           get_pacs008_currencies, metric_labels, write_chunks)
+
+INDENT = '    '
+
+PACS008_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08'
+APP_HDR_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:head.001.001.02'
+XSI_NAMESPACE = 'http://www.w3.org/2001/XMLSchema-instance'
+
+
+class Element:
+    """
+    Base class of the model.
+
+    CHILDREN is a tuple of (xml_tag, attribute_name) in schema order. Attributes
+    set to None are left out; any other value is written as a child element.
+    """
+    __slots__ = ('_xml',)
+    CHILDREN = ()
+
+    def __init__(self, **values):
+        self._xml = None
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def share(self):
+        """
+        Mark the object as shared: its serialized text is cached and reused, so
+        it must not be modified afterwards.
+        """
+        if self._xml is None:
+            self._xml = {}
+        return self
+
+    def key(self):
+        """Hashable identity of the object's content (shared children compare by identity)."""
+        return (type(self),) + tuple(getattr(self, name) for _, name in self.CHILDREN)
+
+    def __repr__(self):
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for _, name in self.CHILDREN
+                           if getattr(self, name) is not None)
+        return f"{type(self).__name__}({values})"
+
+
+class Amount:
+    """An amount with its currency attribute, e.g. <InstdAmt Ccy="EUR">100.00</InstdAmt>."""
+    __slots__ = ('value', 'ccy')
+
+    def __init__(self, value, ccy):
+        self.value = value
+        self.ccy = ccy
+
+    def __eq__(self, other):
+        return isinstance(other, Amount) and (self.value, self.ccy) == (other.value, other.ccy)
+
+    def __hash__(self):
+        return hash((self.value, self.ccy))
+
+    def __repr__(self):
+        return f"Amount({self.value!r}, {self.ccy!r})"
+
+
+class Code(Element):
+    """Code choice, e.g. SvcLvl, ClrSysId, ClrSys, Purp: <Cd>...</Cd>."""
+    __slots__ = ('cd',)
+    CHILDREN = (('Cd', 'cd'),)
+
+    def __init__(self, cd):
+        super().__init__(cd=cd)
+
+
+class Proprietary(Element):
+    """Proprietary choice, e.g. LclInstrm: <Prtry>...</Prtry>."""
+    __slots__ = ('prtry',)
+    CHILDREN = (('Prtry', 'prtry'),)
+
+    def __init__(self, prtry):
+        super().__init__(prtry=prtry)
+
+
+class PostalAddress(Element):
+    __slots__ = ('strt_nm', 'bldg_nb', 'pst_cd', 'twn_nm', 'ctry')
+    CHILDREN = (('StrtNm', 'strt_nm'), ('BldgNb', 'bldg_nb'), ('PstCd', 'pst_cd'), ('TwnNm', 'twn_nm'),
+                ('Ctry', 'ctry'))
+
+    def __init__(self, strt_nm=None, bldg_nb=None, pst_cd=None, twn_nm=None, ctry=None):
+        super().__init__(strt_nm=strt_nm, bldg_nb=bldg_nb, pst_cd=pst_cd, twn_nm=twn_nm, ctry=ctry)
+
+
+class Party(Element):
+    """Dbtr, Cdtr, UltmtDbtr, UltmtCdtr or InitgPty."""
+    __slots__ = ('nm', 'pstl_adr')
+    CHILDREN = (('Nm', 'nm'), ('PstlAdr', 'pstl_adr'))
+
+    def __init__(self, nm, pstl_adr=None):
+        super().__init__(nm=nm, pstl_adr=pstl_adr)
+
+
+class ClearingSystemMember(Element):
+    """ClrSysMmbId, e.g. a USABA routing number."""
+    __slots__ = ('clr_sys_id', 'mmb_id')
+    CHILDREN = (('ClrSysId', 'clr_sys_id'), ('MmbId', 'mmb_id'))
+
+    def __init__(self, mmb_id, clr_sys_id=None):
+        super().__init__(clr_sys_id=clr_sys_id or Code('USABA'), mmb_id=mmb_id)
+
+
+class FinancialInstitution(Element):
+    """FinInstnId: a BIC and/or a clearing system member with name and address."""
+    __slots__ = ('bicfi', 'clr_sys_mmb_id', 'nm', 'pstl_adr')
+    CHILDREN = (('BICFI', 'bicfi'), ('ClrSysMmbId', 'clr_sys_mmb_id'), ('Nm', 'nm'), ('PstlAdr', 'pstl_adr'))
+
+    def __init__(self, bicfi=None, clr_sys_mmb_id=None, nm=None, pstl_adr=None):
+        super().__init__(bicfi=bicfi, clr_sys_mmb_id=clr_sys_mmb_id, nm=nm, pstl_adr=pstl_adr)
+
+
+class Agent(Element):
+    """InstgAgt, InstdAgt, DbtrAgt, CdtrAgt, ChrgsInf/Agt or AppHdr Fr/To FIId."""
+    __slots__ = ('fin_instn_id',)
+    CHILDREN = (('FinInstnId', 'fin_instn_id'),)
+
+    def __init__(self, fin_instn_id=None):
+        super().__init__(fin_instn_id=fin_instn_id)
+
+
+class GenericIdentification(Element):
+    """Othr account identification: <Id>...</Id>."""
+    __slots__ = ('id',)
+    CHILDREN = (('Id', 'id'),)
+
+    def __init__(self, id):
+        super().__init__(id=id)
+
+
+class AccountIdentification(Element):
+    __slots__ = ('iban', 'othr')
+    CHILDREN = (('IBAN', 'iban'), ('Othr', 'othr'))
+
+    def __init__(self, iban=None, othr=None):
+        super().__init__(iban=iban, othr=othr)
+
+
+class Account(Element):
+    """DbtrAcct or CdtrAcct."""
+    __slots__ = ('id',)
+    CHILDREN = (('Id', 'id'),)
+
+    def __init__(self, id):
+        super().__init__(id=id)
+
+    @classmethod
+    def iban(cls, iban):
+        return cls(AccountIdentification(iban=iban))
+
+    @classmethod
+    def other(cls, account_number):
+        return cls(AccountIdentification(othr=GenericIdentification(account_number)))
+
+
+class SettlementInstruction(Element):
+    __slots__ = ('sttlm_mtd', 'clr_sys')
+    CHILDREN = (('SttlmMtd', 'sttlm_mtd'), ('ClrSys', 'clr_sys'))
+
+    def __init__(self, sttlm_mtd, clr_sys=None):
+        super().__init__(sttlm_mtd=sttlm_mtd, clr_sys=clr_sys)
+
+
+class GroupHeader(Element):
+    __slots__ = ('msg_id', 'cre_dt_tm', 'nb_of_txs', 'ttl_intr_bk_sttlm_amt', 'sttlm_inf')
+    CHILDREN = (('MsgId', 'msg_id'), ('CreDtTm', 'cre_dt_tm'), ('NbOfTxs', 'nb_of_txs'),
+                ('TtlIntrBkSttlmAmt', 'ttl_intr_bk_sttlm_amt'), ('SttlmInf', 'sttlm_inf'))
+
+    def __init__(self, msg_id, cre_dt_tm, nb_of_txs, sttlm_inf, ttl_intr_bk_sttlm_amt=None):
+        super().__init__(msg_id=msg_id, cre_dt_tm=cre_dt_tm, nb_of_txs=nb_of_txs,
+                         ttl_intr_bk_sttlm_amt=ttl_intr_bk_sttlm_amt, sttlm_inf=sttlm_inf)
+
+
+class PaymentIdentification(Element):
+    __slots__ = ('instr_id', 'end_to_end_id', 'uetr')
+    CHILDREN = (('InstrId', 'instr_id'), ('EndToEndId', 'end_to_end_id'), ('UETR', 'uetr'))
+
+    def __init__(self, instr_id, end_to_end_id, uetr):
+        self._xml = None
+        self.instr_id = instr_id
+        self.end_to_end_id = end_to_end_id
+        self.uetr = uetr
+
+
+class PaymentTypeInformation(Element):
+    __slots__ = ('svc_lvl', 'lcl_instrm')
+    CHILDREN = (('SvcLvl', 'svc_lvl'), ('LclInstrm', 'lcl_instrm'))
+
+    def __init__(self, svc_lvl, lcl_instrm=None):
+        super().__init__(svc_lvl=svc_lvl, lcl_instrm=lcl_instrm)
+
+
+class Charges(Element):
+    """ChrgsInf."""
+    __slots__ = ('amt', 'agt')
+    CHILDREN = (('Amt', 'amt'), ('Agt', 'agt'))
+
+    def __init__(self, amt, agt):
+        super().__init__(amt=amt, agt=agt)
+
+
+class TaxParty(Element):
+    __slots__ = ('tax_id',)
+    CHILDREN = (('TaxId', 'tax_id'),)
+
+    def __init__(self, tax_id):
+        super().__init__(tax_id=tax_id)
+
+
+class TaxPeriod(Element):
+    __slots__ = ('yr', 'tp')
+    CHILDREN = (('Yr', 'yr'), ('Tp', 'tp'))
+
+    def __init__(self, yr, tp):
+        super().__init__(yr=yr, tp=tp)
+
+
+class TaxRecord(Element):
+    __slots__ = ('tp', 'prd', 'addtl_inf')
+    CHILDREN = (('Tp', 'tp'), ('Prd', 'prd'), ('AddtlInf', 'addtl_inf'))
+
+    def __init__(self, tp, prd, addtl_inf=None):
+        super().__init__(tp=tp, prd=prd, addtl_inf=addtl_inf)
+
+
+class TaxRemittance(Element):
+    __slots__ = ('cdtr', 'rcrd')
+    CHILDREN = (('Cdtr', 'cdtr'), ('Rcrd', 'rcrd'))
+
+    def __init__(self, cdtr, rcrd):
+        super().__init__(cdtr=cdtr, rcrd=rcrd)
+
+
+class StructuredRemittance(Element):
+    __slots__ = ('tax_rmt',)
+    CHILDREN = (('TaxRmt', 'tax_rmt'),)
+
+    def __init__(self, tax_rmt):
+        super().__init__(tax_rmt=tax_rmt)
+
+
+class RemittanceInformation(Element):
+    __slots__ = ('ustrd', 'strd')
+    CHILDREN = (('Ustrd', 'ustrd'), ('Strd', 'strd'))
+
+    def __init__(self, ustrd=None, strd=None):
+        super().__init__(ustrd=ustrd, strd=strd)
+
+
+class CreditTransferTransaction(Element):
+    """CdtTrfTxInf."""
+    __slots__ = ('pmt_id', 'pmt_tp_inf', 'intr_bk_sttlm_amt', 'intr_bk_sttlm_dt', 'instd_amt', 'xchg_rate',
+                 'chrg_br', 'chrgs_inf', 'instg_agt', 'instd_agt', 'ultmt_dbtr', 'initg_pty', 'dbtr', 'dbtr_acct',
+                 'dbtr_agt', 'cdtr_agt', 'cdtr', 'cdtr_acct', 'ultmt_cdtr', 'rmt_inf')
+    CHILDREN = (('PmtId', 'pmt_id'), ('PmtTpInf', 'pmt_tp_inf'), ('IntrBkSttlmAmt', 'intr_bk_sttlm_amt'),
+                ('IntrBkSttlmDt', 'intr_bk_sttlm_dt'), ('InstdAmt', 'instd_amt'), ('XchgRate', 'xchg_rate'),
+                ('ChrgBr', 'chrg_br'), ('ChrgsInf', 'chrgs_inf'), ('InstgAgt', 'instg_agt'),
+                ('InstdAgt', 'instd_agt'), ('UltmtDbtr', 'ultmt_dbtr'), ('InitgPty', 'initg_pty'), ('Dbtr', 'dbtr'),
+                ('DbtrAcct', 'dbtr_acct'), ('DbtrAgt', 'dbtr_agt'), ('CdtrAgt', 'cdtr_agt'), ('Cdtr', 'cdtr'),
+                ('CdtrAcct', 'cdtr_acct'), ('UltmtCdtr', 'ultmt_cdtr'), ('RmtInf', 'rmt_inf'))
+
+    def __init__(self, pmt_id, pmt_tp_inf, intr_bk_sttlm_amt, intr_bk_sttlm_dt, instd_amt, chrg_br, instg_agt,
+                 instd_agt, dbtr, dbtr_acct, dbtr_agt, cdtr_agt, cdtr, cdtr_acct, xchg_rate=None, chrgs_inf=None,
+                 ultmt_dbtr=None, initg_pty=None, ultmt_cdtr=None, rmt_inf=None):
+        # Assigned directly: one of these is built per transaction
+        self._xml = None
+        self.pmt_id = pmt_id
+        self.pmt_tp_inf = pmt_tp_inf
+        self.intr_bk_sttlm_amt = intr_bk_sttlm_amt
+        self.intr_bk_sttlm_dt = intr_bk_sttlm_dt
+        self.instd_amt = instd_amt
+        self.xchg_rate = xchg_rate
+        self.chrg_br = chrg_br
+        self.chrgs_inf = chrgs_inf
+        self.instg_agt = instg_agt
+        self.instd_agt = instd_agt
+        self.ultmt_dbtr = ultmt_dbtr
+        self.initg_pty = initg_pty
+        self.dbtr = dbtr
+        self.dbtr_acct = dbtr_acct
+        self.dbtr_agt = dbtr_agt
+        self.cdtr_agt = cdtr_agt
+        self.cdtr = cdtr
+        self.cdtr_acct = cdtr_acct
+        self.ultmt_cdtr = ultmt_cdtr
+        self.rmt_inf = rmt_inf
+
+
+class BusinessApplicationHeader(Element):
+    """AppHdr (head.001.001.02) sent in front of SWIFT CBPR+ messages."""
+    __slots__ = ('fr', 'to', 'biz_msg_idr', 'msg_def_idr', 'biz_svc', 'cre_dt')
+    CHILDREN = (('Fr', 'fr'), ('To', 'to'), ('BizMsgIdr', 'biz_msg_idr'), ('MsgDefIdr', 'msg_def_idr'),
+                ('BizSvc', 'biz_svc'), ('CreDt', 'cre_dt'))
+
+    def __init__(self, fr, to, biz_msg_idr, cre_dt, msg_def_idr='pacs.008.001.08', biz_svc='swift.cbprplus.02'):
+        super().__init__(fr=fr, to=to, biz_msg_idr=biz_msg_idr, msg_def_idr=msg_def_idr, biz_svc=biz_svc,
+                         cre_dt=cre_dt)
+
+
+class InstitutionParty(Element):
+    """AppHdr Fr/To party: <FIId><FinInstnId>...</FinInstnId></FIId>."""
+    __slots__ = ('fi_id',)
+    CHILDREN = (('FIId', 'fi_id'),)
+
+    def __init__(self, fi_id):
+        super().__init__(fi_id=fi_id)
+
+
+class Pacs008Message(Element):
+    """FIToFICstmrCdtTrf plus the optional AppHdr."""
+    __slots__ = ('grp_hdr', 'cdt_trf_tx_inf', 'app_hdr')
+    CHILDREN = (('GrpHdr', 'grp_hdr'), ('CdtTrfTxInf', 'cdt_trf_tx_inf'))
+
+    def __init__(self, grp_hdr, cdt_trf_tx_inf, app_hdr=None):
+        super().__init__(grp_hdr=grp_hdr, cdt_trf_tx_inf=list(cdt_trf_tx_inf), app_hdr=app_hdr)
+
+
+# (class, depth) -> child plan; depth is None for minified output
+_plans = {}
+
+
+def _plan(cls, depth):
+    """Per child: attribute name, tag, separator, separator + '<' + tag, closing tag; plus the closing indent."""
+    key = (cls, depth)
+    plan = _plans.get(key)
+    if plan is None:
+        separator = '' if depth is None else '\n' + INDENT * (depth + 1)
+        children = tuple((name, child_tag, separator, separator + '<' + child_tag, '</' + child_tag + '>')
+                         for child_tag, name in cls.CHILDREN)
+        plan = _plans[key] = (children, '' if depth is None else '\n' + INDENT * depth)
+    return plan
+
+
+def _render(element, tag, depth):
+    """Serialize element as <tag>...</tag> at depth (None: minified); the opening tag is not indented."""
+    cache = element._xml
+    if cache is not None:
+        text = cache.get((tag, depth))
+        if text is not None:
+            return text
+
+    children, closing_indent = _plan(type(element), depth)
+    child_depth = None if depth is None else depth + 1
+    parts = ['<', tag, '>']
+    for name, child_tag, separator, start, end in children:
+        value = getattr(element, name)
+        if value is None:
+            continue
+        for item in (value if type(value) is list else (value,)):
+            if isinstance(item, Element):
+                parts += (separator, _render(item, child_tag, child_depth))
+            elif type(item) is Amount:
+                parts += (start, ' Ccy="', escape_attribute(item.ccy), '">', f"{item.value:.2f}", end)
+            else:
+                parts += (start, '>', escape_text(item), end)
+    if len(parts) > 3:
+        parts.append(closing_indent)
+    parts += ('</', tag, '>')
+
+    text = ''.join(parts)
+    if cache is not None:
+        cache[tag, depth] = text
+    return text
+
+
+def serialize(element, tag, pretty=True, depth=0):
+    """
+    Serialize one model object as the element tag.
+
+    Args:
+        element (Element): Any model object, e.g. a CreditTransferTransaction.
+        tag (str): Element name, e.g. 'CdtTrfTxInf'.
+        pretty (bool): Indent with four spaces per level; False writes minified XML.
+        depth (int): Indentation level of the element (pretty output only).
+    Returns:
+        str: The XML fragment.
+    """
+    return _render(element, tag, depth if pretty else None)
+
+
+def iter_pacs008_chunks(message, pretty=True):
+    """
+    Serialize a complete pacs.008 message (XML declaration, the optional AppHdr
+    and the Document) as a sequence of str chunks.
+
+    Args:
+        message (Pacs008Message): The message.
+        pretty (bool): Indented output; False writes minified XML.
+    Yields:
+        str: The header up to and including GrpHdr, one chunk per CdtTrfTxInf,
+             then the footer.
+    """
+    yield _pacs008_head(message.grp_hdr, message.app_hdr, pretty)
+    for transaction in message.cdt_trf_tx_inf:
+        yield _transaction_chunk(transaction, pretty)
+    yield _pacs008_footer(pretty)
+
+
+def _pacs008_head(grp_hdr, app_hdr, pretty):
+    """XML declaration, the optional AppHdr and the Document up to and including GrpHdr."""
+    newline = '\n' if pretty else ''
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>', newline]
+    if app_hdr is not None:
+        app_hdr = _render(app_hdr, 'AppHdr', 0 if pretty else None)
+        parts += [app_hdr.replace('<AppHdr>', f'<AppHdr xmlns="{APP_HDR_NAMESPACE}">', 1), newline]
+    parts += [f'<Document xmlns="{PACS008_NAMESPACE}"', f' xmlns:xsi="{XSI_NAMESPACE}"',
+              f' xsi:schemaLocation="{PACS008_NAMESPACE} pacs.008.001.08.xsd">',
+              newline + INDENT if pretty else '', '<FIToFICstmrCdtTrf>',
+              newline + INDENT * 2 if pretty else '', _render(grp_hdr, 'GrpHdr', 2 if pretty else None)]
+    return ''.join(parts)
+
+
+def _transaction_chunk(transaction, pretty):
+    if pretty:
+        return '\n' + INDENT * 2 + _render(transaction, 'CdtTrfTxInf', 2)
+    return _render(transaction, 'CdtTrfTxInf', None)
+
+
+def _pacs008_footer(pretty):
+    if pretty:
+        return f"\n{INDENT}</FIToFICstmrCdtTrf>\n</Document>\n"
+    return "</FIToFICstmrCdtTrf></Document>"
+
+
+def serialize_pacs008(message, pretty=True):
+    """
+    Serialize a complete pacs.008 message; see iter_pacs008_chunks.
+
+    Returns:
+        str: The XML text.
+    """
+    return ''.join(iter_pacs008_chunks(message, pretty))
+
+
+DEFAULT_INTERNER_SIZE = 4096
+
+
+class Interner:
+    """
+    Shared model objects of a batch, keyed by the data they are built from.
+
+    interner.shared(key, build, *args) returns the object stored under key,
+    calling build(*args) only the first time; interner(obj) shares equal
+    objects by content (see Element.key). Shared objects cache their
+    serialized text. The interner is a bounded LRU: objects it evicts stay
+    valid in the transactions using them but are no longer shared with new
+    ones. stats and hit_rate report how much was shared.
+
+    Args:
+        max_entries (int): Shared objects kept; the least recently used is evicted first.
+    """
+
+    def __init__(self, max_entries=DEFAULT_INTERNER_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def shared(self, key, build, *args):
+        element = self._entries.get(key)
+        if element is not None:
+            self.stats['hits'] += 1
+            self._entries.move_to_end(key)
+            return element
+        self.stats['misses'] += 1
+        element = self._entries[key] = build(*args).share()
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        return element
+
+    @property
+    def hit_rate(self):
+        """Share of lookups served from the interner (0.0 before the first lookup)."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def __call__(self, element):
+        if element is None:
+            return None
+        return self.shared(element.key(), lambda: element)
+
+
+PARTY_SUFFIXES = ('Nm', 'StrtNm', 'BldgNb', 'PstCd', 'TwnNm', 'Ctry')
+
+
+def _new_party(nm, strt_nm, bldg_nb, pst_cd, twn_nm, ctry):
+    return Party(nm, PostalAddress(strt_nm, bldg_nb, pst_cd, twn_nm, ctry))
+
+
+def _new_usaba_agent(mmb_id, nm, strt_nm, bldg_nb, pst_cd, twn_nm, ctry):
+    return Agent(FinancialInstitution(clr_sys_mmb_id=ClearingSystemMember(mmb_id), nm=nm,
+                                      pstl_adr=PostalAddress(strt_nm, bldg_nb, pst_cd, twn_nm, ctry)))
+
+
+def _new_bicfi_agent(bicfi):
+    return Agent(FinancialInstitution(bicfi=bicfi))
+
+
+def _new_member_agent(mmb_id):
+    return Agent(FinancialInstitution(clr_sys_mmb_id=ClearingSystemMember(mmb_id)))
+
+
+def _new_account(number, use_iban):
+    if use_iban:
+        return Account(AccountIdentification(iban=number))
+    return Account(AccountIdentification(othr=GenericIdentification(number)))
+
+
+def _party(data, prefix, interner):
+    fields = tuple(data.get(prefix + suffix, '') for suffix in PARTY_SUFFIXES)
+    return interner.shared(('Party',) + fields, _new_party, *fields)
+
+
+def _optional_party(name, interner):
+    return interner.shared(('Party', name), Party, name) if name else None
+
+
+def _agent(data, prefix, channel_type, fedwire_type, interner):
+    """DbtrAgt/CdtrAgt with the rules of xml_generator.get_agent_template: BICFI first, then USABA."""
+    bicfi = data.get(prefix + 'BICFI_tx')
+    mmb_id = data.get(prefix + 'MmbId')
+    is_debtor_agent = prefix == 'dbtrAgt'
+
+    use_bicfi = use_usaba = False
+    if channel_type == 'swift':
+        use_bicfi = bool(bicfi)
+    elif channel_type == 'fedwire':
+        if fedwire_type != 'international':
+            use_usaba = bool(mmb_id)
+        else:
+            use_usaba = is_debtor_agent and bool(mmb_id)
+            use_bicfi = not is_debtor_agent and bool(bicfi)
+
+    if use_bicfi:
+        return interner.shared(('BICFI', bicfi), _new_bicfi_agent, bicfi)
+    if use_usaba:
+        fields = (mmb_id,) + tuple(data.get(prefix + suffix, '') for suffix in PARTY_SUFFIXES)
+        return interner.shared(('USABA',) + fields, _new_usaba_agent, *fields)
+    # No usable identification: an empty agent, as the templates render it
+    return interner.shared(('Agent',), Agent)
+
+
+def _irs_creditor_agent(interner):
+    irs = IRS_CREDITOR_AGENT
+    fields = (irs['mmbId'], irs['nm'], irs['strtNm'], irs['bldgNb'], irs['pstCd'], irs['twnNm'], irs['ctry'])
+    return interner.shared(('USABA',) + fields, _new_usaba_agent, *fields)
+
+
+def _inst_agent(data, agent_type, channel_type, interner):
+    """InstgAgt/InstdAgt: BICFI for SWIFT, USABA clearing member for Fedwire."""
+    prefix = 'instgAgt' if agent_type == 'InstgAgt' else 'instdAgt'
+    if channel_type == 'fedwire':
+        mmb_id = data.get(prefix + 'MmbId', '')
+        return interner.shared(('ClrSysMmbId', mmb_id), _new_member_agent, mmb_id)
+    bicfi = data.get(prefix + 'BICFI', '')
+    return interner.shared(('BICFI', bicfi), _new_bicfi_agent, bicfi)
+
+
+def _account(number, country_code, channel_type, fedwire_type, interner):
+    """DbtrAcct/CdtrAcct with the rules of xml_generator.get_account_template: IBAN or Othr/Id."""
+    use_iban = ((channel_type == 'swift' or (channel_type == 'fedwire' and fedwire_type == 'international'))
+                and is_iban_country(country_code))
+    return interner.shared(('Account', number, use_iban), _new_account, number, use_iban)
+
+
+def _new_tax_remittance(tax_id, tax_type, tax_year, tax_period, tax_info):
+    return RemittanceInformation(strd=StructuredRemittance(TaxRemittance(
+        TaxParty(tax_id), TaxRecord(tax_type, TaxPeriod(f"{tax_year}-12-31", tax_period), tax_info or None))))
+
+
+def _new_charges(ccy, agent):
+    return Charges(Amount(10.00, ccy), agent)
+
+
+def build_pacs008_transaction(data, channel_type, fedwire_type, interner=None):
+    """
+    Build the CdtTrfTxInf of one transaction.
+
+    Args:
+        data (dict): Transaction data, same keys as generate_pacs008_xml.
+        channel_type (str): 'fedwire' or 'swift'.
+        fedwire_type (str): 'domestic', 'international' or 'tax' (for fedwire only).
+        interner (Interner): Shares parties, agents and accounts with the other
+                             transactions of a batch. Default: nothing is shared.
+    Returns:
+        CreditTransferTransaction: The transaction.
+    """
+    if interner is None:
+        interner = Interner()
+    fedwire = channel_type == 'fedwire'
+    primary_ccy, secondary_ccy = get_pacs008_currencies(data, channel_type, fedwire_type)
+    exchange_rate = data.get('exchangeRate')
+    instr_ref = data.get('msgId', '')[:10]
+
+    if fedwire and fedwire_type == 'tax':
+        cdtr_agt = _irs_creditor_agent(interner)
+        tax_fields = tuple(data.get(key) for key in ('taxId', 'taxType', 'taxYear', 'taxPeriod', 'taxInfo'))
+        rmt_inf = interner.shared(('TaxRmt',) + tax_fields, _new_tax_remittance, *tax_fields)
+    else:
+        cdtr_agt = _agent(data, 'cdtrAgt', channel_type, fedwire_type, interner)
+        ustrd = data.get('ustrdRmtInf', '')
+        rmt_inf = interner.shared(('Ustrd', ustrd), RemittanceInformation, ustrd)
+
+    chrg_br = data.get('chrgBr', 'SHAR')
+    chrgs_inf = None
+    if chrg_br == 'CRED':
+        chrgs_inf = interner.shared(('ChrgsInf', secondary_ccy, id(cdtr_agt)), _new_charges, secondary_ccy, cdtr_agt)
+
+    pmt_tp_inf = interner.shared(('PmtTpInf', fedwire), PaymentTypeInformation, Code('NURG'),
+                                 Proprietary('CTRC') if fedwire else None)
+
+    return CreditTransferTransaction(
+        pmt_id=PaymentIdentification(data.get('instrId') or f"INSTID{instr_ref}",
+                                     data.get('endToEndId') or f"E2EID{instr_ref}",
+                                     data.get('uetr') or DEFAULT_ID_GENERATOR.uetr()),
+        pmt_tp_inf=pmt_tp_inf,
+        intr_bk_sttlm_amt=Amount(data.get('intrBkSttlmAmt', 0.00), primary_ccy),
+        intr_bk_sttlm_dt=data.get('intrBkSttlmDt', ''),
+        instd_amt=Amount(data.get('instdAmt', 0.00), secondary_ccy),
+        xchg_rate=f"{exchange_rate:.6f}" if exchange_rate and primary_ccy != secondary_ccy else None,
+        chrg_br=chrg_br,
+        chrgs_inf=chrgs_inf,
+        instg_agt=_inst_agent(data, 'InstgAgt', channel_type, interner),
+        instd_agt=_inst_agent(data, 'InstdAgt', channel_type, interner),
+        ultmt_dbtr=None if fedwire else _optional_party(data.get('ultmtDbtrNm'), interner),
+        initg_pty=_optional_party(data.get('initgPtyNm'), interner),
+        dbtr=_party(data, 'dbtr', interner),
+        dbtr_acct=_account(data.get('dbtrAcctIBAN', ''), data.get('dbtrCtry', 'US'), channel_type, fedwire_type,
+                           interner),
+        dbtr_agt=_agent(data, 'dbtrAgt', channel_type, fedwire_type, interner),
+        cdtr_agt=cdtr_agt,
+        cdtr=_party(data, 'cdtr', interner),
+        cdtr_acct=_account(data.get('cdtrAcctIBAN', ''), data.get('cdtrCtry', 'US'), channel_type, fedwire_type,
+                           interner),
+        ultmt_cdtr=_optional_party(data.get('ultmtCdtrNm'), interner),
+        rmt_inf=rmt_inf,
+    )
+
+
+def build_pacs008_group_header(data, channel_type, cre_dt_tm, nb_of_txs=1, total_settlement=None):
+    """
+    Build the GrpHdr.
+
+    Args:
+        data (dict): Group level data (msgId, sttlmMtd).
+        total_settlement (tuple): Optional (amount, currency) for TtlIntrBkSttlmAmt.
+    """
+    total = Amount(*total_settlement) if total_settlement is not None else None
+    clr_sys = Code('FDW') if channel_type == 'fedwire' else None
+    return GroupHeader(data.get('msgId', ''), cre_dt_tm, nb_of_txs,
+                       SettlementInstruction(data.get('sttlmMtd', ''), clr_sys), total)
+
+
+def build_app_header(data, cre_dt_tm):
+    """Build the SWIFT AppHdr from the instructing/instructed agent BICs of the group data."""
+    return BusinessApplicationHeader(
+        InstitutionParty(Agent(FinancialInstitution(bicfi=data.get('instgAgtBICFI', '')))),
+        InstitutionParty(Agent(FinancialInstitution(bicfi=data.get('instdAgtBICFI', '')))),
+        data.get('msgId', ''), cre_dt_tm)
+
+
+def build_pacs008_message(transactions, channel_type, fedwire_type, group_data=None, interner=None,
+                          cre_dt_tm=None, ids=None):
+    """
+    Build a pacs.008 message with one CdtTrfTxInf per transaction.
+
+    Group totals follow generate_pacs008_batch_xml: NbOfTxs is the number of
+    transactions and TtlIntrBkSttlmAmt is set when they all settle in one currency.
+
+    Args:
+        transactions (iterable): Transaction dicts, same keys as generate_pacs008_xml.
+        channel_type (str): 'fedwire' or 'swift'.
+        fedwire_type (str): 'domestic', 'international' or 'tax' (for fedwire only).
+        group_data (dict): Group level data (msgId, sttlmMtd, instgAgtBICFI,
+                           instdAgtBICFI). Defaults to the first transaction.
+        interner (Interner): Shared objects; pass the same one to several messages
+                             to share across them. Default: a new one per message.
+        cre_dt_tm (str): Creation timestamp. Default: the current time.
+        ids (IdGenerator): Fills in InstrId, EndToEndId and UETR for transactions
+                           that do not carry them.
+    Returns:
+        Pacs008Message: The message.
+    Raises:
+        ValueError: If transactions is empty.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        raise ValueError("At least one transaction is required to generate a batch message")
+    if ids is not None:
+        transactions = [ids.fill(data) for data in transactions]
+    if interner is None:
+        interner = Interner()
+    if group_data is None:
+        group_data = transactions[0]
+    if cre_dt_tm is None:
+        cre_dt_tm = get_pacs008_creation_time(channel_type)
+
+    cdt_trf_tx_inf = [build_pacs008_transaction(data, channel_type, fedwire_type, interner) for data in transactions]
+    currencies = {transaction.intr_bk_sttlm_amt.ccy for transaction in cdt_trf_tx_inf}
+    total_settlement = None
+    if len(currencies) == 1:
+        total = sum(transaction.intr_bk_sttlm_amt.value for transaction in cdt_trf_tx_inf)
+        total_settlement = (round(total, 2), currencies.pop())
+
+    grp_hdr = build_pacs008_group_header(group_data, channel_type, cre_dt_tm, len(cdt_trf_tx_inf), total_settlement)
+    app_hdr = build_app_header(group_data, cre_dt_tm) if channel_type == 'swift' else None
+    return Pacs008Message(grp_hdr, cdt_trf_tx_inf, app_hdr)
+
+
+def iter_pacs008_model_xml(transactions, channel_type, fedwire_type, group_data=None, compact=False, ids=None,
+                           interner=None):
+    """
+    Lazily render a multi-transaction pacs.008 message through the model.
+
+    Same arguments, chunks and control totals as xml_generator.iter_pacs008_xml,
+    but every transaction is built as a CreditTransferTransaction whose parties,
+    agents, accounts and remittance come from interner. Data that repeats across
+    the batch is therefore built and serialized once. The interner's hits and
+    misses are counted in METRICS as model_shared_hits / model_shared_misses.
+
+    Args:
+        interner (Interner): Shared objects. Default: a new one for this message;
+                             pass one in to read its stats afterwards.
+    Yields:
+        str: XML chunks; the header, one chunk per CdtTrfTxInf, then the footer.
+    """
+    if interner is None:
+        interner = Interner()
+    pretty = not compact
+    labels = metric_labels('pacs008', channel_type, fedwire_type)
+
+    def render_header(first, count, total, currencies):
+        data = group_data or first
+        cre_dt_tm = get_pacs008_creation_time(channel_type)
+        total_settlement = (total, next(iter(currencies))) if len(currencies) == 1 else None
+        grp_hdr = build_pacs008_group_header(data, channel_type, cre_dt_tm, count, total_settlement)
+        app_hdr = build_app_header(data, cre_dt_tm) if channel_type == 'swift' else None
+        return _pacs008_head(grp_hdr, app_hdr, pretty)
+
+    def render_transaction(data):
+        return _transaction_chunk(build_pacs008_transaction(data, channel_type, fedwire_type, interner), pretty)
+
+    def currency_of(data):
+        return get_pacs008_currencies(data, channel_type, fedwire_type)[0]
+
+    def amount_of(data):
+        return data.get('intrBkSttlmAmt', 0.00)
+
+    hits, misses = interner.stats['hits'], interner.stats['misses']
+    yield from _iter_batch_chunks(transactions, render_header, _with_ids(render_transaction, ids),
+                                  _pacs008_footer(pretty), amount_of, currency_of, labels)
+    METRICS.increment('model_shared_hits', interner.stats['hits'] - hits, **labels)
+    METRICS.increment('model_shared_misses', interner.stats['misses'] - misses, **labels)
+
+
+def write_pacs008_model_xml(stream, transactions, channel_type, fedwire_type, group_data=None, compact=False,
+                            ids=None, interner=None):
+    """
+    Stream a multi-transaction pacs.008 message, rendered through the model, to a file-like object.
+
+    See iter_pacs008_model_xml for the arguments and xml_generator.write_pacs008_xml for the stream types.
+    """
+    with METRICS.span('write', **metric_labels('pacs008', channel_type, fedwire_type)):
+        write_chunks(stream, iter_pacs008_model_xml(transactions, channel_type, fedwire_type, group_data, compact,
+                                                    ids, interner))
@@ -0,0 +1,221 @@
+"""
+Multi-process batch generation.
+
+Rows are cut into fixed-size shards and rendered by a process pool. In batch mode
+every shard becomes its own complete multi-transaction message file
+(<name>.part-00001.xml, ...); in per-row mode workers write the individual
+message files with globally numbered names. Each shard reports which worker
+rendered it and how long it took, so throughput can be summarised per worker,
+and what it recorded in metrics.METRICS, which is merged into the parent's.
+"""
+import itertools
+import os
+import time
+
+from message_model import Interner, iter_pacs008_model_xml, write_pacs008_model_xml
+from metrics import METRICS
+from schema_validation import StreamValidator, validate_message, validating_chunks
+from xml_generator import (COMPRESSION_SUFFIXES, generate_pacs008_xml, generate_pain001_xml, iter_pacs008_xml,
+                           iter_pain001_xml, open_output, write_chunks, write_pacs008_xml, write_pain001_xml)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def shard_path(batch_path, shard_index):
+    """Return the output file name for a shard of a batch file: out.xml -> out.part-00001.xml (.xml.gz kept)"""
+    root, compression_ext = os.path.splitext(batch_path)
+    if compression_ext.lower() not in COMPRESSION_SUFFIXES:
+        root, compression_ext = batch_path, ''
+    root, ext = os.path.splitext(root)
+    return f"{root}.part-{shard_index + 1:05d}{ext or '.xml'}{compression_ext}"
+
+
+def message_file_name(message_type, index, compression=None):
+    """File name of one per-row message: pacs008_000001.xml (.xml.gz / .xml.zst when compressed)."""
+    suffix = next((ext for ext, name in COMPRESSION_SUFFIXES.items() if name == compression), '')
+    return f"{message_type}_{index:06d}.xml{suffix}"
+
+
+def render_shard(shard_index, rows, message_type, channel_type, fedwire_type, batch_path=None,
+                 output_dir=None, start_index=1, validate_schema=False, compact=False, compression=None, ids=None,
+                 engine='template'):
+    """
+    Render one shard of rows in a worker process.
+
+    Args:
+        shard_index (int): Zero-based shard number.
+        rows (list): Prepared and validated row dicts.
+        message_type (str): 'pacs008' or 'pain001'.
+        channel_type (str): 'fedwire' or 'swift' (pacs008 only).
+        fedwire_type (str): 'domestic', 'international' or 'tax' (fedwire only).
+        batch_path (str): Base batch file name; the shard writes shard_path(batch_path, shard_index).
+        output_dir (str): Directory for one file per row, numbered from start_index.
+        start_index (int): Global number of the shard's first row.
+        validate_schema (bool): Validate every written message against its XSD
+                                (see schema_validation).
+        compact (bool): Write minified XML.
+        compression (str): None, 'gzip' or 'zstd' (see xml_generator.open_output).
+        ids (IdGenerator): The run's ID generator; the shard forks it at start_index
+                           so IDs stay unique across shards.
+        engine (str): 'template' (xml_generator) or 'model' (message_model, pacs008
+                      batch shards only).
+    Returns:
+        dict: shard, pid, rows, seconds, path(s) written, schema_errors, a
+              list of (file name, error message), interner, the model engine's
+              Interner stats (None for the template engine), and the shard's
+              metrics snapshot.
+    """
+    # Worker processes are reused across shards: record this shard's metrics only
+    METRICS.reset()
+    started = time.perf_counter()
+    schema_errors = []
+    if ids is not None:
+        ids = ids.fork(start_index)
+    interner = Interner() if engine == 'model' else None
+
+    if batch_path:
+        path = shard_path(batch_path, shard_index)
+        with open_output(path, compression) as f:
+            if validate_schema:
+                validator = StreamValidator(message_type)
+                if interner is not None:
+                    chunks = iter_pacs008_model_xml(rows, channel_type, fedwire_type, compact=compact, ids=ids,
+                                                    interner=interner)
+                elif message_type == 'pacs008':
+                    chunks = iter_pacs008_xml(rows, channel_type, fedwire_type, compact=compact, ids=ids)
+                else:
+                    chunks = iter_pain001_xml(rows, compact=compact, ids=ids)
+                write_chunks(f, validating_chunks(chunks, validator))
+                schema_errors += [(path, error) for error in validator.close()]
+            elif interner is not None:
+                write_pacs008_model_xml(f, rows, channel_type, fedwire_type, compact=compact, ids=ids,
+                                        interner=interner)
+            elif message_type == 'pacs008':
+                write_pacs008_xml(f, rows, channel_type, fedwire_type, compact=compact, ids=ids)
+            else:
+                write_pain001_xml(f, rows, compact=compact, ids=ids)
+    else:
+        path = output_dir
+        for index, data in enumerate(rows, start=start_index):
+            if ids is not None:
+                data = ids.fill(data)
+            if message_type == 'pacs008':
+                xml = generate_pacs008_xml(data, channel_type, fedwire_type, compact=compact)
+            else:
+                xml = generate_pain001_xml(data, compact=compact)
+            file_path = os.path.join(output_dir, message_file_name(message_type, index, compression))
+            with open_output(file_path, compression) as f:
+                write_chunks(f, (xml,))
+            if validate_schema:
+                schema_errors += [(file_path, error) for error in validate_message(xml, message_type)]
+
+    return {
+        'shard': shard_index,
+        'pid': os.getpid(),
+        'rows': len(rows),
+        'seconds': time.perf_counter() - started,
+        'path': path,
+        'schema_errors': schema_errors,
+        'interner': None if interner is None else dict(interner.stats),
+        'metrics': METRICS.snapshot(collectors=False),
+    }
+
+
+def iter_shards(rows, chunk_size):
+    """Cut an iterable of rows into lists of at most chunk_size rows."""
+    rows = iter(rows)
+    while True:
+        shard = list(itertools.islice(rows, chunk_size))
+        if not shard:
+            return
+        yield shard
+
+
+def run_sharded(rows, message_type, channel_type, fedwire_type, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                batch_path=None, output_dir=None, validate_schema=False, compact=False, compression=None, ids=None,
+                engine='template'):
+    """
+    Render rows across a process pool.
+
+    Only a bounded number of shards (two per worker) is in flight at any time,
+    so the input is consumed lazily and memory does not grow with the row count.
+    If the run is aborted (e.g. the row iterator raises SystemExit on an invalid
+    row), the shards still queued are cancelled and every file already written is
+    removed, so no partial output is left behind that looks complete.
+
+    Args:
+        rows (iterable): Prepared and validated row dicts.
+        workers (int): Number of worker processes (default: os.cpu_count()).
+        chunk_size (int): Rows per shard.
+        batch_path / output_dir: See render_shard; exactly one should be given.
+        validate_schema, compact, compression, ids, engine: See render_shard.
+    Returns:
+        list: The per-shard result dicts from render_shard, ordered by shard.
+              Their metrics are merged into this process's METRICS.
+    """
+    # Imported here so the CLI's single-process path does not load multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    workers = workers or os.cpu_count() or 1
+    results = []
+    pending = set()
+    shards = 0
+    start_index = 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            for shard_index, shard in enumerate(iter_shards(rows, chunk_size)):
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+
+                pending.add(pool.submit(render_shard, shard_index, shard, message_type, channel_type, fedwire_type,
+                                        batch_path, output_dir, start_index, validate_schema, compact, compression,
+                                        ids, engine))
+                shards += 1
+                start_index += len(shard)
+
+            done, _ = wait(pending)
+            results.extend(future.result() for future in done)
+        except BaseException:
+            # Let the running shards finish first, so none writes a file after the clean-up
+            pool.shutdown(wait=True, cancel_futures=True)
+            remove_outputs(message_type, shards, start_index - 1, batch_path, output_dir, compression)
+            raise
+
+    for result in results:
+        METRICS.merge(result['metrics'])
+    return sorted(results, key=lambda result: result['shard'])
+
+
+def remove_outputs(message_type, shards, rows, batch_path=None, output_dir=None, compression=None):
+    """Delete the files the first shards of an aborted run_sharded call may have written (missing ones are skipped)."""
+    if batch_path:
+        paths = [shard_path(batch_path, shard_index) for shard_index in range(shards)]
+    else:
+        paths = [os.path.join(output_dir, message_file_name(message_type, index, compression))
+                 for index in range(1, rows + 1)]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def summarize_by_worker(results):
+    """
+    Aggregate shard results per worker process.
+
+    Returns:
+        list: Dicts with pid, shards, rows, seconds (busy time) and rows_per_sec.
+    """
+    workers = {}
+    for result in results:
+        worker = workers.setdefault(result['pid'], {'pid': result['pid'], 'shards': 0, 'rows': 0, 'seconds': 0.0})
+        worker['shards'] += 1
+        worker['rows'] += result['rows']
+        worker['seconds'] += result['seconds']
+
+    for worker in workers.values():
+        worker['rows_per_sec'] = worker['rows'] / worker['seconds'] if worker['seconds'] else 0.0
+    return sorted(workers.values(), key=lambda worker: worker['pid'])
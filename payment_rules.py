@@ -0,0 +1,111 @@
+"""
+Payment-scheme rules used by the Streamlit form: FX need, settlement amount,
+account field labels/help and the default creation timestamp.
+
+Importing this module has no side effects (no Streamlit, no files, no network),
+so the CLI, worker processes and tests can use the same rules as the form.
+"""
+import datetime
+
+from iban import is_iban_country
+
+# Currencies offered by the form
+CURRENCIES = ('USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF')
+
+# IRS tax type codes accepted for Fedwire tax payments
+TAX_TYPE_CODES = (
+    '88042', '88047', '10400', '10402', '10404', '10406', '10407',
+    '72005', '72007', '09405', '09407', '94105', '94107', '94104',
+    '94405', '94407', '09455', '09457', '99046', '99047', '99042',
+    '10417', '10416', '10412', '10425', '10427', '11206', '11207',
+    '11202', '11200', '22907', '84894',
+)
+
+# Tax period codes (MM01-MM12) with their month names
+TAX_PERIOD_MONTHS = (
+    ('MM01', 'January'), ('MM02', 'February'), ('MM03', 'March'), ('MM04', 'April'),
+    ('MM05', 'May'), ('MM06', 'June'), ('MM07', 'July'), ('MM08', 'August'),
+    ('MM09', 'September'), ('MM10', 'October'), ('MM11', 'November'), ('MM12', 'December'),
+)
+
+
+# Function to get current datetime in required format (+HH:MM offset)
+def get_current_datetime_with_offset():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # Format to YYYY-MM-DDTHH:MM:SS+00:00 for UTC, which is common for SWIFT CBPR+
+    return now.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def needs_exchange_rate(payment_type, origin, settlement_ccy, instructed_ccy):
+    """
+    Determine if exchange rate is needed based on the payment scenario.
+    Returns True if FX conversion is required.
+    """
+    if settlement_ccy == instructed_ccy:
+        return False
+
+    # Based on the PDF logic
+    if payment_type == 'fedwire_intl':
+        return settlement_ccy != instructed_ccy
+    elif payment_type == 'swift':
+        return settlement_ccy != instructed_ccy
+
+    return False
+
+
+def calculate_settlement_amount(instructed_amount, settlement_ccy, instructed_ccy, exchange_rate=None):
+    """
+    Calculate settlement amount based on currencies and exchange rate.
+    """
+    if settlement_ccy == instructed_ccy:
+        return instructed_amount
+
+    if exchange_rate:
+        # Settlement amount = Instructed amount * exchange rate
+        return round(instructed_amount * exchange_rate, 2)
+
+    return instructed_amount
+
+
+def get_account_field_help(channel_type, fedwire_type, country_code, sender_country='US'):
+    """
+    Generate help text for account fields based on the payment scheme rules.
+    """
+    if channel_type == 'fedwire':
+        if fedwire_type in ['domestic', 'tax']:
+            return "Enter US account number (IBAN not used for Fedwire domestic/tax)"
+        elif fedwire_type == 'international':
+            if is_iban_country(country_code):
+                return "Enter IBAN (required for IBAN countries in Fedwire international)"
+            else:
+                return "Enter local account number (IBAN not available for this country)"
+    elif channel_type == 'swift':
+        if is_iban_country(country_code):
+            return "Enter IBAN (required for IBAN countries in SWIFT CBPR+)"
+        else:
+            return "Enter local account number (IBAN not available for this country)"
+
+    return "Enter account number or IBAN"
+
+
+def get_account_field_label(channel_type, fedwire_type, country_code, account_type='Debtor'):
+    """
+    Generate appropriate label for account fields.
+    """
+    base_label = f"{account_type} Account"
+
+    if channel_type == 'fedwire':
+        if fedwire_type in ['domestic', 'tax']:
+            return f"{base_label} Number"
+        elif fedwire_type == 'international':
+            if is_iban_country(country_code):
+                return f"{base_label} IBAN"
+            else:
+                return f"{base_label} Number"
+    elif channel_type == 'swift':
+        if is_iban_country(country_code):
+            return f"{base_label} IBAN"
+        else:
+            return f"{base_label} Number"
+
+    return f"{base_label} (IBAN/Number)"
@@ -0,0 +1,136 @@
+"""
+Crash-safe, multi-process persistence for the exchange-rate cache.
+
+The cache lives in two files next to each other:
+    exchange_rate_cache.json          snapshot, same layout as before
+    exchange_rate_cache.json.journal  one JSON line per updated base currency
+
+An update appends a single line to the journal, so its cost grows with the
+changed entry rather than the whole cache. Once the journal passes a size
+limit it is compacted: the merged cache is written to a temporary file that
+atomically replaces the snapshot (os.replace) before the journal is emptied.
+Readers and writers in different processes (e.g. several Streamlit sessions)
+coordinate through a lock on exchange_rate_cache.json.lock.
+"""
+import json
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+DEFAULT_COMPACT_BYTES = 1024 * 1024
+
+
+@contextmanager
+def file_lock(path, exclusive=True):
+    """Hold an advisory lock on path (created if missing) for the duration of the block."""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            # msvcrt has no shared locks; lock the first byte exclusively
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_json(path, data, indent=2):
+    """Write data as JSON to path via a temporary file and os.replace, so readers never see a partial file."""
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JsonRateStore:
+    """
+    Snapshot + append-only journal store for rate-cache entries.
+
+    Args:
+        path (str): Snapshot file, e.g. exchange_rate_cache.json.
+        compact_bytes (int): Journal size that triggers compaction into the snapshot.
+    """
+
+    def __init__(self, path, compact_bytes=DEFAULT_COMPACT_BYTES):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.lock_path = path + LOCK_SUFFIX
+        self.compact_bytes = compact_bytes
+
+    def _read(self):
+        """Merge the snapshot and the journal; caller holds the lock."""
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        data.update(json.loads(line))
+                    except ValueError:
+                        # Torn line from a writer that died mid-append
+                        continue
+        return data
+
+    def load(self):
+        """
+        Return all persisted entries keyed by base currency.
+
+        Returns:
+            dict: {'USD': {'rates': {...}, 'timestamp': '...', 'base': 'USD'}, ...}
+        """
+        with file_lock(self.lock_path, exclusive=False):
+            return self._read()
+
+    def save_entry(self, base_currency, entry):
+        """Append one base currency's entry to the journal, compacting when it grows too large."""
+        line = (json.dumps({base_currency: entry}, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with file_lock(self.lock_path):
+            with open(self.journal_path, 'a+b') as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        # Start on a fresh line after a torn write
+                        line = b'\n' + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                journal_size = f.tell()
+            if journal_size >= self.compact_bytes:
+                self._compact()
+
+    def compact(self):
+        """Fold the journal into the snapshot."""
+        with file_lock(self.lock_path):
+            self._compact()
+
+    def _compact(self):
+        atomic_write_json(self.path, self._read())
+        # A crash before this point only leaves journal lines that replay to the same values
+        with open(self.journal_path, 'w'):
+            pass
@@ -0,0 +1,213 @@
+"""
+BIC and USABA (ABA routing number) validation.
+
+bic_error() checks the ISO 9362 structure of a BIC (the BICFIIdentifier
+pattern of the ISO 20022 schemas) and aba_error() the 9-digit routing number:
+its Federal Reserve routing symbol prefix and the mod-10 check digit
+(weights 3, 7, 1).
+
+Optionally identifiers can also be checked against a local directory (e.g. an
+export of the Fedwire/FedACH participant directory or a BIC directory). The
+directory is turned once into a sorted file of fixed-width records that
+DirectoryIndex searches in place through mmap, so a lookup is an O(log n)
+binary search without loading the directory into memory.
+"""
+import mmap
+import os
+import re
+
+ROUTING_ERROR_FORMAT = 'format'
+ROUTING_ERROR_PREFIX = 'prefix'
+ROUTING_ERROR_CHECKSUM = 'checksum'
+
+BIC_PATTERN = re.compile(r'[A-Z0-9]{4}[A-Z]{2}[A-Z0-9]{2}(?:[A-Z0-9]{3})?')
+ABA_PATTERN = re.compile(r'[0-9]{9}')
+
+# First two digits of a routing number: 00 (U.S. Government), 01-12 (Federal
+# Reserve districts), 21-32 (thrift institutions), 61-72 (electronic
+# transactions) and 80 (traveler's checks)
+ABA_PREFIXES = frozenset(
+    [f"{prefix:02d}" for prefix in range(0, 13)] + [f"{prefix:02d}" for prefix in range(21, 33)]
+    + [f"{prefix:02d}" for prefix in range(61, 73)] + ['80'])
+
+ABA_WEIGHTS = (3, 7, 1, 3, 7, 1, 3, 7, 1)
+
+INDEX_SUFFIX = '.idx'
+
+
+def bic_error(bic):
+    """
+    Validate the structure of a BIC (8 or 11 characters).
+
+    Returns:
+        str: None when valid, else ROUTING_ERROR_FORMAT.
+    """
+    return None if BIC_PATTERN.fullmatch(bic) else ROUTING_ERROR_FORMAT
+
+
+def is_valid_bic(bic):
+    """Check the structure of a BIC: bank code, country, location and optional branch."""
+    return BIC_PATTERN.fullmatch(bic) is not None
+
+
+def bic_key(bic):
+    """Directory key for a BIC: BIC8 codes stand for the primary office (branch XXX)."""
+    bic = bic.upper()
+    return bic + 'XXX' if len(bic) == 8 else bic
+
+
+def aba_error(routing_number):
+    """
+    Validate a 9-digit ABA routing number.
+
+    Returns:
+        str: None when valid, else ROUTING_ERROR_FORMAT, ROUTING_ERROR_PREFIX
+             or ROUTING_ERROR_CHECKSUM.
+    """
+    if ABA_PATTERN.fullmatch(routing_number) is None:
+        return ROUTING_ERROR_FORMAT
+    if routing_number[:2] not in ABA_PREFIXES:
+        return ROUTING_ERROR_PREFIX
+    if sum(weight * int(digit) for weight, digit in zip(ABA_WEIGHTS, routing_number)) % 10:
+        return ROUTING_ERROR_CHECKSUM
+    return None
+
+
+def is_valid_aba(routing_number):
+    """Check the format, prefix and mod-10 check digit of an ABA routing number."""
+    return aba_error(routing_number) is None
+
+
+# Per directory kind: identifier taken from a source line's first token, key
+# normalisation for lookups and validation of source entries
+DIRECTORY_KINDS = {
+    'aba': (lambda token: token[:9], None, is_valid_aba),
+    'bic': (bic_key, bic_key, is_valid_bic),
+}
+
+
+class DirectoryIndex:
+    """
+    Sorted file of fixed-width, newline-terminated identifiers searched through mmap.
+
+    Args:
+        path (str): Index file written by build_directory_index().
+        key (callable): Normalises an identifier before lookup (e.g. bic_key).
+    """
+
+    def __init__(self, path, key=None):
+        self.path = path
+        self.key = key
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.width = self._map.find(b'\n')
+            self._count = size // (self.width + 1)
+        else:
+            self._map = None
+            self.width = 0
+            self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, position):
+        start = position * (self.width + 1)
+        return self._map[start:start + self.width]
+
+    def __contains__(self, identifier):
+        if self.key is not None:
+            identifier = self.key(identifier)
+        identifier = identifier.encode('ascii', 'replace')
+        if len(identifier) != self.width or not self._count:
+            return False
+
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle) < identifier:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self._count and self._record(low) == identifier
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def build_directory_index(identifiers, path):
+    """
+    Write identifiers as a sorted, de-duplicated index file.
+
+    Args:
+        identifiers (iterable): Normalised identifiers, all of the same length.
+        path (str): Index file to (atomically) replace.
+    Returns:
+        int: Number of records written.
+    """
+    import tempfile
+
+    records = sorted(set(identifiers))
+    if len({len(record) for record in records}) > 1:
+        raise ValueError(f"Directory identifiers must all have the same length: {path}")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='ascii', newline='\n') as f:
+            f.writelines(record + '\n' for record in records)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(records)
+
+
+def read_directory_source(path, kind):
+    """
+    Yield the normalised identifiers of a text directory.
+
+    The identifier is the first whitespace separated token of each line (for
+    routing numbers its first 9 characters, which also covers fixed-width
+    FedACH/Fedwire directory records); blank lines, # comments and entries
+    that fail validation (e.g. header lines) are skipped.
+    """
+    source_key, _, is_valid = DIRECTORY_KINDS[kind]
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            tokens = line.split(None, 1)
+            if not tokens or tokens[0].startswith('#'):
+                continue
+            identifier = source_key(tokens[0])
+            if is_valid(identifier):
+                yield identifier
+
+
+def open_directory(path, kind):
+    """
+    Open a routing directory for lookups.
+
+    Args:
+        path (str): A text directory (one identifier per line) or an index file
+                    ending in .idx. The index of a text directory is kept next to
+                    it (path + '.idx') and rebuilt when the source is newer.
+        kind (str): 'aba' or 'bic'.
+    Returns:
+        DirectoryIndex: Index supporting `identifier in index`.
+    """
+    _, lookup_key, _ = DIRECTORY_KINDS[kind]
+    index_path = path if path.endswith(INDEX_SUFFIX) else path + INDEX_SUFFIX
+    if index_path != path and (not os.path.exists(index_path)
+                               or os.path.getmtime(index_path) < os.path.getmtime(path)):
+        build_directory_index(read_directory_source(path, kind), index_path)
+    return DirectoryIndex(index_path, key=lookup_key)
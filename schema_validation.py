@@ -0,0 +1,241 @@
+"""
+Optional XSD validation of generated messages.
+
+The ISO 20022 schemas are bundled in schemas/ and each one is compiled once per
+process (load_schema). Messages are validated incrementally: StreamValidator
+is fed the chunks a message is written in (e.g. the output of
+xml_generator.iter_pacs008_xml) and lets lxml's pull parser validate them as
+they arrive, clearing every finished CdtTrfTxInf, so a batch file of any size
+is checked in one pass with flat memory.
+
+A SWIFT pacs.008 starts with the Business Application Header (AppHdr) before
+the Document. The AppHdr is validated against head.001.001.02.xsd when that
+file is present in schemas/ and otherwise only checked for well-formedness.
+
+lxml is an optional dependency (pip install lxml); nothing here imports it
+until a schema is needed, and is_available() tells callers whether it is.
+"""
+import importlib.util
+import os
+from functools import lru_cache
+
+from metrics import METRICS
+from xml_reader import open_input
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas')
+
+MESSAGE_SCHEMAS = {
+    'pacs008': 'pacs.008.001.08',
+    'pain001': 'pain.001.001.09',
+}
+APP_HDR_SCHEMA = 'head.001.001.02'
+
+READ_SIZE = 64 * 1024
+
+
+def is_available():
+    """Check whether lxml, needed for schema validation, is installed."""
+    return importlib.util.find_spec('lxml') is not None
+
+
+def _etree():
+    try:
+        from lxml import etree
+    except ImportError:
+        raise ImportError("XSD validation needs lxml: pip install lxml") from None
+    return etree
+
+
+def schema_path(name):
+    """Path of a bundled schema, e.g. schemas/pacs.008.001.08.xsd."""
+    return os.path.join(SCHEMA_DIR, name + '.xsd')
+
+
+@lru_cache(maxsize=None)
+def load_schema(name):
+    """
+    Compile a bundled schema (once per process).
+
+    Args:
+        name (str): Message definition, e.g. 'pacs.008.001.08'.
+    Returns:
+        lxml.etree.XMLSchema: The compiled schema, or None if the XSD is not bundled.
+    """
+    path = schema_path(name)
+    if not os.path.exists(path):
+        return None
+    etree = _etree()
+    return etree.XMLSchema(etree.parse(path))
+
+
+def _format_error(line, message, prefix=''):
+    # Streaming schema validation does not know line numbers (reported as 0)
+    return f"{prefix}line {line}: {message}" if line else f"{prefix}{message}"
+
+
+def _log_errors(error_log, prefix=''):
+    return [_format_error(entry.line, entry.message, prefix) for entry in error_log]
+
+
+def _app_hdr_errors(etree, text):
+    """Check the text before <Document>: the optional AppHdr of a SWIFT message."""
+    text = text.strip()
+    if b'<AppHdr' not in text:
+        return []
+    parser = etree.XMLParser()
+    try:
+        app_hdr = etree.fromstring(text, parser)
+    except etree.XMLSyntaxError:
+        return _log_errors(parser.error_log, 'AppHdr ')
+    schema = load_schema(APP_HDR_SCHEMA)
+    if schema is not None and not schema.validate(app_hdr):
+        return _log_errors(schema.error_log, 'AppHdr ')
+    return []
+
+
+class StreamValidator:
+    """
+    Incremental validator for one message.
+
+    Usage:
+        validator = StreamValidator('pacs008')
+        for chunk in iter_pacs008_xml(rows, 'swift', None):
+            validator.feed(chunk)
+        errors = validator.close()
+
+    Args:
+        message_type (str): 'pacs008' or 'pain001'.
+    """
+
+    def __init__(self, message_type):
+        self.etree = _etree()
+        self.schema = load_schema(MESSAGE_SCHEMAS[message_type])
+        if self.schema is None:
+            raise FileNotFoundError(f"Schema not found: {schema_path(MESSAGE_SCHEMAS[message_type])}")
+        self.transaction_tag = f"{{urn:iso:std:iso:20022:tech:xsd:{MESSAGE_SCHEMAS[message_type]}}}CdtTrfTxInf"
+        self.errors = []
+        self.transactions = 0
+        self._prefix = b''
+        self._parser = None
+        self._failed = False
+
+    def feed(self, chunk):
+        """Validate the next piece of the message (str or UTF-8 bytes)."""
+        if self._failed:
+            return
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+
+        if self._parser is None:
+            # Hold back the text before <Document>: the XML declaration and the optional AppHdr
+            self._prefix += chunk
+            start = self._prefix.find(b'<Document')
+            if start < 0:
+                return
+            self.errors.extend(_app_hdr_errors(self.etree, self._prefix[:start]))
+            chunk, self._prefix = self._prefix[start:], b''
+            self._parser = self.etree.XMLPullParser(events=('end',), tag=self.transaction_tag,
+                                                    schema=self.schema, huge_tree=True)
+
+        try:
+            self._parser.feed(chunk)
+            self._release()
+        except self.etree.XMLSyntaxError as e:
+            self._fail(e)
+
+    def close(self):
+        """
+        Finish the message.
+
+        Returns:
+            list: Error messages ("line N: ..."); empty when the message is valid.
+        """
+        if self._failed:
+            return self.errors
+        if self._parser is None:
+            self.errors.append("No <Document> element found")
+            return self.errors
+        try:
+            self._parser.close()
+            self._release()
+        except self.etree.XMLSyntaxError as e:
+            self._fail(e)
+        return self.errors
+
+    def _release(self):
+        """Drop finished transactions so memory does not grow with the batch."""
+        for _, element in self._parser.read_events():
+            self.transactions += 1
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    def _fail(self, error):
+        # libxml2 stops a streaming parse at the first error
+        self._failed = True
+        self.errors.append(_format_error(error.lineno, error.msg))
+
+
+@METRICS.timed('validate_stream', check='schema')
+def validate_chunks(chunks, message_type):
+    """
+    Validate a message given as an iterable of str/bytes chunks.
+
+    Returns:
+        list: Error messages; empty when the message is valid.
+    """
+    validator = StreamValidator(message_type)
+    for chunk in chunks:
+        validator.feed(chunk)
+    return validator.close()
+
+
+@METRICS.timed('validate', check='schema')
+def validate_message(xml, message_type):
+    """
+    Validate one generated message (str or bytes).
+
+    A single message is small, so it is parsed into a tree and validated as a
+    whole, which is faster than streaming and reports every error with its line.
+
+    Returns:
+        list: Error messages; empty when the message is valid.
+    """
+    if isinstance(xml, str):
+        xml = xml.encode('utf-8')
+    start = xml.find(b'<Document')
+    if start < 0:
+        return ["No <Document> element found"]
+
+    etree = _etree()
+    schema = load_schema(MESSAGE_SCHEMAS[message_type])
+    if schema is None:
+        raise FileNotFoundError(f"Schema not found: {schema_path(MESSAGE_SCHEMAS[message_type])}")
+    errors = _app_hdr_errors(etree, xml[:start])
+
+    # Keep the line numbers of the original message
+    document = b'\n' * xml.count(b'\n', 0, start) + xml[start:]
+    parser = etree.XMLParser(huge_tree=True)
+    try:
+        root = etree.fromstring(document, parser)
+    except etree.XMLSyntaxError:
+        return errors + _log_errors(parser.error_log)
+    if not schema.validate(root):
+        errors.extend(_log_errors(schema.error_log))
+    return errors
+
+
+def validate_file(path, message_type):
+    """
+    Validate a message file (e.g. a batch written by write_pacs008_xml) in one
+    streaming pass; .gz and .zst files are decompressed on the fly.
+    """
+    with open_input(path) as f:
+        return validate_chunks(iter(lambda: f.read(READ_SIZE), b''), message_type)
+
+
+def validating_chunks(chunks, validator):
+    """Pass chunks through unchanged while feeding them to validator (validate while writing)."""
+    for chunk in chunks:
+        validator.feed(chunk)
+        yield chunk
@@ -0,0 +1,478 @@
+"""
+Seeded synthetic payment data for load tests and test corpora.
+
+SyntheticPayments produces rows keyed like the Streamlit form and the CLI input
+(msgId, dbtrNm, cdtrAcctIBAN, instdAmt, ...) for every message variant:
+pacs.008 over SWIFT and Fedwire domestic / international / tax, and pain.001.
+Parties, banks and accounts come from per-country populations built once per
+generator; a few parties and banks take most of the traffic, as in real
+payment files. Accounts in IBAN countries (iban.is_iban_country) get IBANs with
+valid check digits wherever the variant renders an <IBAN>, other accounts get
+local account numbers; BICs and ABA routing numbers pass routing.py's checks.
+
+Rows are generated lazily, one at a time, so corpora of any size stream in flat
+memory. The same seed always gives the same rows for a variant, independently
+of which other variants were generated before.
+
+Command line (JSONL or CSV that python -m cli reads back):
+    python -m synthetic pacs008 --channel fedwire --fedwire-type tax --rows 100000 --seed 7 -o tax.jsonl
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import random
+import re
+import sys
+
+from iban import IBAN_REGISTRY, iban_checksum, is_iban_country
+from ids import IdGenerator
+from routing import ABA_WEIGHTS
+from xml_generator import IRS_CREDITOR_AGENT
+
+# (message_type, channel_type, fedwire_type) of every variant the generators render
+VARIANTS = (
+    ('pacs008', 'swift', None),
+    ('pacs008', 'fedwire', 'domestic'),
+    ('pacs008', 'fedwire', 'international'),
+    ('pacs008', 'fedwire', 'tax'),
+    ('pain001', None, None),
+)
+
+# Country -> (currency, towns, postcode pattern: '#' digit, 'A' letter)
+COUNTRY_PROFILES = {
+    'US': ('USD', ('New York', 'Chicago', 'Houston', 'Phoenix', 'Seattle', 'Boston', 'Denver', 'Atlanta'), '#####'),
+    'GB': ('GBP', ('London', 'Manchester', 'Leeds', 'Bristol', 'Glasgow'), 'AA# #AA'),
+    'DE': ('EUR', ('Berlin', 'Hamburg', 'Munich', 'Cologne', 'Frankfurt'), '#####'),
+    'FR': ('EUR', ('Paris', 'Lyon', 'Marseille', 'Toulouse', 'Nice'), '#####'),
+    'NL': ('EUR', ('Amsterdam', 'Rotterdam', 'Utrecht', 'Eindhoven'), '#### AA'),
+    'ES': ('EUR', ('Madrid', 'Barcelona', 'Valencia', 'Seville'), '#####'),
+    'IT': ('EUR', ('Rome', 'Milan', 'Naples', 'Turin'), '#####'),
+    'BE': ('EUR', ('Brussels', 'Antwerp', 'Ghent'), '####'),
+    'IE': ('EUR', ('Dublin', 'Cork', 'Galway'), 'A## A#A#'),
+    'CH': ('CHF', ('Zurich', 'Geneva', 'Basel', 'Bern'), '####'),
+    'CA': ('CAD', ('Toronto', 'Montreal', 'Vancouver', 'Calgary'), 'A#A #A#'),
+    'JP': ('JPY', ('Tokyo', 'Osaka', 'Yokohama', 'Nagoya'), '###-####'),
+    'AU': ('AUD', ('Sydney', 'Melbourne', 'Brisbane', 'Perth'), '####'),
+    'SG': ('SGD', ('Singapore',), '######'),
+    'IN': ('INR', ('Mumbai', 'Delhi', 'Bengaluru', 'Chennai'), '######'),
+    'MX': ('MXN', ('Mexico City', 'Guadalajara', 'Monterrey'), '#####'),
+}
+FOREIGN_COUNTRIES = tuple(country for country in COUNTRY_PROFILES if country != 'US')
+SEPA_COUNTRIES = tuple(country for country, (currency, _, _) in COUNTRY_PROFILES.items() if currency == 'EUR')
+
+# Units per USD for the form's currencies; rows for other currencies settle in USD.
+# Static so that corpora do not depend on the exchange-rate API.
+REFERENCE_RATES = {'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'JPY': 151.0, 'CAD': 1.36, 'AUD': 1.52, 'CHF': 0.88}
+
+FIRST_NAMES = ('Olivia', 'Liam', 'Emma', 'Noah', 'Amelia', 'Lucas', 'Sofia', 'Mateo', 'Hannah', 'Yuki', 'Arjun',
+               'Chloe', 'Felix', 'Ines', 'Marco', 'Priya', 'Sean', 'Lena', 'Hugo', 'Mei')
+LAST_NAMES = ('Smith', 'Garcia', 'Muller', 'Rossi', 'Dubois', 'Jansen', 'Tanaka', 'Patel', 'Murphy', 'Novak',
+              'Brown', 'Silva', 'Kowalski', 'Lee', 'Martin', 'Schmidt', 'Lopez', 'Khan', 'Wilson', 'Moreau')
+COMPANY_WORDS = ('Atlas', 'Northwind', 'Bluebird', 'Summit', 'Harbor', 'Crescent', 'Pioneer', 'Evergreen',
+                 'Keystone', 'Meridian', 'Orchid', 'Granite', 'Silverline', 'Redwood', 'Beacon', 'Falcon')
+COMPANY_SUFFIXES = ('Ltd', 'Inc', 'GmbH', 'SA', 'BV', 'LLC', 'Holdings', 'Trading Co', 'Logistics', 'Foods')
+STREET_NAMES = ('Main Street', 'High Street', 'Station Road', 'Park Avenue', 'Church Lane', 'Market Square',
+                'Harbour Road', 'King Street', 'Mill Lane', 'Oak Avenue', 'Bridge Street', 'Victoria Road')
+BANK_WORDS = ('First', 'United', 'Continental', 'Royal', 'Capital', 'Commerce', 'Citizens', 'National',
+              'Metropolitan', 'Pacific', 'Atlantic', 'Cooperative')
+REMITTANCE_FORMATS = ('Invoice {number}', 'INV-{number} goods', 'Payroll {month}', 'Rent {month}',
+                      'Order {number} services', 'Contract {number} instalment')
+SWIFT_SETTLEMENT_METHODS = ('INDA', 'INGA', 'COVE')
+CHARGE_BEARERS = ('SHAR', 'DEBT', 'CRED')
+CHARGE_BEARER_WEIGHTS = (70, 20, 10)
+# IRS EFTPS tax type codes (form number + payment type)
+TAX_TYPES = ('94105', '94104', '10401', '10406', '11206', '72005', '94005', '94305')
+
+DEFAULT_SEED = 0
+DEFAULT_POPULATION = 500
+DEFAULT_START_DATE = datetime.date(2025, 1, 2)
+# Share of rows that carry an optional party; the distinct values in a batch decide how well caches hit
+OPTIONAL_PARTY_RATE = 0.15
+AMOUNT_MEDIAN = 1500.0
+AMOUNT_SIGMA = 1.6
+
+
+def random_digits(rng, count):
+    """count random decimal digits."""
+    return f"{rng.randrange(10 ** count):0{count}d}"
+
+
+def fill_pattern(rng, pattern):
+    """Replace '#' with a digit and 'A' with an upper-case letter."""
+    return ''.join(str(rng.randrange(10)) if char == '#' else chr(65 + rng.randrange(26)) if char == 'A' else char
+                   for char in pattern)
+
+
+def make_iban(rng, country):
+    """A random IBAN with a BBAN in the registry format of country and valid check digits."""
+    bban = []
+    for count, kind in re.findall(r'(\d+)([nac])', IBAN_REGISTRY[country][1]):
+        for _ in range(int(count)):
+            if kind == 'n' or (kind == 'c' and rng.random() < 0.7):
+                bban.append(str(rng.randrange(10)))
+            else:
+                bban.append(chr(65 + rng.randrange(26)))
+    bban = ''.join(bban)
+    return f"{country}{98 - iban_checksum(f'{country}00{bban}'):02d}{bban}"
+
+
+def make_aba(rng):
+    """A random ABA routing number with a Federal Reserve / thrift prefix and a valid check digit."""
+    prefix = rng.choice([*range(1, 13), *range(21, 33)])
+    digits = f"{prefix:02d}{random_digits(rng, 6)}"
+    check = -sum(weight * int(digit) for weight, digit in zip(ABA_WEIGHTS, digits)) % 10
+    return f"{digits}{check}"
+
+
+def make_bic(rng, country):
+    """A random BIC11: bank code, country, location and the primary office branch (XXX)."""
+    bank = ''.join(chr(65 + rng.randrange(26)) for _ in range(4))
+    location = chr(65 + rng.randrange(26)) + str(rng.randrange(10))
+    return f"{bank}{country}{location}XXX"
+
+
+class SyntheticPayments:
+    """
+    Reproducible generator of payment rows.
+
+    Args:
+        seed (int | str): Seed for everything the generator produces.
+        population (int): Parties per country; banks are a tenth of that (at least 3).
+        start_date (datetime.date): First settlement / execution date; later rows
+                                    spread over the following business days.
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, population=DEFAULT_POPULATION, start_date=DEFAULT_START_DATE):
+        self.seed = seed
+        self.population = population
+        self.start_date = start_date
+        self._parties = {}
+        self._banks = {}
+        # Zipf-like popularity: party i is chosen with weight 1 / (i + 1)
+        self._party_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(population)))
+        bank_count = max(3, population // 10)
+        self._bank_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(bank_count)))
+
+    def _rng(self, *scope):
+        """Independent random stream for one population or variant (string seeds are stable across runs)."""
+        return random.Random(':'.join(map(str, (self.seed,) + scope)))
+
+    def parties(self, country):
+        """The party population of a country (built on first use)."""
+        parties = self._parties.get(country)
+        if parties is None:
+            rng = self._rng('parties', country)
+            parties = self._parties[country] = [self._make_party(rng, country) for _ in range(self.population)]
+        return parties
+
+    def banks(self, country):
+        """The bank population of a country (built on first use)."""
+        banks = self._banks.get(country)
+        if banks is None:
+            rng = self._rng('banks', country)
+            banks = self._banks[country] = [self._make_bank(rng, country) for _ in self._bank_weights]
+        return banks
+
+    @staticmethod
+    def _make_party(rng, country):
+        _, towns, postcode = COUNTRY_PROFILES[country]
+        if rng.random() < 0.6:
+            name = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+        else:
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        return {
+            'Nm': name,
+            'StrtNm': rng.choice(STREET_NAMES),
+            'BldgNb': str(rng.randint(1, 250)),
+            'PstCd': fill_pattern(rng, postcode),
+            'TwnNm': rng.choice(towns),
+            'Ctry': country,
+            # Both forms, so one party can pay over IBAN and non-IBAN variants
+            'iban': make_iban(rng, country) if is_iban_country(country) else None,
+            'account': random_digits(rng, rng.randint(8, 14)),
+        }
+
+    @staticmethod
+    def _make_bank(rng, country):
+        _, towns, postcode = COUNTRY_PROFILES[country]
+        return {
+            'BICFI': make_bic(rng, country),
+            'MmbId': make_aba(rng) if country == 'US' else '',
+            'Nm': f"{rng.choice(BANK_WORDS)} {rng.choice(BANK_WORDS)} Bank",
+            'StrtNm': rng.choice(STREET_NAMES),
+            'BldgNb': str(rng.randint(1, 99)),
+            'PstCd': fill_pattern(rng, postcode),
+            'TwnNm': rng.choice(towns),
+            'Ctry': country,
+        }
+
+    def _pick_party(self, rng, country):
+        return rng.choices(self.parties(country), cum_weights=self._party_weights)[0]
+
+    def _pick_bank(self, rng, country):
+        return rng.choices(self.banks(country), cum_weights=self._bank_weights)[0]
+
+    def rows(self, message_type, channel_type=None, fedwire_type=None, count=None):
+        """
+        Lazily generate rows for one variant.
+
+        Args:
+            message_type (str): 'pacs008' or 'pain001'.
+            channel_type (str): 'fedwire' or 'swift' (pacs008 only).
+            fedwire_type (str): 'domestic', 'international' or 'tax' (fedwire only).
+            count (int): Number of rows; None for an endless stream.
+        Yields:
+            dict: One payment row, keyed like the form data.
+        """
+        if message_type == 'pacs008' and channel_type != 'fedwire':
+            fedwire_type = None
+        rng = self._rng('rows', message_type, channel_type, fedwire_type)
+        ids = IdGenerator('seeded', seed=f"{self.seed}:{message_type}:{channel_type}:{fedwire_type}")
+        indexes = itertools.count(1) if count is None else range(1, count + 1)
+
+        if message_type == 'pain001':
+            make_row = self._pain001_row
+        elif channel_type == 'swift':
+            make_row = self._swift_row
+        elif fedwire_type == 'international':
+            make_row = self._fedwire_international_row
+        elif fedwire_type in ('domestic', 'tax'):
+            make_row = self._fedwire_tax_row if fedwire_type == 'tax' else self._fedwire_domestic_row
+        else:
+            raise ValueError(f"Unknown variant: {message_type} {channel_type} {fedwire_type}")
+
+        for index in indexes:
+            yield make_row(rng, ids, index)
+
+    def corpus(self, count_per_variant):
+        """
+        Rows for every variant in VARIANTS, variant after variant.
+
+        Yields:
+            tuple: (message_type, channel_type, fedwire_type, row).
+        """
+        for message_type, channel_type, fedwire_type in VARIANTS:
+            for row in self.rows(message_type, channel_type, fedwire_type, count_per_variant):
+                yield message_type, channel_type, fedwire_type, row
+
+    # Row builders
+
+    def _value_date(self, index):
+        """Business day for the index-th row: a few hundred rows per day from start_date."""
+        day = self.start_date + datetime.timedelta(days=index // 500)
+        while day.weekday() >= 5:
+            day += datetime.timedelta(days=1)
+        return day
+
+    @staticmethod
+    def _amount(rng):
+        """Log-normal payment amount: mostly small, with a long tail of large payments."""
+        return round(max(1.0, rng.lognormvariate(0, AMOUNT_SIGMA) * AMOUNT_MEDIAN), 2)
+
+    @staticmethod
+    def _remittance(rng, index):
+        month = datetime.date(2025, rng.randint(1, 12), 1).strftime('%b %Y')
+        return rng.choice(REMITTANCE_FORMATS).format(number=f"{index:07d}", month=month)
+
+    @staticmethod
+    def _party_fields(row, prefix, party, account):
+        for suffix in ('Nm', 'StrtNm', 'BldgNb', 'PstCd', 'TwnNm', 'Ctry'):
+            row[prefix + suffix] = party[suffix]
+        row[prefix + 'AcctIBAN'] = account
+
+    @staticmethod
+    def _agent_fields(row, prefix, bank=None, routing='bic'):
+        """
+        dbtrAgt*/cdtrAgt* fields: a BICFI ('bic') or a USABA member ID with the
+        agent's name and address ('aba'); no bank leaves them all empty.
+        """
+        row[prefix + 'BICFI_tx'] = bank['BICFI'] if bank and routing == 'bic' else ''
+        row[prefix + 'MmbId'] = bank['MmbId'] if bank and routing == 'aba' else ''
+        for suffix in ('Nm', 'StrtNm', 'BldgNb', 'PstCd', 'TwnNm', 'Ctry'):
+            row[prefix + suffix] = bank[suffix] if bank and routing == 'aba' else ''
+
+    def _optional_names(self, rng, row, keys):
+        for key in keys:
+            row[key] = ''
+            if rng.random() < OPTIONAL_PARTY_RATE:
+                country = rng.choice(tuple(COUNTRY_PROFILES))
+                row[key] = self._pick_party(rng, country)['Nm']
+
+    def _pacs008_common(self, rng, ids, index, msg_prefix, sttlm_mtd):
+        value_date = self._value_date(index)
+        return {
+            'msgId': ids.msg_id(f"{value_date:%Y%m%d}{msg_prefix}"),
+            'intrBkSttlmDt': value_date.isoformat(),
+            'sttlmMtd': sttlm_mtd,
+            'chrgBr': rng.choices(CHARGE_BEARERS, CHARGE_BEARER_WEIGHTS)[0],
+            'ustrdRmtInf': self._remittance(rng, index),
+            'taxId': '', 'taxType': '', 'taxYear': '', 'taxPeriod': '',
+        }
+
+    @staticmethod
+    def _set_amounts(rng, row, amount, settlement_ccy, instructed_ccy):
+        """Instructed amount, currencies, exchange rate and settlement amount (instdAmt / rate, as the form)."""
+        row['primaryCurrency'] = settlement_ccy
+        row['secondaryCurrency'] = instructed_ccy
+        row['instdAmt'] = amount
+        if settlement_ccy == instructed_ccy:
+            row['exchangeRate'] = None
+            row['intrBkSttlmAmt'] = amount
+        else:
+            # Units of the instructed currency per settlement unit, within half a percent of the reference rate
+            rate = REFERENCE_RATES[instructed_ccy] / REFERENCE_RATES[settlement_ccy] * rng.uniform(0.995, 1.005)
+            row['exchangeRate'] = round(rate, 6)
+            row['intrBkSttlmAmt'] = round(amount / row['exchangeRate'], 2)
+
+    @staticmethod
+    def _currency(country):
+        currency = COUNTRY_PROFILES[country][0]
+        return currency if currency in REFERENCE_RATES else 'USD'
+
+    def _swift_row(self, rng, ids, index):
+        dbtr_ctry = rng.choice(tuple(COUNTRY_PROFILES))
+        cdtr_ctry = rng.choice(FOREIGN_COUNTRIES if dbtr_ctry == 'US' else tuple(COUNTRY_PROFILES))
+        dbtr, cdtr = self._pick_party(rng, dbtr_ctry), self._pick_party(rng, cdtr_ctry)
+        dbtr_agt, cdtr_agt = self._pick_bank(rng, dbtr_ctry), self._pick_bank(rng, cdtr_ctry)
+
+        row = self._pacs008_common(rng, ids, index, 'SWIFT', rng.choice(SWIFT_SETTLEMENT_METHODS))
+        row['instgAgtBICFI'] = dbtr_agt['BICFI']
+        row['instdAgtBICFI'] = cdtr_agt['BICFI']
+        row['instgAgtMmbId'] = row['instdAgtMmbId'] = ''
+        self._party_fields(row, 'dbtr', dbtr, dbtr['iban'] or dbtr['account'])
+        self._party_fields(row, 'cdtr', cdtr, cdtr['iban'] or cdtr['account'])
+        self._agent_fields(row, 'dbtrAgt', dbtr_agt)
+        self._agent_fields(row, 'cdtrAgt', cdtr_agt)
+        self._set_amounts(rng, row, self._amount(rng), self._currency(dbtr_ctry), self._currency(cdtr_ctry))
+        self._optional_names(rng, row, ('initgPtyNm', 'ultmtDbtrNm', 'ultmtCdtrNm'))
+        return row
+
+    def _fedwire_row(self, rng, ids, index):
+        """Fields shared by the Fedwire variants: US debtor, USABA instructing and debtor agents."""
+        dbtr = self._pick_party(rng, 'US')
+        dbtr_agt = self._pick_bank(rng, 'US')
+        row = self._pacs008_common(rng, ids, index, '', 'CLRG')
+        row['instgAgtBICFI'] = row['instdAgtBICFI'] = ''
+        row['instgAgtMmbId'] = dbtr_agt['MmbId']
+        self._party_fields(row, 'dbtr', dbtr, dbtr['account'])
+        self._agent_fields(row, 'dbtrAgt', dbtr_agt, 'aba')
+        self._optional_names(rng, row, ('initgPtyNm', 'ultmtCdtrNm'))
+        row['ultmtDbtrNm'] = ''
+        return row
+
+    def _fedwire_domestic_row(self, rng, ids, index):
+        row = self._fedwire_row(rng, ids, index)
+        cdtr = self._pick_party(rng, 'US')
+        cdtr_agt = self._pick_bank(rng, 'US')
+        row['instdAgtMmbId'] = cdtr_agt['MmbId']
+        self._party_fields(row, 'cdtr', cdtr, cdtr['account'])
+        self._agent_fields(row, 'cdtrAgt', cdtr_agt, 'aba')
+        self._set_amounts(rng, row, self._amount(rng), 'USD', 'USD')
+        return row
+
+    def _fedwire_international_row(self, rng, ids, index):
+        row = self._fedwire_row(rng, ids, index)
+        cdtr_ctry = rng.choice(FOREIGN_COUNTRIES)
+        cdtr = self._pick_party(rng, cdtr_ctry)
+        cdtr_agt = self._pick_bank(rng, cdtr_ctry)
+        # The US correspondent of the foreign bank receives the Fedwire message
+        row['instdAgtMmbId'] = self._pick_bank(rng, 'US')['MmbId']
+        self._party_fields(row, 'cdtr', cdtr, cdtr['iban'] or cdtr['account'])
+        self._agent_fields(row, 'cdtrAgt', cdtr_agt)
+        self._set_amounts(rng, row, self._amount(rng), 'USD', self._currency(cdtr_ctry))
+        return row
+
+    def _fedwire_tax_row(self, rng, ids, index):
+        row = self._fedwire_row(rng, ids, index)
+        row['instdAgtMmbId'] = IRS_CREDITOR_AGENT['mmbId']
+        irs = {'Nm': 'United States Treasury', 'StrtNm': IRS_CREDITOR_AGENT['strtNm'],
+               'BldgNb': IRS_CREDITOR_AGENT['bldgNb'], 'PstCd': IRS_CREDITOR_AGENT['pstCd'],
+               'TwnNm': IRS_CREDITOR_AGENT['twnNm'], 'Ctry': 'US'}
+        self._party_fields(row, 'cdtr', irs, random_digits(rng, 10))
+        # The creditor agent of tax payments is always the IRS (xml_generator.IRS_CREDITOR_AGENT)
+        self._agent_fields(row, 'cdtrAgt')
+        self._set_amounts(rng, row, self._amount(rng), 'USD', 'USD')
+
+        tax_year = self._value_date(index).year - rng.choice((0, 1, 1, 2))
+        row['taxId'] = f"{rng.randint(10 ** 8, 10 ** 9 - 2):09d}"
+        row['taxType'] = rng.choice(TAX_TYPES)
+        row['taxYear'] = str(tax_year)
+        # 94x employment taxes are quarterly, income taxes annual
+        month = rng.choice((3, 6, 9, 12)) if row['taxType'].startswith('94') else 12
+        row['taxPeriod'] = f"MM{month:02d}"
+        row['taxInfo'] = f"{row['taxType'][:3]} {tax_year}" if rng.random() < 0.3 else ''
+        return row
+
+    def _pain001_row(self, rng, ids, index):
+        dbtr_ctry, cdtr_ctry = rng.choice(SEPA_COUNTRIES), rng.choice(SEPA_COUNTRIES)
+        dbtr, cdtr = self._pick_party(rng, dbtr_ctry), self._pick_party(rng, cdtr_ctry)
+        execution_date = self._value_date(index)
+        created = datetime.datetime.combine(execution_date - datetime.timedelta(days=1),
+                                            datetime.time(rng.randrange(24), rng.randrange(60), rng.randrange(60)))
+        reference = ids.reference(index)
+        row = {
+            'msgId': ids.msg_id(f"{execution_date:%Y%m%d}"),
+            'creDtTm': f"{created:%Y-%m-%dT%H:%M:%S}+00:00",
+            'initgPtyNm': dbtr['Nm'],
+            'pmtInfId': f"PMTINF{reference}",
+            'pmtMtd': 'TRF',
+            'btchBookg': rng.random() < 0.8,
+            'reqdExctnDt': execution_date.isoformat(),
+            'dbtrAgtBICFI': self._pick_bank(rng, dbtr_ctry)['BICFI'],
+            'cdtrAgtBICFI': self._pick_bank(rng, cdtr_ctry)['BICFI'],
+            'instdAmt': self._amount(rng),
+            'ustrdRmtInf': self._remittance(rng, index),
+            'currency': 'EUR',
+        }
+        self._party_fields(row, 'dbtr', dbtr, dbtr['iban'])
+        self._party_fields(row, 'cdtr', cdtr, cdtr['iban'])
+        self._optional_names(rng, row, ('ultmtDbtrNm', 'ultmtCdtrNm'))
+        return row
+
+
+def write_rows(stream, rows, output_format='jsonl'):
+    """Write rows as JSON lines or CSV (header from the first row). Returns the number of rows written."""
+    count = 0
+    if output_format == 'jsonl':
+        for count, row in enumerate(rows, start=1):
+            stream.write(json.dumps(row, separators=(',', ':')) + '\n')
+        return count
+
+    writer = None
+    for count, row in enumerate(rows, start=1):
+        if writer is None:
+            writer = csv.DictWriter(stream, fieldnames=list(row), lineterminator='\n')
+            writer.writeheader()
+        writer.writerow({key: '' if value is None else value for key, value in row.items()})
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m synthetic',
+                                     description='Generate seeded synthetic payment rows for python -m cli.')
+    parser.add_argument('message_type', choices=['pacs008', 'pain001'])
+    parser.add_argument('--channel', choices=['fedwire', 'swift'], default='swift')
+    parser.add_argument('--fedwire-type', choices=['domestic', 'international', 'tax'], default='domestic')
+    parser.add_argument('-n', '--rows', type=int, default=1000, help='Number of rows (default: 1000)')
+    parser.add_argument('--seed', default=str(DEFAULT_SEED), help='Seed; the same seed gives the same rows')
+    parser.add_argument('--population', type=int, default=DEFAULT_POPULATION,
+                        help=f'Parties per country (default: {DEFAULT_POPULATION})')
+    parser.add_argument('-o', '--output', default='-', help="Output file ('-' for stdout)")
+    parser.add_argument('--format', dest='output_format', choices=['jsonl', 'csv'],
+                        help='Output format (default: guessed from the file extension, else jsonl)')
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    rows = SyntheticPayments(args.seed, args.population).rows(args.message_type, args.channel, args.fedwire_type,
+                                                              args.rows)
+    if args.output == '-':
+        write_rows(sys.stdout, rows, output_format)
+    else:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            write_rows(f, rows, output_format)
+
+
+if __name__ == '__main__':
+    main()
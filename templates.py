@@ -0,0 +1,475 @@
+"""
+Precompiled string templates used by xml_generator.
+
+A template is ordinary text with str.format style placeholders ({msgId},
+{instdAmt:.2f}). compile_template() resolves every placeholder once: a resolver
+returns either a constant (folded into the surrounding static text), a Field
+(a plain data.get lookup), a Param (a value passed to render() alongside the
+data), a Value (a computed data value) or any other callable slot evaluated
+at render time.
+
+Field and Value slots hold data, so they are XML-escaped when rendered (&, <
+and > in element text, double quotes too inside an attribute value), exactly
+as message_model escapes them. Params, constants and other callable slots are
+markup or program values and are inserted as they are.
+
+The flattened static segments and slots are then turned into a single Python
+function built around one f-string. Optional blocks and Switch choices are
+inlined into that function, so a message variant renders at the speed of a
+hand-written f-string but without any of the per-call branching on channel or
+payment type or calls into helper functions.
+
+compact_template() derives a copy of a compiled template without layout
+whitespace, for minified output.
+
+FragmentCache is a bounded LRU of rendered fragments with hit/miss statistics.
+A Cached slot marks a fragment (an agent or account block) whose text depends
+only on a few data values; when render() is given a cache as
+params['fragments'], the fragment is looked up by those values and rendered
+only on a miss, so a debtor agent repeated across a batch is rendered once.
+Without a cache the fragment is inlined like any other slot.
+"""
+import re
+from collections import OrderedDict
+from string import Formatter
+
+_formatter = Formatter()
+
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_ATTRIBUTE_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+
+def escape_text(value):
+    """Data value as XML element text: str(value) with &, < and > escaped."""
+    text = value if type(value) is str else str(value)
+    if '&' in text or '<' in text or '>' in text:
+        return text.translate(_TEXT_ESCAPES)
+    return text
+
+
+def escape_attribute(value):
+    """Data value as a double-quoted XML attribute value: escape_text plus &quot;."""
+    text = value if type(value) is str else str(value)
+    if '&' in text or '<' in text or '>' in text or '"' in text:
+        return text.translate(_ATTRIBUTE_ESCAPES)
+    return text
+
+
+class Field:
+    """Slot that reads key from the data dict, like data.get(key, default)."""
+    __slots__ = ('key', 'default')
+
+    def __init__(self, key, default=''):
+        self.key = key
+        self.default = default
+
+    def __call__(self, data):
+        return data.get(self.key, self.default)
+
+    def __repr__(self):
+        return f"Field({self.key!r}, {self.default!r})"
+
+
+def field(key, default=''):
+    """Slot that reads key from the data dict, like data.get(key, default)."""
+    return Field(key, default)
+
+
+class Value:
+    """Slot computing a data value from the data dict (e.g. an ID with a fallback); escaped like a Field."""
+    __slots__ = ('compute',)
+
+    def __init__(self, compute):
+        self.compute = compute
+
+    def __call__(self, data):
+        return self.compute(data)
+
+
+def value(compute):
+    """Slot for the data value compute(data) returns, escaped like a Field (never markup)."""
+    return Value(compute)
+
+
+class Param:
+    """Slot that reads a render-time parameter: template.render(data, {name: value})."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Param({self.name!r})"
+
+
+def param(name):
+    """Slot for a value passed to render() next to the data dict (e.g. NbOfTxs of a batch)."""
+    return Param(name)
+
+
+class CompiledTemplate:
+    """A template flattened into static segments and data slots."""
+    __slots__ = ('segments', 'slots', 'format_specs', 'render')
+
+    def __init__(self, segments, slots, format_specs):
+        # segments always has len(slots) + 1 entries: static, slot, static, ..., static
+        self.segments = tuple(segments)
+        self.slots = tuple(slots)
+        self.format_specs = tuple(format_specs)
+        self.render = _build_renderer(self)
+
+    @property
+    def is_constant(self):
+        return not self.slots
+
+    def __call__(self, data, params=None):
+        return self.render(data, params)
+
+    def as_slot(self):
+        """Return the rendered text if the template is constant, else the template itself."""
+        return self.segments[0] if not self.slots else self
+
+
+def _escape(text):
+    """Escape static text for use inside a double-quoted f-string literal."""
+    return (text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+            .replace('{', '{{').replace('}', '}}'))
+
+
+class Optional:
+    """Slot rendering template only when data.get(key) is truthy (e.g. an UltmtDbtr block)."""
+    __slots__ = ('key', 'template')
+
+    def __init__(self, key, template):
+        self.key = key
+        self.template = template
+
+    def __call__(self, data):
+        return self.template.render(data) if data.get(self.key) else ''
+
+
+class Switch:
+    """Slot rendering cases[selector(data)]; each case is a CompiledTemplate or constant text."""
+    __slots__ = ('selector', 'cases')
+
+    def __init__(self, selector, cases):
+        self.selector = selector
+        self.cases = cases
+
+    def __call__(self, data):
+        case = self.cases[self.selector(data)]
+        return case.render(data) if isinstance(case, CompiledTemplate) else case
+
+
+DEFAULT_FRAGMENT_CACHE_SIZE = 4096
+
+
+class FragmentCache:
+    """
+    Bounded LRU of rendered fragments with hit/miss statistics, meant to live for one batch.
+
+    Keys are tuples of the fragment's scope (its name and variant) and the data
+    values it is rendered from; values are the rendered text.
+
+    Args:
+        max_entries (int): Fragments kept; the least recently used is evicted first.
+    """
+
+    def __init__(self, max_entries=DEFAULT_FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key):
+        """Return the text stored under key, or None (counted as a miss)."""
+        text = self._entries.get(key)
+        if text is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        self._entries.move_to_end(key)
+        return text
+
+    def store(self, key, text):
+        """Store text under key, evicting the least recently used fragment when full, and return it."""
+        self._entries[key] = text
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        return text
+
+    @property
+    def hit_rate(self):
+        """Share of lookups served from the cache (0.0 before the first lookup)."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+
+class Cached:
+    """
+    Slot rendering inner (a Switch, Optional or CompiledTemplate) through the
+    FragmentCache passed as params['fragments'], keyed by scope plus the values
+    of keys in the data dict. keys must cover every value inner depends on.
+    """
+    __slots__ = ('scope', 'keys', 'inner')
+
+    def __init__(self, scope, keys, inner):
+        self.scope = tuple(scope)
+        self.keys = tuple(keys)
+        self.inner = inner
+
+    def __call__(self, data):
+        return self.inner.render(data) if isinstance(self.inner, CompiledTemplate) else self.inner(data)
+
+
+def cached(scope, keys, slot):
+    """Wrap a slot in Cached (see FragmentCache); constant text needs no cache and is returned as it is."""
+    return Cached(scope, keys, slot) if callable(slot) else slot
+
+
+class _RendererBuilder:
+    """
+    Generates the source of render(data, params) for a template.
+
+    Field slots become data.get() calls and Param slots params[name]
+    lookups inside one f-string. Optional and Switch
+    slots and nested templates are inlined as local statements
+    ahead of that f-string, so a whole message variant renders without calling
+    back into Python helpers. Any other callable slot is called as _slotN(data).
+    Cached slots are inlined too, behind a lookup in params['fragments'] when
+    the caller passes a FragmentCache.
+
+    Field and Value slots are read into locals first; one membership test over
+    all of them decides whether any needs escaping, so clean data (the usual
+    case) costs a single check per template rather than a call per value.
+    """
+
+    def __init__(self):
+        self.namespace = {'_escape_text': escape_text, '_escape_attribute': escape_attribute}
+        self.lines = []
+        self.uses_fragments = False
+
+    def bind(self, prefix, value):
+        name = f"_{prefix}{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def literal(self, value):
+        """Source for a constant: a repr for simple values, otherwise a bound name."""
+        if value is None or isinstance(value, (bool, int, float)) or (
+                isinstance(value, str) and (value == '' or value.isidentifier())):
+            return repr(value)
+        return self.bind('const', value)
+
+    def text(self, template, indent):
+        """Return an expression rendering template, emitting helper statements at indent."""
+        if not isinstance(template, CompiledTemplate):
+            return self.literal(template)
+        if template.is_constant:
+            return self.literal(template.segments[0])
+
+        pad = ' ' * indent
+        parts = []
+        escaped = []
+        for index, (slot, format_spec) in enumerate(zip(template.slots, template.format_specs)):
+            parts.append(_escape(template.segments[index]))
+            if isinstance(slot, (Field, Value)):
+                if isinstance(slot, Field):
+                    expression = f"get({self.literal(slot.key)}, {self.literal(slot.default)})"
+                else:
+                    expression = f"{self.bind('compute', slot.compute)}(data)"
+                # Formatted values (amounts, {instdAmt:.2f}) are numbers; everything else is escaped text
+                if not format_spec:
+                    variable = self.bind('value', None)
+                    self.lines.append(f"{pad}{variable} = {expression}")
+                    escape = '_escape_attribute' if template.segments[index].endswith('="') else '_escape_text'
+                    escaped.append((variable, escape))
+                    expression = variable
+            elif isinstance(slot, Param):
+                expression = f"params[{self.literal(slot.name)}]"
+            else:
+                expression = self.slot(slot, indent)
+            parts.append('{' + expression + (':' + format_spec if format_spec else '') + '}')
+        parts.append(_escape(template.segments[-1]))
+        if escaped:
+            self.escape_values(escaped, indent)
+        return 'f"' + ''.join(parts) + '"'
+
+    def slot(self, slot, indent):
+        """Return an expression rendering a markup slot, emitting helper statements at indent."""
+        if isinstance(slot, Optional):
+            return self.optional(slot, indent)
+        if isinstance(slot, Switch):
+            return self.switch(slot, indent)
+        if isinstance(slot, Cached):
+            return self.cached(slot, indent)
+        if isinstance(slot, CompiledTemplate):
+            variable = self.bind('value', None)
+            self.lines.append(f"{' ' * indent}{variable} = {self.text(slot, indent)}")
+            return variable
+        return f"{self.bind('slot', slot)}(data)"
+
+    def escape_values(self, escaped, indent):
+        """Emit one check over all of a template's data values and escape them only when it finds markup."""
+        pad = ' ' * indent
+        joined = self.bind('text', None)
+        self.lines.append(f"{pad}{joined} = f\"{''.join('{' + variable + '}' for variable, _ in escaped)}\"")
+        self.lines.append(f"{pad}if '&' in {joined} or '<' in {joined} or '>' in {joined} or '\"' in {joined}:")
+        for variable, escape in escaped:
+            self.lines.append(f"{pad}    {variable} = {escape}({variable})")
+
+    def optional(self, slot, indent):
+        variable = self.bind('value', None)
+        pad = ' ' * indent
+        self.lines.append(f"{pad}if get({self.literal(slot.key)}):")
+        expression = self.text(slot.template, indent + 4)
+        self.lines.append(f"{pad}    {variable} = {expression}")
+        self.lines.append(f"{pad}else:")
+        self.lines.append(f"{pad}    {variable} = ''")
+        return variable
+
+    def switch(self, slot, indent):
+        variable = self.bind('value', None)
+        key = self.bind('key', None)
+        pad = ' ' * indent
+        self.lines.append(f"{pad}{key} = {self.bind('selector', slot.selector)}(data)")
+        keyword = 'if'
+        for case_key, case in slot.cases.items():
+            self.lines.append(f"{pad}{keyword} {key} == {self.bind('case', case_key)}:")
+            expression = self.text(case, indent + 4)
+            self.lines.append(f"{pad}    {variable} = {expression}")
+            keyword = 'elif'
+        self.lines.append(f"{pad}else:")
+        self.lines.append(f"{pad}    {variable} = {self.bind('switch', slot)}(data)")
+        return variable
+
+    def cached(self, slot, indent):
+        variable = self.bind('value', None)
+        key = self.bind('key', None)
+        pad = ' ' * indent
+        self.uses_fragments = True
+        self.lines.append(f"{pad}if fragments is None:")
+        expression = self.slot(slot.inner, indent + 4)
+        self.lines.append(f"{pad}    {variable} = {expression}")
+        self.lines.append(f"{pad}else:")
+        values = ''.join(f", get({self.literal(name)})" for name in slot.keys)
+        self.lines.append(f"{pad}    {key} = ({self.literal(slot.scope)}{values})")
+        self.lines.append(f"{pad}    {variable} = fragments.lookup({key})")
+        self.lines.append(f"{pad}    if {variable} is None:")
+        expression = self.slot(slot.inner, indent + 8)
+        self.lines.append(f"{pad}        {variable} = fragments.store({key}, {expression})")
+        return variable
+
+    def build(self, template):
+        expression = self.text(template, 4)
+        prologue = ['def render(data, params=None):', '    get = data.get']
+        if self.uses_fragments:
+            prologue.append("    fragments = params.get('fragments') if params else None")
+        source = '\n'.join(prologue + self.lines + [f'    return {expression}', ''])
+        exec(compile(source, '<template>', 'exec'), self.namespace)
+        return self.namespace['render']
+
+
+def _build_renderer(template):
+    """Generate render(data, params) for a flattened template."""
+    if template.is_constant:
+        text = template.segments[0]
+
+        def render_constant(data, params=None):
+            return text
+        return render_constant
+    return _RendererBuilder().build(template)
+
+
+def optional(condition, template):
+    """
+    Slot that renders template only when condition is truthy.
+
+    condition is a constant, a Field or any other slot; template is a
+    CompiledTemplate. Constant conditions are resolved at compile time and Field
+    conditions are inlined into the generated renderer.
+    """
+    if not callable(condition):
+        return template.as_slot() if condition else ''
+
+    if isinstance(condition, Field):
+        return Optional(condition.key, template)
+
+    return Switch(lambda data: bool(condition(data)), {True: template, False: ''})
+
+
+# A whitespace run containing a line break: indentation of the template source
+_LAYOUT_WHITESPACE = re.compile(r'\s*\n\s*')
+_WHITESPACE_BETWEEN_TAGS = re.compile(r'>\s+<')
+
+
+def compact_text(text):
+    """
+    Remove layout whitespace from template text.
+
+    ISO 20022 messages have no mixed content, so line breaks and indentation
+    next to a tag or at either end of a static segment (i.e. next to a slot,
+    which renders elements) are insignificant and dropped; inside a start tag
+    they separate attributes and become one space. Whitespace between two tags
+    is dropped as well.
+    """
+    def replace(match):
+        start, end = match.span()
+        if start == 0 or end == len(text) or text[start - 1] == '>' or text[end] == '<':
+            return ''
+        return ' '
+    return _WHITESPACE_BETWEEN_TAGS.sub('><', _LAYOUT_WHITESPACE.sub(replace, text))
+
+
+def compact_template(template):
+    """
+    Return a copy of template (a CompiledTemplate, slot or constant text) that
+    renders without layout whitespace; see compact_text. Nested templates,
+    Optional, Switch and Cached slots are compacted too; Field, Param and
+    other callable slots are kept as they are.
+    """
+    if isinstance(template, str):
+        return compact_text(template)
+    if isinstance(template, CompiledTemplate):
+        return CompiledTemplate([compact_text(segment) for segment in template.segments],
+                                [compact_template(slot) for slot in template.slots], template.format_specs)
+    if isinstance(template, Optional):
+        return Optional(template.key, compact_template(template.template))
+    if isinstance(template, Switch):
+        return Switch(template.selector, {key: compact_template(case) for key, case in template.cases.items()})
+    if isinstance(template, Cached):
+        return Cached(template.scope, template.keys, compact_template(template.inner))
+    return template
+
+
+def compile_template(source, resolve):
+    """
+    Compile a template source string.
+
+    Args:
+        source (str): Template text with {name} or {name:spec} placeholders.
+        resolve (callable): resolve(name) returning a str (constant text), a Field,
+                            a Param or another callable taking the data dict.
+    Returns:
+        CompiledTemplate: The flattened template.
+    """
+    segments = ['']
+    slots = []
+    format_specs = []
+
+    for literal, name, format_spec, conversion in _formatter.parse(source):
+        segments[-1] += literal
+        if name is None:
+            continue
+        value = resolve(name)
+        if callable(value) or isinstance(value, Param):
+            slots.append(value)
+            format_specs.append(format_spec or '')
+            segments.append('')
+        else:
+            segments[-1] += format(value, format_spec or '')
+
+    return CompiledTemplate(segments, slots, format_specs)
@@ -0,0 +1,63 @@
+"""Markup characters in the data come out escaped, the same way from every serializer."""
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from message_model import build_pacs008_message, serialize_pacs008
+from synthetic import VARIANTS, SyntheticPayments
+from templates import compile_template, escape_attribute, escape_text, field
+from xml_generator import generate_pacs008_xml, generate_pain001_xml, iter_pacs008_xml, iter_pain001_xml
+
+NAME = 'O"Neil & <Co> Ltd'
+REMITTANCE = 'Invoice 12 > 11 & a<b'
+
+
+def marked_up(row):
+    return dict(row, dbtrNm=NAME, cdtrNm=NAME, ustrdRmtInf=REMITTANCE)
+
+
+def find_text(xml, path):
+    """Text of the first element at path in the message body (AppHdr skipped), ignoring namespaces."""
+    root = ET.fromstring('<root>' + xml.split('?>', 1)[-1] + '</root>')
+    for element in root.iter():
+        element.tag = element.tag.rsplit('}', 1)[-1]
+    return root.findtext('.//Document//' + path)
+
+
+@pytest.mark.parametrize('message_type, channel_type, fedwire_type', VARIANTS)
+def test_template_renderer_escapes_data(message_type, channel_type, fedwire_type):
+    rows = [marked_up(row) for row in SyntheticPayments(1).rows(message_type, channel_type, fedwire_type, 2)]
+    if message_type == 'pain001':
+        outputs = [generate_pain001_xml(rows[0]), generate_pain001_xml(rows[0], compact=True),
+                   ''.join(iter_pain001_xml(rows))]
+    else:
+        outputs = [generate_pacs008_xml(rows[0], channel_type, fedwire_type),
+                   generate_pacs008_xml(rows[0], channel_type, fedwire_type, compact=True),
+                   ''.join(iter_pacs008_xml(rows, channel_type, fedwire_type))]
+
+    for xml in outputs:
+        assert find_text(xml, 'Dbtr/Nm') == NAME
+        assert find_text(xml, 'Cdtr/Nm') == NAME
+        # Tax payments carry structured remittance only
+        if fedwire_type != 'tax':
+            assert find_text(xml, 'RmtInf/Ustrd') == REMITTANCE
+
+
+@pytest.mark.parametrize('channel_type, fedwire_type', [variant[1:] for variant in VARIANTS if variant[0] == 'pacs008'])
+def test_template_renderer_matches_message_model(channel_type, fedwire_type):
+    rows = [marked_up(row) for row in SyntheticPayments(1).rows('pacs008', channel_type, fedwire_type, 2)]
+    template_xml = ''.join(iter_pacs008_xml(rows, channel_type, fedwire_type, compact=True))
+    model_xml = serialize_pacs008(build_pacs008_message(rows, channel_type, fedwire_type), pretty=False)
+
+    for xml in (template_xml, model_xml):
+        assert '&amp;' in xml and '&lt;Co&gt;' in xml
+        assert find_text(xml, 'Dbtr/Nm') == NAME
+
+
+def test_attribute_values_escape_quotes():
+    template = compile_template('<Amt Ccy="{ccy}">{note}</Amt>', field)
+
+    assert template.render({'ccy': 'a"b', 'note': 'say "hi" & <bye>'}) == \
+        '<Amt Ccy="a&quot;b">say "hi" &amp; &lt;bye&gt;</Amt>'
+    assert escape_text(12.5) == '12.5'
+    assert escape_attribute('<"&">') == '&lt;&quot;&amp;&quot;&gt;'
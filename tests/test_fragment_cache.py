@@ -0,0 +1,64 @@
+"""Agent and account fragments of a batch are rendered once per distinct party."""
+import pytest
+
+from ids import IdGenerator
+from metrics import METRICS
+from synthetic import VARIANTS, SyntheticPayments
+from templates import FragmentCache
+from xml_generator import get_pacs008_transaction_xml, iter_pacs008_xml, metric_labels
+
+PACS008_VARIANTS = [variant[1:] for variant in VARIANTS if variant[0] == 'pacs008']
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('channel_type, fedwire_type', PACS008_VARIANTS)
+def test_cached_fragments_match_uncached_render(channel_type, fedwire_type, compact):
+    ids = IdGenerator('seeded', 2)
+    # A small population, so parties and banks repeat and the cache hits
+    rows = [ids.fill(row) for row in SyntheticPayments(2, population=20).rows('pacs008', channel_type,
+                                                                              fedwire_type, 200)]
+    fragments = FragmentCache()
+
+    chunks = list(iter_pacs008_xml(rows, channel_type, fedwire_type, compact=compact, fragments=fragments))
+
+    assert chunks[1:-1] == [get_pacs008_transaction_xml(row, channel_type, fedwire_type, compact) for row in rows]
+    assert fragments.stats['hits'] > fragments.stats['misses']
+
+
+def test_repeated_debtor_is_rendered_once():
+    row = dict(next(SyntheticPayments(2).rows('pacs008', 'swift', None, 1)), chrgBr='SHAR')
+    rows = [dict(row, cdtrNm=f"Creditor {index}", intrBkSttlmAmt=index + 1.0) for index in range(20)]
+    fragments = FragmentCache()
+
+    xml = ''.join(iter_pacs008_xml(rows, 'swift', None, fragments=fragments))
+
+    assert xml.count('<DbtrAgt>') == 20
+    # Debtor and creditor accounts, debtor agent and creditor agent: built for the first transaction only
+    assert len(fragments) == fragments.stats['misses'] == 4
+    assert fragments.stats['hits'] == 19 * 4
+
+
+def test_cache_stats_are_counted_in_metrics():
+    METRICS.reset()
+    rows = list(SyntheticPayments(2, population=20).rows('pacs008', 'fedwire', 'domestic', 50))
+    fragments = FragmentCache()
+
+    ''.join(iter_pacs008_xml(rows, 'fedwire', 'domestic', fragments=fragments))
+
+    labels = metric_labels('pacs008', 'fedwire', 'domestic')
+    counters = {counter['name']: counter['value'] for counter in METRICS.snapshot()['counters']
+                if counter['labels'] == labels}
+    assert counters['fragment_cache_hits'] == fragments.stats['hits']
+    assert counters['fragment_cache_misses'] == fragments.stats['misses']
+
+
+def test_least_recently_used_fragment_is_evicted():
+    fragments = FragmentCache(max_entries=2)
+    fragments.store(('a',), 'A')
+    fragments.store(('b',), 'B')
+    fragments.lookup(('a',))
+    fragments.store(('c',), 'C')
+
+    assert fragments.lookup(('b',)) is None
+    assert (fragments.lookup(('a',)), fragments.lookup(('c',))) == ('A', 'C')
+    assert fragments.stats == {'hits': 3, 'misses': 1, 'evictions': 1}
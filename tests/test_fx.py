@@ -0,0 +1,306 @@
+"""ExchangeRateService against a local stand-in for the exchange-rate API."""
+import collections
+import datetime
+import http.server
+import json
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from fx import ExchangeRateService, RateRefresher, get_service, prefetch_rates, start_prefetch
+
+# Units of each currency per 1 USD; the stand-in derives every base currency's table from these
+USD_UNITS = {'USD': 1.0, 'EUR': 0.9, 'GBP': 0.8, 'JPY': 150.0, 'CHF': 0.88}
+
+
+class RateApi(http.server.ThreadingHTTPServer):
+    """Serves /latest/<BASE> like the exchange-rate API and counts the requests per base."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RateApiHandler)
+        self.requests = collections.Counter()
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        self.delay = 0.0
+        self.failing = set()
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/latest/{{base}}"
+
+    def fetch_rates(self, base_currency):
+        """fetch_rates callable for ExchangeRateService (urllib, so the test needs no requests package)."""
+        with urllib.request.urlopen(self.url.format(base=base_currency), timeout=5) as response:
+            return json.load(response)['rates']
+
+
+class RateApiHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        base = self.path.rsplit('/', 1)[-1]
+        server = self.server
+        with server.lock:
+            server.requests[base] += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        if base in self.server.failing or base not in USD_UNITS:
+            self.send_error(503)
+            return
+        rates = {currency: units / USD_UNITS[base] for currency, units in USD_UNITS.items()}
+        body = json.dumps({'base': base, 'rates': rates}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def rate_api():
+    server = RateApi()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_lookups_share_one_request(rate_api):
+    rate_api.delay = 0.2
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates)
+    callers = 8
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def lookup():
+        barrier.wait()
+        results.append(service.get_rate('USD', 'EUR'))
+
+    threads = [threading.Thread(target=lookup) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert rate_api.requests['USD'] == 1
+    assert service.stats['fetches'] == 1
+    assert service.stats['coalesced'] + service.stats['hits'] == callers - 1
+    assert {rate for rate, _ in results} == {0.9}
+
+
+def test_refetch_after_ttl(rate_api):
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates, ttl_minutes=15)
+    service.get_rate('USD', 'EUR')
+    service.get_rate('USD', 'EUR')
+    assert rate_api.requests['USD'] == 1
+    assert service.stats['hits'] == 1
+
+    # Age the cached table past the TTL
+    expired = datetime.datetime.now() - datetime.timedelta(minutes=16)
+    service.load({'USD': {'rates': service.snapshot()['USD']['rates'], 'timestamp': expired}})
+    rate, timestamp = service.get_rate('USD', 'EUR')
+
+    assert rate_api.requests['USD'] == 2
+    assert rate == 0.9
+    assert timestamp > expired
+
+
+def test_least_recently_used_table_is_evicted(rate_api):
+    # A pivot no table quotes, so uncached bases are fetched instead of answered as cross rates
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates, max_bases=2, pivot='XXX')
+    service.get_rate('USD', 'JPY')
+    service.get_rate('EUR', 'JPY')
+    # Using the USD table makes EUR the least recently used one
+    service.get_cached_rate('USD', 'GBP')
+    service.get_rate('GBP', 'JPY')
+
+    assert list(service.cached_timestamps()) == ['USD', 'GBP']
+    assert service.stats['evictions'] == 1
+    assert rate_api.requests == {'USD': 1, 'EUR': 1, 'GBP': 1}
+
+
+def test_api_failure_falls_back_to_stale_rate(rate_api):
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates)
+    expired = datetime.datetime.now() - datetime.timedelta(hours=1)
+    service.load({'USD': {'rates': {'EUR': 0.95}, 'timestamp': expired}})
+    rate_api.failing.add('USD')
+    errors = []
+
+    assert service.get_rate('USD', 'EUR', on_error=errors.append) == (0.95, expired)
+    assert len(errors) == 1
+    assert service.stats['errors'] == 1
+    assert service.stats['fallbacks'] == 1
+
+
+def test_prefetch_fetches_bases_concurrently(rate_api):
+    rate_api.delay = 0.2
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates)
+    bases = ['USD', 'EUR', 'GBP', 'JPY']
+
+    results = prefetch_rates(service, bases + ['USD'], concurrency=4)
+
+    assert list(results) == bases
+    assert rate_api.requests == {base: 1 for base in bases}
+    assert rate_api.max_active > 1
+    assert set(service.cached_timestamps()) == set(bases)
+
+
+def test_prefetch_reports_failures_to_on_error(rate_api):
+    errors = []
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates,
+                                  on_error=lambda base, error: errors.append((base, error)))
+    rate_api.failing.add('EUR')
+
+    results = prefetch_rates(service, ['USD', 'EUR'])
+    assert isinstance(results['EUR'], Exception)
+    assert results['USD']['rates']['EUR'] == 0.9
+    assert service.stats['errors'] == 1
+
+    start_prefetch(service, ['EUR', 'GBP']).join(5)
+    assert [base for base, _ in errors] == ['EUR']
+    assert 'GBP' in service.cached_timestamps()
+
+
+def test_get_service_rejects_different_options(tmp_path, rate_api):
+    cache_file = str(tmp_path / 'rates.json')
+    service = get_service(cache_file, fetch_rates=rate_api.fetch_rates, ttl_minutes=15)
+
+    assert get_service(cache_file, fetch_rates=rate_api.fetch_rates, ttl_minutes=15) is service
+    with pytest.raises(ValueError):
+        get_service(cache_file, fetch_rates=rate_api.fetch_rates, ttl_minutes=5)
+
+
+def test_cache_file_errors_go_to_on_error(tmp_path, rate_api):
+    errors = []
+    # The cache file's directory does not exist, so every read and write fails
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates, cache_file=str(tmp_path / 'missing' / 'rates.json'),
+                                  on_error=lambda base, error: errors.append((base, type(error))))
+
+    service.load_file()
+    service.get_rate('USD', 'EUR')
+    service.save_file()
+
+    assert [base for base, _ in errors] == [None, 'USD', None]
+    assert service.get_cached_rate('USD', 'EUR')[0] == 0.9
+
+
+def test_cross_rate_via_cached_pivot_table(rate_api):
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates)
+    service.get_rate('USD', 'EUR')
+    usd_timestamp = service.cached_timestamps()['USD']
+
+    rate, timestamp = service.get_rate('EUR', 'GBP')
+
+    assert rate == pytest.approx(0.8 / 0.9)
+    assert timestamp == usd_timestamp
+    assert rate_api.requests == {'USD': 1}
+    assert service.stats['hits'] == 1
+
+
+def test_cross_rate_through_inverse_legs(rate_api):
+    # Only the EUR table is cached; USD is reached through its inverse EUR->USD leg
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates)
+    service.get_rate('EUR', 'USD')
+
+    assert service.get_cached_rate('GBP', 'EUR')[0] == pytest.approx(0.9 / 0.8)
+    assert service.get_cached_rate('GBP', 'JPY')[0] == pytest.approx(150.0 / 0.8)
+    assert service.get_cached_rate('USD', 'CHF')[0] == pytest.approx(0.88)
+    assert rate_api.requests == {'EUR': 1}
+
+
+def test_cross_rate_carries_oldest_leg_timestamp():
+    service = ExchangeRateService(fetch_rates=lambda base: {})
+    now = datetime.datetime.now()
+    older = now - datetime.timedelta(minutes=5)
+    service.load({'USD': {'rates': {'EUR': 0.9, 'JPY': 150.0}, 'timestamp': now},
+                  'GBP': {'rates': {'USD': 1.25, 'CHF': 1.1}, 'timestamp': older}})
+
+    rate, timestamp = service.get_cached_rate('JPY', 'CHF')
+
+    assert rate == pytest.approx(1.1 / 1.25 / 150.0)
+    assert timestamp == older
+    assert service.get_cached_rate('EUR', 'JPY')[1] == now
+
+
+def test_stale_and_evicted_tables_are_not_used_for_cross_rates(rate_api):
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates, max_bases=1)
+    expired = datetime.datetime.now() - datetime.timedelta(hours=1)
+    service.load({'USD': {'rates': {'EUR': 0.5, 'GBP': 0.5, 'XAU': 0.0005}, 'timestamp': expired}})
+    assert service.get_cached_rate('EUR', 'XAU') == (0.001, expired)
+
+    # The stale cross rate is refetched from the EUR table instead of being served
+    rate, timestamp = service.get_rate('EUR', 'GBP')
+    assert rate == pytest.approx(0.8 / 0.9)
+    assert timestamp > expired
+    assert rate_api.requests == {'EUR': 1}
+
+    # Fetching EUR evicted the USD table: what only it quoted is gone, the rest comes from EUR's rates
+    assert list(service.cached_timestamps()) == ['EUR']
+    assert service.get_cached_rate('EUR', 'XAU') == (None, None)
+    assert service.get_cached_rate('GBP', 'JPY')[0] == pytest.approx(150.0 / 0.8)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_stale_rate_is_served_and_revalidated_once(rate_api):
+    rate_api.delay = 0.3
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates, stale_while_revalidate=True)
+    expired = datetime.datetime.now() - datetime.timedelta(hours=1)
+    service.load({'USD': {'rates': {'EUR': 0.95}, 'timestamp': expired}})
+
+    started = time.monotonic()
+    results = [service.get_rate('USD', 'EUR') for _ in range(5)]
+
+    # Served from the stale table without waiting on the slow API
+    assert time.monotonic() - started < rate_api.delay
+    assert results == [(0.95, expired)] * 5
+    assert service.stats['stale'] == 5
+    assert service.stats['revalidations'] == 1
+
+    wait_for(lambda: service.cached_timestamps()['USD'] > expired)
+    assert rate_api.requests == {'USD': 1}
+    assert service.get_rate('USD', 'EUR')[0] == 0.9
+
+
+def test_refresh_due_refetches_only_expired_tables(rate_api):
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates, ttl_minutes=15)
+    now = datetime.datetime.now()
+    service.load({'USD': {'rates': {'EUR': 0.9}, 'timestamp': now - datetime.timedelta(minutes=5)},
+                  'EUR': {'rates': {'USD': 1.1}, 'timestamp': now - datetime.timedelta(minutes=20)}})
+    refresher = RateRefresher(service, jitter=0)
+
+    seconds = refresher.refresh_due()
+
+    assert rate_api.requests == {'EUR': 1}
+    assert service.cached_timestamps()['EUR'] > now
+    # Next due: the USD table, 10 minutes from now
+    assert 9 * 60 < seconds <= 10 * 60
+
+
+def test_failed_refresh_keeps_stale_table_and_reports_error(rate_api):
+    errors = []
+    service = ExchangeRateService(fetch_rates=rate_api.fetch_rates,
+                                  on_error=lambda base, error: errors.append(base))
+    expired = datetime.datetime.now() - datetime.timedelta(hours=1)
+    service.load({'EUR': {'rates': {'USD': 1.1}, 'timestamp': expired}})
+    rate_api.failing.add('EUR')
+    refresher = RateRefresher(service, jitter=0)
+
+    refresher.refresh_due()
+    # The retry is scheduled later; an immediate second pass does not hit the API again
+    refresher.refresh_due()
+
+    assert errors == ['EUR']
+    assert rate_api.requests == {'EUR': 1}
+    assert service.cached_timestamps() == {'EUR': expired}
+    assert service.get_cached_rate('EUR', 'USD') == (1.1, expired)
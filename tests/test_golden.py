@@ -0,0 +1,21 @@
+"""Every message variant renders exactly as its golden file in benchmarks/golden/."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from bench_golden import GOLDEN_DIR, golden_cases  # noqa: E402
+
+CASES = list(golden_cases())
+
+
+@pytest.mark.parametrize('file_name, xml', CASES, ids=[file_name for file_name, _ in CASES])
+def test_output_matches_golden_file(file_name, xml):
+    path = os.path.join(GOLDEN_DIR, file_name)
+    assert os.path.exists(path), f"{file_name} is missing; run python benchmarks/bench_golden.py --update"
+    with open(path, encoding='utf-8', newline='') as f:
+        expected = f.read()
+    # After an intended output change: python benchmarks/bench_golden.py --update, then review the diff
+    assert xml == expected
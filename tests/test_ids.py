@@ -0,0 +1,78 @@
+"""Identifiers are reproducible when seeded, unique across forked shards and valid for the schema."""
+import re
+import uuid
+
+import pytest
+
+from ids import ID_MODES, INSTR_ID_PREFIX, MAX_ID_LENGTH, SEQUENCE_WIDTH, IdGenerator, permute64
+
+# Max35Text in the schema; generated references stick to letters and digits
+REFERENCE = re.compile(r'[A-Za-z0-9]{1,35}')
+
+
+def ids_of(generator, count):
+    return [generator.transaction_ids() for _ in range(count)]
+
+
+def test_seeded_run_is_reproducible():
+    first, second = IdGenerator('seeded', 42), IdGenerator('seeded', 42)
+
+    assert ids_of(first, 100) == ids_of(second, 100)
+    assert [first.msg_id('20250102') for _ in range(5)] == [second.msg_id('20250102') for _ in range(5)]
+    assert ids_of(IdGenerator('seeded', 43), 100) != ids_of(IdGenerator('seeded', 42), 100)
+    # String seeds do not depend on hash randomisation
+    assert IdGenerator('seeded', 'run-7').transaction_ids() == IdGenerator('seeded', 'run-7').transaction_ids()
+
+
+@pytest.mark.parametrize('mode', ID_MODES)
+def test_forked_shards_hand_out_the_ids_of_one_run(mode):
+    parent = IdGenerator(mode, seed=5)
+    shards = [parent.fork(start) for start in (1, 1001, 2001)]
+
+    forked = [ids for shard in shards for ids in ids_of(shard, 1000)]
+
+    for key in ('instrId', 'endToEndId', 'txId', 'uetr'):
+        assert len({ids[key] for ids in forked}) == 3000
+    if mode != 'uuid':
+        assert forked == ids_of(parent.fork(1), 3000)
+
+
+@pytest.mark.parametrize('key', [0, 1, 0x6A09E667F3BCC908, (1 << 64) - 1])
+def test_permute64_is_a_bijection(key):
+    counters = list(range(1 << 16)) + [(1 << 64) - 1 - index for index in range(1 << 10)]
+
+    permuted = {permute64(counter, key) for counter in counters}
+
+    assert len(permuted) == len(counters)
+    assert all(0 <= value < 1 << 64 for value in permuted)
+
+
+@pytest.mark.parametrize('mode', ID_MODES)
+def test_ids_stay_within_length_and_charset(mode):
+    reference_width = SEQUENCE_WIDTH if mode == 'sequence' else 16
+    # The longest prefix the generator accepts
+    prefix = 'P' * (MAX_ID_LENGTH - len(INSTR_ID_PREFIX) - reference_width)
+    generator = IdGenerator(mode, seed=1, prefix=prefix, start=(1 << 33) - 5)
+
+    for ids in ids_of(generator, 10):
+        for key in ('instrId', 'endToEndId', 'txId'):
+            assert REFERENCE.fullmatch(ids[key]), ids[key]
+    # MsgIds carry the reference prefix too, after the caller's (a date in synthetic.py)
+    msg_id = IdGenerator(mode, seed=1, start=(1 << 33) - 5).msg_id('20250102')
+    assert REFERENCE.fullmatch(msg_id) and len(msg_id) <= MAX_ID_LENGTH
+
+    with pytest.raises(ValueError):
+        IdGenerator(mode, seed=1, prefix=prefix + 'P')
+    with pytest.raises(ValueError):
+        generator.msg_id('20250102')
+
+
+@pytest.mark.parametrize('mode', ID_MODES)
+def test_uetr_is_a_uuid4(mode):
+    generator = IdGenerator(mode, seed=9)
+    uetrs = [generator.uetr() for _ in range(500)] + IdGenerator.random_uetrs(500)
+
+    for uetr in uetrs:
+        parsed = uuid.UUID(uetr)
+        assert (parsed.version, parsed.variant) == (4, uuid.RFC_4122)
+        assert str(parsed) == uetr
@@ -0,0 +1,35 @@
+"""Sharded generation leaves no output behind when the run is aborted."""
+import os
+
+import pytest
+
+from parallel import run_sharded, shard_path
+from synthetic import SyntheticPayments
+
+
+def rows_then_abort(count):
+    """count valid rows, then the SystemExit the CLI raises for an invalid row."""
+    yield from SyntheticPayments(5).rows('pacs008', 'swift', None, count)
+    raise SystemExit("Aborting: row failed validation")
+
+
+@pytest.mark.parametrize('mode', ['batch', 'output_dir'])
+def test_aborted_run_removes_written_shards(tmp_path, mode):
+    batch_path = str(tmp_path / 'out.xml') if mode == 'batch' else None
+    output_dir = str(tmp_path) if mode == 'output_dir' else None
+
+    with pytest.raises(SystemExit):
+        run_sharded(rows_then_abort(25), 'pacs008', 'swift', None, workers=2, chunk_size=5, batch_path=batch_path,
+                    output_dir=output_dir)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_completed_run_keeps_every_shard(tmp_path):
+    batch_path = str(tmp_path / 'out.xml')
+    rows = SyntheticPayments(5).rows('pacs008', 'swift', None, 12)
+
+    results = run_sharded(rows, 'pacs008', 'swift', None, workers=2, chunk_size=5, batch_path=batch_path)
+
+    assert [result['rows'] for result in results] == [5, 5, 2]
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(shard_path(batch_path, index)) for index in range(3)]
@@ -0,0 +1,107 @@
+"""Journal, replay and compaction of the persisted exchange-rate cache."""
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import rate_store
+from rate_store import JsonRateStore, atomic_write_json
+
+
+def entry(base, rate, timestamp='2025-01-02T10:00:00'):
+    return {'rates': {'XXX': rate}, 'timestamp': timestamp, 'base': base}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'exchange_rate_cache.json')
+
+
+def journal_lines(store):
+    with open(store.journal_path) as f:
+        return f.read().splitlines()
+
+
+def test_updates_are_appended_and_replayed(path):
+    store = JsonRateStore(path)
+    store.save_entry('USD', entry('USD', 1.0))
+    store.save_entry('EUR', entry('EUR', 2.0))
+    store.save_entry('USD', entry('USD', 3.0))
+
+    assert not os.path.exists(path)
+    assert len(journal_lines(store)) == 3
+    assert JsonRateStore(path).load() == {'USD': entry('USD', 3.0), 'EUR': entry('EUR', 2.0)}
+
+
+def test_torn_last_line_is_ignored(path):
+    store = JsonRateStore(path)
+    store.save_entry('USD', entry('USD', 1.0))
+    # A writer that died halfway through its line
+    with open(store.journal_path, 'a') as f:
+        f.write('{"EUR": {"rates": {"XX')
+
+    assert store.load() == {'USD': entry('USD', 1.0)}
+
+    store.save_entry('GBP', entry('GBP', 2.0))
+    assert store.load() == {'USD': entry('USD', 1.0), 'GBP': entry('GBP', 2.0)}
+
+
+def test_compaction_rewrites_snapshot_and_truncates_journal(path):
+    atomic_write_json(path, {'USD': entry('USD', 1.0)})
+    store = JsonRateStore(path)
+    store.save_entry('EUR', entry('EUR', 2.0))
+
+    store.compact()
+
+    with open(path) as f:
+        assert json.load(f) == {'USD': entry('USD', 1.0), 'EUR': entry('EUR', 2.0)}
+    assert os.path.getsize(store.journal_path) == 0
+    assert store.load() == {'USD': entry('USD', 1.0), 'EUR': entry('EUR', 2.0)}
+
+
+def test_journal_is_compacted_once_it_passes_the_limit(path):
+    store = JsonRateStore(path, compact_bytes=200)
+    for index in range(10):
+        store.save_entry(f"C{index:02d}", entry(f"C{index:02d}", index))
+
+    assert os.path.getsize(store.journal_path) < 200
+    with open(path) as f:
+        assert len(json.load(f)) >= 2
+    assert sorted(store.load()) == [f"C{index:02d}" for index in range(10)]
+
+
+def test_failed_snapshot_write_keeps_the_old_snapshot(path, monkeypatch):
+    atomic_write_json(path, {'USD': entry('USD', 1.0)})
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(rate_store.json, 'dump', fail)
+    with pytest.raises(OSError):
+        atomic_write_json(path, {'USD': entry('USD', 2.0)})
+    monkeypatch.undo()
+
+    with open(path) as f:
+        assert json.load(f) == {'USD': entry('USD', 1.0)}
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+
+def write_entries(path, prefix, count):
+    store = JsonRateStore(path, compact_bytes=500)
+    for index in range(count):
+        store.save_entry(f"{prefix}{index:03d}", entry(prefix, index))
+
+
+def test_stores_on_the_same_path_keep_each_others_updates(path):
+    # Separate processes, as with several Streamlit server processes sharing the cache file
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=write_entries, args=(path, prefix, 40)) for prefix in 'ABCD']
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    data = JsonRateStore(path).load()
+    assert sorted(data) == sorted(f"{prefix}{index:03d}" for prefix in 'ABCD' for index in range(40))
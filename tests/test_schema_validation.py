@@ -0,0 +1,39 @@
+"""Streaming XSD validation of written message files, compressed or not."""
+import pytest
+
+from synthetic import SyntheticPayments
+from xml_generator import compression_for_path, open_output, write_pacs008_xml, write_pain001_xml
+
+pytest.importorskip('lxml')
+
+from schema_validation import validate_file  # noqa: E402
+
+
+def write_batch(path, message_type, channel_type=None, fedwire_type=None, rows=None):
+    rows = rows or list(SyntheticPayments(9).rows(message_type, channel_type, fedwire_type, 3))
+    with open_output(path, compression_for_path(path)) as f:
+        if message_type == 'pacs008':
+            write_pacs008_xml(f, rows, channel_type, fedwire_type)
+        else:
+            write_pain001_xml(f, rows)
+
+
+@pytest.mark.parametrize('file_name', ['batch.xml', 'batch.xml.gz', 'batch.xml.zst'])
+@pytest.mark.parametrize('message_type', ['pacs008', 'pain001'])
+def test_validate_file_reads_compressed_batches(tmp_path, file_name, message_type):
+    if file_name.endswith('.zst'):
+        pytest.importorskip('zstandard')
+    path = str(tmp_path / file_name)
+    write_batch(path, message_type, 'swift' if message_type == 'pacs008' else None)
+
+    assert validate_file(path, message_type) == []
+
+
+def test_validate_file_reports_errors_in_compressed_batch(tmp_path):
+    path = str(tmp_path / 'batch.xml.gz')
+    rows = [dict(row, chrgBr='NONE') for row in SyntheticPayments(9).rows('pacs008', 'swift', None, 2)]
+    write_batch(path, 'pacs008', 'swift', rows=rows)
+
+    errors = validate_file(path, 'pacs008')
+
+    assert errors and 'ChrgBr' in errors[0]
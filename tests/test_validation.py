@@ -0,0 +1,97 @@
+"""IBAN, BIC and ABA checks, the per-row validators and the compiled bulk rules."""
+import random
+
+import pytest
+
+from cli import prepare_row, validate_row
+from iban import IBAN_ERROR_CHECKSUM, IBAN_ERROR_COUNTRY, IBAN_ERROR_FORMAT, IBAN_ERROR_LENGTH, iban_error
+from routing import ROUTING_ERROR_CHECKSUM, ROUTING_ERROR_FORMAT, ROUTING_ERROR_PREFIX, aba_error, bic_error
+from synthetic import VARIANTS, SyntheticPayments
+from validation import compile_rules, validate_tax_fields, validate_usaba_fields
+
+TAX_FIELDS = {'taxId': '123456789', 'taxType': '09455', 'taxYear': '2024', 'taxPeriod': 'MM08'}
+
+
+@pytest.mark.parametrize('iban, error', [
+    ('GB33BUKB20201555555555', None),
+    ('DE89370400440532013000', None),
+    ('GB34BUKB20201555555555', IBAN_ERROR_CHECKSUM),
+    ('GB33BUKB2020155555555', IBAN_ERROR_LENGTH),
+    ('GB331UKB20201555555555', IBAN_ERROR_FORMAT),
+    ('XX33BUKB20201555555555', IBAN_ERROR_COUNTRY),
+])
+def test_iban_error(iban, error):
+    assert iban_error(iban) == error
+
+
+@pytest.mark.parametrize('routing_number, error', [
+    ('021000021', None),
+    ('121000358', None),
+    ('021000022', ROUTING_ERROR_CHECKSUM),
+    ('991000021', ROUTING_ERROR_PREFIX),
+    ('02100002', ROUTING_ERROR_FORMAT),
+])
+def test_aba_error(routing_number, error):
+    assert aba_error(routing_number) == error
+
+
+@pytest.mark.parametrize('bic, error', [
+    ('DEUTDEFF', None),
+    ('DEUTDEFF500', None),
+    ('DEUT1EFF', ROUTING_ERROR_FORMAT),
+    ('deutdeff', ROUTING_ERROR_FORMAT),
+])
+def test_bic_error(bic, error):
+    assert bic_error(bic) == error
+
+
+def test_tax_fields():
+    assert validate_tax_fields(TAX_FIELDS) == []
+    assert validate_tax_fields(dict(TAX_FIELDS, taxId='999999999', taxPeriod='MM13', taxYear='')) == [
+        "Tax ID cannot be '000000000' or '999999999'",
+        "Tax Year is mandatory for tax payments",
+        "Tax Period must be one of MM01-MM12 (e.g., MM08 for August)",
+    ]
+
+
+def test_usaba_agent_needs_name_and_address():
+    data = {'dbtrAgtMmbId': '021000021', 'dbtrAgtNm': 'First Bank', 'dbtrAgtTwnNm': 'New York'}
+    assert validate_usaba_fields(data, 'fedwire', 'domestic') == [
+        "Debtor Agent Street Name is mandatory when USABA Member ID is provided",
+        "Debtor Agent Country is mandatory when USABA Member ID is provided",
+    ]
+    assert validate_usaba_fields(data, 'swift', None) == []
+
+
+def corrupt(row, fields, rng):
+    """Blank or mangle a few of the fields the rules look at."""
+    row = dict(row)
+    for key in rng.sample(fields, min(3, len(fields))):
+        value = row.get(key, '')
+        row[key] = rng.choice(['', 'X', value[:-1], value + '0', 'MM13', '999999999'])
+    return row
+
+
+@pytest.mark.parametrize('message_type, channel_type, fedwire_type', VARIANTS)
+def test_compiled_rules_match_row_validators(message_type, channel_type, fedwire_type):
+    rng = random.Random(3)
+    rules = compile_rules(message_type, channel_type, fedwire_type)
+    rows = [prepare_row(row, message_type, channel_type, fedwire_type)
+            for row in SyntheticPayments(3).rows(message_type, channel_type, fedwire_type, 200)]
+    rows = rows[:50] + [corrupt(row, list(rules.fields), rng) for row in rows[50:]]
+
+    result = rules.validate_rows(rows)
+
+    assert result.invalid_rows() and min(result.invalid_rows()) >= 50
+    for index, row in enumerate(rows):
+        assert result.errors(index) == validate_row(row, message_type, channel_type, fedwire_type)
+
+
+def test_domestic_rows_ignore_exchange_rate():
+    row = {'instdAmt': '100', 'exchangeRate': '0.5', 'primaryCurrency': 'EUR', 'secondaryCurrency': 'GBP'}
+
+    domestic = prepare_row(row, 'pacs008', 'fedwire', 'domestic')
+    international = prepare_row(row, 'pacs008', 'fedwire', 'international')
+
+    assert (domestic['intrBkSttlmAmt'], domestic['exchangeRate'], domestic['primaryCurrency']) == (100.0, None, 'USD')
+    assert international['intrBkSttlmAmt'] == 200.0
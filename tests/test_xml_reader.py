@@ -0,0 +1,54 @@
+"""Messages read back with xml_reader render to the same XML again."""
+import re
+
+import pytest
+
+from synthetic import VARIANTS, SyntheticPayments
+from xml_generator import generate_pacs008_xml, generate_pain001_xml, iter_pacs008_xml, iter_pain001_xml
+from xml_reader import MessageReader, iter_transactions, read_message
+
+# Creation timestamps are taken from the clock on every render
+TIMESTAMPS = re.compile(r'<(CreDt|CreDtTm)>[^<]*</\1>')
+
+
+def normalize(xml):
+    return TIMESTAMPS.sub(r'<\1/>', xml)
+
+
+def render(message_type, channel_type, fedwire_type, data, compact):
+    if message_type == 'pain001':
+        return generate_pain001_xml(data, compact=compact)
+    return generate_pacs008_xml(data, channel_type, fedwire_type, compact=compact)
+
+
+def render_batch(message_type, channel_type, fedwire_type, rows, compact):
+    if message_type == 'pain001':
+        return ''.join(iter_pain001_xml(rows, group_data=rows[0], compact=compact))
+    return ''.join(iter_pacs008_xml(rows, channel_type, fedwire_type, group_data=rows[0], compact=compact))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('message_type, channel_type, fedwire_type', VARIANTS)
+def test_single_message_round_trip(message_type, channel_type, fedwire_type, compact):
+    for data in SyntheticPayments(7).rows(message_type, channel_type, fedwire_type, 5):
+        xml = render(message_type, channel_type, fedwire_type, data, compact)
+        reader = MessageReader()
+        # Small chunks split tags and the AppHdr/Document boundary
+        rows = list(iter_transactions([xml[start:start + 97] for start in range(0, len(xml), 97)], reader))
+
+        assert len(rows) == 1
+        assert (reader.message_type, reader.channel_type, reader.fedwire_type) == \
+            (message_type, channel_type, fedwire_type)
+        assert normalize(render(message_type, channel_type, fedwire_type, rows[0], compact)) == normalize(xml)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('message_type, channel_type, fedwire_type', VARIANTS)
+def test_batch_round_trip(message_type, channel_type, fedwire_type, compact):
+    rows = list(SyntheticPayments(7).rows(message_type, channel_type, fedwire_type, 20))
+    xml = render_batch(message_type, channel_type, fedwire_type, rows, compact)
+
+    read = read_message(xml)
+
+    assert len(read) == 20
+    assert normalize(render_batch(message_type, channel_type, fedwire_type, read, compact)) == normalize(xml)
@@ -0,0 +1,463 @@
+"""
+Field validation rules shared by the Streamlit UI and the command-line generator.
+
+validate_usaba_fields / validate_tax_fields check one form's data. For bulk runs
+the same rules are also declared as data (get_rules) and compiled once per
+(message_type, channel_type, fedwire_type) into a column-wise validator that
+returns an error matrix: one bitmask per row, bit i set when rules[i] failed.
+"""
+from array import array
+from functools import lru_cache
+
+from iban import (IBAN_ERROR_CHECKSUM, IBAN_ERROR_COUNTRY, IBAN_ERROR_FORMAT, IBAN_ERROR_LENGTH, iban_error,
+                  is_iban_country)
+from metrics import METRICS
+from routing import (ROUTING_ERROR_CHECKSUM, ROUTING_ERROR_FORMAT, ROUTING_ERROR_PREFIX, aba_error, bic_error,
+                     is_valid_aba, is_valid_bic)
+
+TAX_PERIODS = frozenset(f"MM{month:02d}" for month in range(1, 13))
+INVALID_TAX_IDS = frozenset({'000000000', '999999999'})
+
+
+# Function to validate USABA agent fields
+@METRICS.timed('validate', check='usaba')
+def validate_usaba_fields(data, channel_type, fedwire_type):
+    """
+    Validates that when USABA Member IDs are used, corresponding name and address fields are provided.
+    Also validates country codes are 2 characters.
+    Returns list of error messages.
+    """
+    errors = []
+
+    if channel_type == 'fedwire':
+        # Check Debtor Agent
+        _validate_usaba_agent(data, 'dbtrAgt', 'Debtor', errors)
+
+        # Check Creditor Agent for domestic payments or when USABA is used for international
+        _validate_usaba_agent(data, 'cdtrAgt', 'Creditor', errors, check_mandatory=fedwire_type == 'domestic')
+
+    return errors
+
+
+def _validate_usaba_agent(data, prefix, party, errors, check_mandatory=True):
+    """Append the USABA name/address errors for one agent (prefix 'dbtrAgt' or 'cdtrAgt')."""
+    country = data.get(prefix + 'Ctry', '').strip()
+
+    if check_mandatory and data.get(prefix + 'MmbId', '').strip():
+        if not data.get(prefix + 'Nm', '').strip():
+            errors.append(f"{party} Agent Name is mandatory when USABA Member ID is provided")
+        if not data.get(prefix + 'StrtNm', '').strip():
+            errors.append(f"{party} Agent Street Name is mandatory when USABA Member ID is provided")
+        if not data.get(prefix + 'TwnNm', '').strip():
+            errors.append(f"{party} Agent Town Name is mandatory when USABA Member ID is provided")
+        if not country:
+            errors.append(f"{party} Agent Country is mandatory when USABA Member ID is provided")
+        elif len(country) != 2:
+            errors.append(f"{party} Agent Country must be exactly 2 characters (ISO country code)")
+
+    # Validate country code length even if not mandatory
+    if country and len(country) != 2:
+        errors.append(f"{party} Agent Country must be exactly 2 characters (ISO country code)")
+
+
+@METRICS.timed('validate', check='tax')
+def validate_tax_fields(data):
+    """
+    Validates mandatory tax payment fields.
+    Returns list of error messages.
+    """
+    errors = []
+
+    # Tax ID validation
+    tax_id = data.get('taxId', '').strip()
+    if not tax_id:
+        errors.append("Tax ID (TIN/EIN) is mandatory for tax payments")
+    elif len(tax_id) != 9 or not tax_id.isdigit():
+        errors.append("Tax ID must be exactly 9 numeric characters")
+    elif tax_id in INVALID_TAX_IDS:
+        errors.append("Tax ID cannot be '000000000' or '999999999'")
+
+    # Tax Type validation
+    tax_type = data.get('taxType', '').strip()
+    if not tax_type:
+        errors.append("Tax Type Code is mandatory for tax payments")
+    elif len(tax_type) != 5:
+        errors.append("Tax Type Code must be exactly 5 characters")
+
+    # Tax Year validation
+    tax_year = data.get('taxYear', '').strip()
+    if not tax_year:
+        errors.append("Tax Year is mandatory for tax payments")
+    elif len(tax_year) != 4 or not tax_year.isdigit():
+        errors.append("Tax Year must be exactly 4 numeric characters (YYYY)")
+
+    # Tax Period validation
+    tax_period = data.get('taxPeriod', '').strip()
+    if not tax_period:
+        errors.append("Tax Period is mandatory for tax payments")
+    elif tax_period not in TAX_PERIODS:
+        errors.append("Tax Period must be one of MM01-MM12 (e.g., MM08 for August)")
+
+    return errors
+
+
+IBAN_ERROR_MESSAGES = {
+    IBAN_ERROR_COUNTRY: "{party} Account IBAN must start with an IBAN country code",
+    IBAN_ERROR_LENGTH: "{party} Account IBAN has the wrong length for its country",
+    IBAN_ERROR_FORMAT: "{party} Account IBAN does not match the account format of its country",
+    IBAN_ERROR_CHECKSUM: "{party} Account IBAN check digits are invalid",
+}
+
+# Accounts rendered as <IBAN> (see xml_generator.get_account_template)
+IBAN_ACCOUNTS = (('dbtrAcctIBAN', 'dbtrCtry', 'Debtor'), ('cdtrAcctIBAN', 'cdtrCtry', 'Creditor'))
+
+
+def _uses_iban(message_type, channel_type, fedwire_type):
+    return message_type == 'pain001' or channel_type == 'swift' or fedwire_type == 'international'
+
+
+@METRICS.timed('validate', check='account')
+def validate_account_fields(data, message_type, channel_type=None, fedwire_type=None):
+    """
+    Validates account numbers sent as IBAN (account country in the IBAN registry):
+    length and format for the IBAN's country and the mod-97 check digits.
+    Returns list of error messages.
+    """
+    errors = []
+    if not _uses_iban(message_type, channel_type, fedwire_type):
+        return errors
+
+    for account_key, country_key, party in IBAN_ACCOUNTS:
+        account = data.get(account_key, '').strip()
+        if account and is_iban_country(data.get(country_key, '').strip()):
+            error = iban_error(account)
+            if error is not None:
+                errors.append(IBAN_ERROR_MESSAGES[error].format(party=party))
+    return errors
+
+
+BIC_ERROR_MESSAGES = {
+    ROUTING_ERROR_FORMAT: "{label} must be a valid BIC (8 or 11 characters: bank, country, location, branch)",
+}
+
+ABA_ERROR_MESSAGES = {
+    ROUTING_ERROR_FORMAT: "{label} must be exactly 9 digits",
+    ROUTING_ERROR_PREFIX: "{label} must start with a valid ABA routing symbol (00-12, 21-32, 61-72 or 80)",
+    ROUTING_ERROR_CHECKSUM: "{label} has an invalid ABA check digit",
+}
+
+UNKNOWN_ROUTING_MESSAGE = "{label} was not found in the {kind} directory"
+
+
+def get_routing_fields(message_type, channel_type, fedwire_type):
+    """
+    Return the (field, kind, label) of the BIC ('bic') and USABA ('aba') fields a
+    variant renders; the IRS creditor agent of tax payments is fixed and not listed.
+    """
+    if message_type == 'pain001':
+        return (('dbtrAgtBICFI', 'bic', "Debtor Agent BICFI"), ('cdtrAgtBICFI', 'bic', "Creditor Agent BICFI"))
+    if channel_type == 'swift':
+        return (('instgAgtBICFI', 'bic', "Instructing Agent BICFI"),
+                ('instdAgtBICFI', 'bic', "Instructed Agent BICFI"),
+                ('dbtrAgtBICFI_tx', 'bic', "Debtor Agent BICFI"),
+                ('cdtrAgtBICFI_tx', 'bic', "Creditor Agent BICFI"))
+    if channel_type == 'fedwire':
+        fields = [('instgAgtMmbId', 'aba', "Instructing Agent USABA"),
+                  ('instdAgtMmbId', 'aba', "Instructed Agent USABA"),
+                  ('dbtrAgtMmbId', 'aba', "Debtor Agent USABA Member ID")]
+        if fedwire_type == 'domestic':
+            fields.append(('cdtrAgtMmbId', 'aba', "Creditor Agent USABA Member ID"))
+        elif fedwire_type == 'international':
+            fields.append(('cdtrAgtBICFI_tx', 'bic', "Creditor Agent BICFI"))
+        return tuple(fields)
+    return ()
+
+
+@METRICS.timed('validate', check='routing')
+def validate_routing_fields(data, message_type, channel_type=None, fedwire_type=None, aba_directory=None,
+                            bic_directory=None):
+    """
+    Validates BIC structure and USABA routing numbers (prefix and mod-10 check
+    digit) of the agent fields a message renders and, when directories are given
+    (see routing.open_directory), that valid identifiers are listed in them.
+    Returns list of error messages.
+    """
+    errors = []
+    for key, kind, label in get_routing_fields(message_type, channel_type, fedwire_type):
+        value = data.get(key, '').strip()
+        if not value:
+            continue
+        error = bic_error(value) if kind == 'bic' else aba_error(value)
+        directory = bic_directory if kind == 'bic' else aba_directory
+        if error is not None:
+            messages = BIC_ERROR_MESSAGES if kind == 'bic' else ABA_ERROR_MESSAGES
+            errors.append(messages[error].format(label=label))
+        elif directory is not None and value not in directory:
+            errors.append(UNKNOWN_ROUTING_MESSAGE.format(label=label, kind=kind.upper()))
+    return errors
+
+
+# Declarative rules for bulk validation. A rule fails for a row when all of its
+# conditions hold; conditions test the stripped field value:
+#   (field, 'present')           field is not empty
+#   (field, 'empty')             field is empty
+#   (field, 'length_not', n)     len(field) != n
+#   (field, 'not_digits', n)     field is not exactly n digits
+#   (field, 'in', values)        field is one of values
+#   (field, 'not_in', values)    field is not one of values
+#   (field, 'iban_country')      field is a country code in the IBAN registry
+#   (field, 'iban_error', code)  iban.iban_error(field) == code
+#   (field, 'bic_error', code)   routing.bic_error(field) == code
+#   (field, 'aba_error', code)   routing.aba_error(field) == code
+#   (field, 'valid_bic')         field is a well-formed BIC
+#   (field, 'valid_aba')         field is a valid ABA routing number
+CONDITIONS = {
+    'present': 'value',
+    'empty': 'not value',
+    'length_not': 'len(value) != {arg}',
+    'not_digits': '(len(value) != {arg} or not value.isdigit())',
+    'in': 'value in {arg}',
+    'not_in': 'value not in {arg}',
+    'iban_country': 'is_iban_country(value)',
+    'iban_error': 'iban_error(value) == {arg}',
+    'bic_error': 'bic_error(value) == {arg}',
+    'aba_error': 'aba_error(value) == {arg}',
+    'valid_bic': 'is_valid_bic(value)',
+    'valid_aba': 'is_valid_aba(value)',
+}
+
+
+class Rule:
+    """One validation rule: message is reported when every condition holds."""
+    __slots__ = ('message', 'conditions')
+
+    def __init__(self, message, *conditions):
+        self.message = message
+        self.conditions = conditions
+
+    def __repr__(self):
+        return f"Rule({self.message!r})"
+
+
+def _usaba_agent_rules(prefix, party, check_mandatory=True):
+    member_id, country = prefix + 'MmbId', prefix + 'Ctry'
+    country_length = f"{party} Agent Country must be exactly 2 characters (ISO country code)"
+    rules = []
+    if check_mandatory:
+        rules += [
+            Rule(f"{party} Agent Name is mandatory when USABA Member ID is provided",
+                 (member_id, 'present'), (prefix + 'Nm', 'empty')),
+            Rule(f"{party} Agent Street Name is mandatory when USABA Member ID is provided",
+                 (member_id, 'present'), (prefix + 'StrtNm', 'empty')),
+            Rule(f"{party} Agent Town Name is mandatory when USABA Member ID is provided",
+                 (member_id, 'present'), (prefix + 'TwnNm', 'empty')),
+            Rule(f"{party} Agent Country is mandatory when USABA Member ID is provided",
+                 (member_id, 'present'), (country, 'empty')),
+            Rule(country_length, (member_id, 'present'), (country, 'present'), (country, 'length_not', 2)),
+        ]
+    rules.append(Rule(country_length, (country, 'present'), (country, 'length_not', 2)))
+    return rules
+
+
+TAX_RULES = (
+    Rule("Tax ID (TIN/EIN) is mandatory for tax payments", ('taxId', 'empty')),
+    Rule("Tax ID must be exactly 9 numeric characters", ('taxId', 'present'), ('taxId', 'not_digits', 9)),
+    Rule("Tax ID cannot be '000000000' or '999999999'", ('taxId', 'in', INVALID_TAX_IDS)),
+    Rule("Tax Type Code is mandatory for tax payments", ('taxType', 'empty')),
+    Rule("Tax Type Code must be exactly 5 characters", ('taxType', 'present'), ('taxType', 'length_not', 5)),
+    Rule("Tax Year is mandatory for tax payments", ('taxYear', 'empty')),
+    Rule("Tax Year must be exactly 4 numeric characters (YYYY)", ('taxYear', 'present'),
+         ('taxYear', 'not_digits', 4)),
+    Rule("Tax Period is mandatory for tax payments", ('taxPeriod', 'empty')),
+    Rule("Tax Period must be one of MM01-MM12 (e.g., MM08 for August)", ('taxPeriod', 'present'),
+         ('taxPeriod', 'not_in', TAX_PERIODS)),
+)
+
+
+def _iban_account_rules():
+    return [Rule(message.format(party=party),
+                 (country_key, 'iban_country'), (account_key, 'present'), (account_key, 'iban_error', error))
+            for account_key, country_key, party in IBAN_ACCOUNTS
+            for error, message in IBAN_ERROR_MESSAGES.items()]
+
+
+def _routing_rules(message_type, channel_type, fedwire_type, aba_directory=None, bic_directory=None):
+    rules = []
+    for key, kind, label in get_routing_fields(message_type, channel_type, fedwire_type):
+        messages = BIC_ERROR_MESSAGES if kind == 'bic' else ABA_ERROR_MESSAGES
+        rules += [Rule(message.format(label=label), (key, 'present'), (key, kind + '_error', error))
+                  for error, message in messages.items()]
+        directory = bic_directory if kind == 'bic' else aba_directory
+        if directory is not None:
+            rules.append(Rule(UNKNOWN_ROUTING_MESSAGE.format(label=label, kind=kind.upper()),
+                              (key, 'present'), (key, 'valid_' + kind), (key, 'not_in', directory)))
+    return rules
+
+
+def get_rules(message_type, channel_type, fedwire_type, aba_directory=None, bic_directory=None):
+    """
+    Return the rules for a message variant, in the order validate_usaba_fields,
+    validate_tax_fields, validate_account_fields and validate_routing_fields
+    report them.
+    """
+    rules = []
+    if message_type == 'pacs008' and channel_type == 'fedwire':
+        rules += _usaba_agent_rules('dbtrAgt', 'Debtor')
+        rules += _usaba_agent_rules('cdtrAgt', 'Creditor', check_mandatory=fedwire_type == 'domestic')
+        if fedwire_type == 'tax':
+            rules += TAX_RULES
+    if _uses_iban(message_type, channel_type, fedwire_type):
+        rules += _iban_account_rules()
+    rules += _routing_rules(message_type, channel_type, fedwire_type, aba_directory, bic_directory)
+    return tuple(rules)
+
+
+class ValidationResult:
+    """
+    Error matrix for a validated batch.
+
+    masks[row] has bit i set when rules[i] failed for that row; 0 means valid.
+    """
+    __slots__ = ('rules', 'masks')
+
+    def __init__(self, rules, masks):
+        self.rules = rules
+        self.masks = masks
+
+    def __len__(self):
+        return len(self.masks)
+
+    def invalid_rows(self):
+        """Indexes of the rows with at least one failed rule."""
+        return [row for row, mask in enumerate(self.masks) if mask]
+
+    def errors(self, row):
+        """Error messages for one row, in rule order."""
+        mask = self.masks[row]
+        return [rule.message for bit, rule in enumerate(self.rules) if mask >> bit & 1]
+
+    def failure_counts(self):
+        """Number of failing rows per rule."""
+        return [sum(mask >> bit & 1 for mask in self.masks) for bit in range(len(self.rules))]
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return value.strip()
+    return '' if value is None else str(value).strip()
+
+
+def _compile_classifier(conditions):
+    """Generate classify(raw) -> bitset of the field conditions the stripped value satisfies."""
+    namespace = {'_normalize': _normalize, 'is_iban_country': is_iban_country, 'iban_error': iban_error,
+                 'bic_error': bic_error, 'aba_error': aba_error, 'is_valid_bic': is_valid_bic,
+                 'is_valid_aba': is_valid_aba}
+    tests = []
+    for bit, (condition, arg) in enumerate(conditions):
+        if arg is not None and not isinstance(arg, int):
+            namespace[f"_arg{bit}"] = arg
+            arg = f"_arg{bit}"
+        tests.append(f"({1 << bit} if {CONDITIONS[condition].format(arg=arg)} else 0)")
+    source = ("def classify(raw):\n"
+              "    value = raw.strip() if type(raw) is str else _normalize(raw)\n"
+              f"    return {' | '.join(tests) or '0'}\n")
+    exec(compile(source, '<validation rules>', 'exec'), namespace)
+    return namespace['classify']
+
+
+class _FieldCodes(dict):
+    """Memo: raw field value -> classify(raw), computed once per distinct value."""
+
+    def __init__(self, classify):
+        super().__init__()
+        self.classify = classify
+
+    def __missing__(self, raw_value):
+        code = self[raw_value] = self.classify(raw_value)
+        return code
+
+
+class _RowMasks(dict):
+    """Memo: tuple of per-field codes -> error bitmask (computed once per distinct combination)."""
+
+    def __init__(self, requirements):
+        super().__init__()
+        self.requirements = requirements
+
+    def __missing__(self, codes):
+        mask = 0
+        for bit, required in enumerate(self.requirements):
+            if all(codes[index] & needed == needed for index, needed in required):
+                mask |= 1 << bit
+        self[codes] = mask
+        return mask
+
+
+class CompiledRules:
+    """
+    A rule set compiled into per-field classifiers and lookup tables.
+
+    Every condition is numbered per field, so a field value reduces to a small
+    integer code (bit j = the field's j-th condition holds, computed by a
+    generated classify function) and each rule to the code bits it needs on
+    each field. Bulk data repeats values heavily (agent
+    names, countries, tax periods), so values are stripped and tested once per
+    distinct value and each distinct combination of field codes is turned into
+    an error mask once; per row only C-level dict lookups remain.
+    """
+    __slots__ = ('rules', 'fields', 'field_conditions', 'classifiers', 'requirements')
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.fields = tuple(dict.fromkeys(field for rule in self.rules for field, *_ in rule.conditions))
+
+        field_index = {field: index for index, field in enumerate(self.fields)}
+        self.field_conditions = [[] for _ in self.fields]
+        requirements = []
+        for rule in self.rules:
+            needed = {}
+            for field, condition, *arg in rule.conditions:
+                conditions = self.field_conditions[field_index[field]]
+                spec = (condition, arg[0] if arg else None)
+                if spec not in conditions:
+                    conditions.append(spec)
+                needed[field_index[field]] = needed.get(field_index[field], 0) | 1 << conditions.index(spec)
+            requirements.append(tuple(needed.items()))
+        self.requirements = tuple(requirements)
+        self.classifiers = [_compile_classifier(conditions) for conditions in self.field_conditions]
+
+    @METRICS.timed('validate_chunk', check='compiled')
+    def validate_columns(self, columns, size=None):
+        """
+        Validate a batch given as columns.
+
+        Args:
+            columns (dict): field name -> list of values (missing fields count as empty).
+            size (int): Number of rows (default: length of the first column given).
+        Returns:
+            ValidationResult: The error matrix.
+        """
+        if size is None:
+            size = len(next(iter(columns.values()))) if columns else 0
+        if not self.fields:
+            return ValidationResult(self.rules, array('Q', bytes(8 * size)))
+
+        codes = []
+        for field, classify in zip(self.fields, self.classifiers):
+            memo = _FieldCodes(classify)
+            column = columns.get(field)
+            codes.append(list(map(memo.__getitem__, column)) if column is not None else [memo['']] * size)
+
+        masks = list(map(_RowMasks(self.requirements).__getitem__, zip(*codes)))
+        return ValidationResult(self.rules, array('Q', masks) if len(self.rules) <= 64 else masks)
+
+    def validate_rows(self, rows):
+        """Validate a list of row dicts (same keys as the form data)."""
+        columns = {field: [row.get(field, '') for row in rows] for field in self.fields}
+        return self.validate_columns(columns, len(rows))
+
+
+@lru_cache(maxsize=None)
+def compile_rules(message_type, channel_type, fedwire_type, aba_directory=None, bic_directory=None):
+    """Compile the rule set for a message variant and directories (once per process)."""
+    return CompiledRules(get_rules(message_type, channel_type, fedwire_type, aba_directory, bic_directory))
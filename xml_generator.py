@@ -1,161 +1,251 @@
 # xml_generator_working.py
 import datetime
-import uuid
+import io
+import os
+import time
 import re
+from functools import lru_cache
 
+from iban import IBAN_COUNTRIES, is_iban_country
+from ids import DEFAULT_ID_GENERATOR
+from metrics import METRICS
+from templates import (FragmentCache, Switch, cached, compact_template, compact_text, compile_template,
+                       escape_attribute, escape_text, field, optional, param, value)
 
-def generate_pain001_xml(data):
-    """
-    Generates a pain.001 (Customer Credit Transfer Initiation) XML message.
+# Defaults used when a field is missing from the data dict
+FIELD_DEFAULTS = {
+    'instdAmt': 0.00,
+    'intrBkSttlmAmt': 0.00,
+    'chrgBr': 'SHAR',
+    'primaryCurrency': 'USD',
+    'secondaryCurrency': 'USD',
+    'currency': 'EUR',
+}
 
-    Args:
-        data (dict): A dictionary containing the necessary data for the XML.
-                     Expected keys: msgId, creDtTm, initgPtyNm, pmtInfId, pmtMtd,
-                     btchBookg, reqdExctnDt, dbtrNm, dbtrStrtNm, dbtrBldgNb,
-                     dbtrPstCd, dbtrTwnNm, dbtrCtry, dbtrAcctIBAN, dbtrAgtBICFI,
-                     cdtrAgtBICFI, cdtrNm, cdtrStrtNm, cdtrBldgNb, cdtrPstCd,
-                     cdtrTwnNm, cdtrCtry, cdtrAcctIBAN, instdAmt, ustrdRmtInf.
-    Returns:
-        str: The generated pain.001 XML string.
+
+def _field_resolver(specials):
     """
-    # For SEPA pain.001, IBAN is mandatory - no changes needed here
-    return f"""<?xml version="1.0" encoding="UTF-8"?>
+    Build a template resolver: names in specials resolve to their constant/slot,
+    names starting with an underscore (_nbOfTxs) are render-time parameters and
+    every other name reads the data field of the same name.
+    """
+    def resolve(name):
+        if name in specials:
+            return specials[name]
+        if name.startswith('_'):
+            return param(name[1:])
+        return field(name, FIELD_DEFAULTS.get(name, ''))
+    return resolve
+
+
+def _optional_name(key, source):
+    """Slot rendering source (e.g. an UltmtDbtr block) only when data[key] is set."""
+    return optional(field(key, None), compile_template(source, _field_resolver({})))
+
+
+PAIN001_HEADER_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
 <Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09"
     xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
     xsi:schemaLocation="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09 pain.001.001.09.xsd">
     <CstmrCdtTrfInitn>
         <GrpHdr>
-            <MsgId>{data.get('msgId', '')}</MsgId>
-            <CreDtTm>{data.get('creDtTm', '')}</CreDtTm>
-            <NbOfTxs>1</NbOfTxs>
+            <MsgId>{msgId}</MsgId>
+            <CreDtTm>{creDtTm}</CreDtTm>
+            <NbOfTxs>{_nbOfTxs}</NbOfTxs>
             <InitgPty>
-                <Nm>{data.get('initgPtyNm', '')}</Nm>
+                <Nm>{initgPtyNm}</Nm>
             </InitgPty>
-        
-            {f"<InitgPty><Nm>{data.get('initgPtyNm')}</Nm></InitgPty>" if data.get('initgPtyNm') else ""}
         </GrpHdr>
         <PmtInf>
-            <PmtInfId>{data.get('pmtInfId', '')}</PmtInfId>
-            <PmtMtd>{data.get('pmtMtd', '')}</PmtMtd>
-            <BtchBookg>{str(data.get('btchBookg', False)).lower()}</BtchBookg>
-            <NbOfTxs>1</NbOfTxs>
-            <CtrlSum>{data.get('instdAmt', 0.00):.2f}</CtrlSum>
+            <PmtInfId>{pmtInfId}</PmtInfId>
+            <PmtMtd>{pmtMtd}</PmtMtd>
+            <BtchBookg>{btchBookg}</BtchBookg>
+            <NbOfTxs>{_nbOfTxs}</NbOfTxs>
+            <CtrlSum>{_ctrlSum:.2f}</CtrlSum>
             <PmtTpInf>
                 <SvcLvl>
                     <Cd>SEPA</Cd>
                 </SvcLvl>
             </PmtTpInf>
-            <ReqdExctnDt>{data.get('reqdExctnDt', '')}</ReqdExctnDt>
+            <ReqdExctnDt>
+                <Dt>{reqdExctnDt}</Dt>
+            </ReqdExctnDt>
             <Dbtr>
-                <Nm>{data.get('dbtrNm', '')}</Nm>
+                <Nm>{dbtrNm}</Nm>
                 <PstlAdr>
-                    <StrtNm>{data.get('dbtrStrtNm', '')}</StrtNm>
-                    <BldgNb>{data.get('dbtrBldgNb', '')}</BldgNb>
-                    <PstCd>{data.get('dbtrPstCd', '')}</PstCd>
-                    <TwnNm>{data.get('dbtrTwnNm', '')}</TwnNm>
-                    <Ctry>{data.get('dbtrCtry', '')}</Ctry>
+                    <StrtNm>{dbtrStrtNm}</StrtNm>
+                    <BldgNb>{dbtrBldgNb}</BldgNb>
+                    <PstCd>{dbtrPstCd}</PstCd>
+                    <TwnNm>{dbtrTwnNm}</TwnNm>
+                    <Ctry>{dbtrCtry}</Ctry>
                 </PstlAdr>
             </Dbtr>
             <DbtrAcct>
                 <Id>
-                    <IBAN>{data.get('dbtrAcctIBAN', '')}</IBAN>
+                    <IBAN>{dbtrAcctIBAN}</IBAN>
                 </Id>
             </DbtrAcct>
-            {f"<UltmtDbtr><Nm>{data.get('ultmtDbtrNm')}</Nm></UltmtDbtr>" if data.get('ultmtDbtrNm') else ""}
-
             <DbtrAgt>
                 <FinInstnId>
-                    <BICFI>{data.get('dbtrAgtBICFI', '')}</BICFI>
+                    <BICFI>{dbtrAgtBICFI}</BICFI>
                 </FinInstnId>
             </DbtrAgt>
-            <CdtrAgt>
-                <FinInstnId>
-                    <BICFI>{data.get('cdtrAgtBICFI', '')}</BICFI>
-                </FinInstnId>
-            </CdtrAgt>
-            <Cdtr>
-                <Nm>{data.get('cdtrNm', '')}</Nm>
-                <PstlAdr>
-                    <StrtNm>{data.get('cdtrStrtNm', '')}</StrtNm>
-                    <BldgNb>{data.get('cdtrBldgNb', '')}</BldgNb>
-                    <PstCd>{data.get('cdtrPstCd', '')}</PstCd>
-                    <TwnNm>{data.get('cdtrTwnNm', '')}</TwnNm>
-                    <Ctry>{data.get('cdtrCtry', '')}</Ctry>
-                </PstlAdr>
-            </Cdtr>
+            {ultmtDbtr}
+"""
 
-            {f"<UltmtCdtr><Nm>{data.get('ultmtCdtrNm')}</Nm></UltmtCdtr>" if data.get('ultmtCdtrNm') else ""}
-            <CdtrAcct>
-                <Id>
-                    <IBAN>{data.get('cdtrAcctIBAN', '')}</IBAN>
-                </Id>
-            </CdtrAcct>
-            <Purp>
-                <Cd>GDDS</Cd>
-            </Purp>
-            <RmtInf>
-                <Ustrd>{data.get('ustrdRmtInf', '')}</Ustrd>
-            </RmtInf>
-            <CdtTrfTxInf>
+# Creditor-side data belongs to each transaction; the debtor is given once per PmtInf
+PAIN001_TRANSACTION_TEMPLATE = """            <CdtTrfTxInf>
                 <PmtId>
-                    <EndToEndId>E2EID{data.get('pmtInfId', '')}</EndToEndId>
+                    <EndToEndId>{endToEndId}</EndToEndId>
                 </PmtId>
                 <PmtTpInf>
                     <InstrPrty>NORM</InstrPrty>
                 </PmtTpInf>
                 <Amt>
-                    <InstdAmt Ccy="{data.get('currency', 'EUR')}">{data.get('instdAmt', 0.00):.2f}</InstdAmt>
+                    <InstdAmt Ccy="{currency}">{instdAmt:.2f}</InstdAmt>
                 </Amt>
-                <Dbtr>
-                    <Nm>{data.get('dbtrNm', '')}</Nm>
-                </Dbtr>
-                <DbtrAcct>
-                    <Id>
-                        <IBAN>{data.get('dbtrAcctIBAN', '')}</IBAN>
-                    </Id>
-                </DbtrAcct>
-            {f"<UltmtDbtr><Nm>{data.get('ultmtDbtrNm')}</Nm></UltmtDbtr>" if data.get('ultmtDbtrNm') else ""}
-                <DbtrAgt>
-                    <FinInstnId>
-                        <BICFI>{data.get('dbtrAgtBICFI', '')}</BICFI>
-                    </FinInstnId>
-                </DbtrAgt>
                 <CdtrAgt>
                     <FinInstnId>
-                        <BICFI>{data.get('cdtrAgtBICFI', '')}</BICFI>
+                        <BICFI>{cdtrAgtBICFI}</BICFI>
                     </FinInstnId>
                 </CdtrAgt>
                 <Cdtr>
-                    <Nm>{data.get('cdtrNm', '')}</Nm>
+                    <Nm>{cdtrNm}</Nm>
+                    <PstlAdr>
+                        <StrtNm>{cdtrStrtNm}</StrtNm>
+                        <BldgNb>{cdtrBldgNb}</BldgNb>
+                        <PstCd>{cdtrPstCd}</PstCd>
+                        <TwnNm>{cdtrTwnNm}</TwnNm>
+                        <Ctry>{cdtrCtry}</Ctry>
+                    </PstlAdr>
                 </Cdtr>
-    
-            {f"<UltmtCdtr><Nm>{data.get('ultmtCdtrNm')}</Nm></UltmtCdtr>" if data.get('ultmtCdtrNm') else ""}
-            <CdtrAcct>
+                <CdtrAcct>
                     <Id>
-                        <IBAN>{data.get('cdtrAcctIBAN', '')}</IBAN>
+                        <IBAN>{cdtrAcctIBAN}</IBAN>
                     </Id>
                 </CdtrAcct>
+                {ultmtCdtr}
+                <Purp>
+                    <Cd>GDDS</Cd>
+                </Purp>
+                <RmtInf>
+                    <Ustrd>{ustrdRmtInf}</Ustrd>
+                </RmtInf>
             </CdtTrfTxInf>
-        </PmtInf>
+"""
+
+PAIN001_FOOTER_XML = """        </PmtInf>
     </CstmrCdtTrfInitn>
 </Document>
 """
+PAIN001_FOOTER_COMPACT_XML = compact_text(PAIN001_FOOTER_XML)
+
+ULTMT_DBTR_TEMPLATE = "<UltmtDbtr><Nm>{ultmtDbtrNm}</Nm></UltmtDbtr>"
+ULTMT_CDTR_TEMPLATE = "<UltmtCdtr><Nm>{ultmtCdtrNm}</Nm></UltmtCdtr>"
+INITG_PTY_TEMPLATE = "<InitgPty><Nm>{initgPtyNm}</Nm></InitgPty>"
+
+
+def _pain001_specials():
+    return {
+        'ultmtDbtr': _optional_name('ultmtDbtrNm', ULTMT_DBTR_TEMPLATE),
+        'ultmtCdtr': _optional_name('ultmtCdtrNm', ULTMT_CDTR_TEMPLATE),
+        'btchBookg': value(lambda data: str(data.get('btchBookg', False)).lower()),
+        'endToEndId': value(lambda data: data.get('endToEndId') or f"E2EID{data.get('pmtInfId', '')}"),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_pain001_templates(compact=False):
+    """Compile the pain.001 header and transaction templates (once per process and output mode)."""
+    if compact:
+        return tuple(compact_template(template) for template in get_pain001_templates())
+    resolve = _field_resolver(_pain001_specials())
+    return compile_template(PAIN001_HEADER_TEMPLATE, resolve), compile_template(PAIN001_TRANSACTION_TEMPLATE, resolve)
+
+
+@lru_cache(maxsize=None)
+def get_pain001_message_template(compact=False):
+    """Compile a complete single-transaction pain.001 message into one template."""
+    if compact:
+        return compact_template(get_pain001_message_template())
+    specials = _pain001_specials()
+    # One transaction: NbOfTxs is always 1 and CtrlSum is the instructed amount
+    specials['_nbOfTxs'] = 1
+    specials['_ctrlSum'] = field('instdAmt', 0.00)
+    return compile_template(PAIN001_HEADER_TEMPLATE + PAIN001_TRANSACTION_TEMPLATE + PAIN001_FOOTER_XML,
+                            _field_resolver(specials))
+
 
+def get_pain001_header_xml(data, nb_of_txs=1, ctrl_sum=None, compact=False):
+    """
+    Generate the pain.001 envelope, Group Header and Payment Information block
+    up to (but not including) the first CdtTrfTxInf.
 
-def is_iban_country(country_code):
+    Args:
+        data (dict): Group/payment level data, same keys as generate_pain001_xml.
+        nb_of_txs (int): Value for GrpHdr/NbOfTxs and PmtInf/NbOfTxs.
+        ctrl_sum (float): Value for PmtInf/CtrlSum. Defaults to data['instdAmt'].
+        compact (bool): Omit indentation and line breaks.
+    Returns:
+        str: XML fragment ending before the first CdtTrfTxInf.
     """
-    Check if a country code is part of the IBAN registry.
-    This is a simplified list - in production, this should be more comprehensive.
+    if ctrl_sum is None:
+        ctrl_sum = data.get('instdAmt', 0.00)
+
+    header_template = get_pain001_templates(compact)[0]
+    return header_template.render(data, {'nbOfTxs': nb_of_txs, 'ctrlSum': ctrl_sum})
+
+
+def get_pain001_transaction_xml(data, compact=False):
     """
-    iban_countries = {
-        'AD', 'AE', 'AL', 'AT', 'AZ', 'BA', 'BE', 'BG', 'BH', 'BR', 'BY', 'CH',
-        'CR', 'CY', 'CZ', 'DE', 'DK', 'DO', 'EE', 'EG', 'ES', 'FI', 'FO', 'FR',
-        'GB', 'GE', 'GI', 'GL', 'GR', 'GT', 'HR', 'HU', 'IE', 'IL', 'IS', 'IT',
-        'JO', 'KW', 'KZ', 'LB', 'LC', 'LI', 'LT', 'LU', 'LV', 'MC', 'MD', 'ME',
-        'MK', 'MR', 'MT', 'MU', 'NL', 'NO', 'PK', 'PL', 'PS', 'PT', 'QA', 'RO',
-        'RS', 'SA', 'SE', 'SI', 'SK', 'SM', 'TN', 'TR', 'UA', 'VG', 'XK'
-    }
-    return country_code.upper() in iban_countries
+    Generate a single CdtTrfTxInf block for a pain.001 message.
+
+    Args:
+        data (dict): Transaction data, same keys as generate_pain001_xml.
+        compact (bool): Omit indentation and line breaks.
+    Returns:
+        str: The CdtTrfTxInf XML fragment.
+    """
+    return get_pain001_templates(compact)[1].render(data)
+
+
+def metric_labels(message_type, channel_type=None, fedwire_type=None):
+    """Labels identifying a message variant in METRICS (channel/fedwire_type only when set)."""
+    labels = {'message': message_type}
+    if channel_type:
+        labels['channel'] = channel_type
+    if fedwire_type and channel_type == 'fedwire':
+        labels['fedwire_type'] = fedwire_type
+    return labels
+
+
+@lru_cache(maxsize=None)
+def get_render_histogram(message_type, channel_type=None, fedwire_type=None):
+    """The METRICS histogram timing single-message renders of one variant."""
+    return METRICS.histogram('render', **metric_labels(message_type, channel_type, fedwire_type))
+
+
+def generate_pain001_xml(data, compact=False):
+    """
+    Generates a pain.001 (Customer Credit Transfer Initiation) XML message.
+
+    Args:
+        data (dict): A dictionary containing the necessary data for the XML.
+                     Expected keys: msgId, creDtTm, initgPtyNm, pmtInfId, pmtMtd,
+                     btchBookg, reqdExctnDt, dbtrNm, dbtrStrtNm, dbtrBldgNb,
+                     dbtrPstCd, dbtrTwnNm, dbtrCtry, dbtrAcctIBAN, dbtrAgtBICFI,
+                     cdtrAgtBICFI, cdtrNm, cdtrStrtNm, cdtrBldgNb, cdtrPstCd,
+                     cdtrTwnNm, cdtrCtry, cdtrAcctIBAN, instdAmt, ustrdRmtInf.
+                     Optional endToEndId overrides the default E2EID + pmtInfId.
+        compact (bool): Omit indentation and line breaks (minified output).
+    Returns:
+        str: The generated pain.001 XML string.
+    """
+    started = time.perf_counter()
+    # For SEPA pain.001, IBAN is mandatory - no changes needed here
+    xml = get_pain001_message_template(compact).render(data)
+    get_render_histogram('pain001').observe(time.perf_counter() - started)
+    return xml
 
 
 def needs_exchange_rate(primary_ccy, secondary_ccy, channel_type, fedwire_type):
@@ -178,376 +268,829 @@ def get_exchange_rate_xml(exchange_rate, primary_ccy, secondary_ccy):
     return ""
 
 
-def get_account_xml(account_number, country_code, channel_type, fedwire_type, sender_country='US'):
-    """
-    Generate account XML based on payment scheme rules.
+ACCOUNT_IBAN_TEMPLATE = """<Id>
+                <IBAN>{account}</IBAN>
+            </Id>"""
 
-    Args:
-        account_number: The account number/IBAN
-        country_code: The country code for the account
-        channel_type: 'fedwire' or 'swift'
-        fedwire_type: 'domestic' or 'international' (for fedwire only)
-        sender_country: The sender country code (default 'US' for fedwire)
+ACCOUNT_OTHR_TEMPLATE = """<Id>
+                <Othr>
+                    <Id>{account}</Id>
+                </Othr>
+            </Id>"""
 
-    Returns:
-        str: XML fragment for the account
+ACCOUNT_FALLBACK_TEMPLATE = """<Id>
+        <Othr>
+            <Id>{account}</Id>
+        </Othr>
+    </Id>"""
+
+
+def get_account_template(country_code, channel_type, fedwire_type):
     """
+    Select the account template for the payment scheme rules.
 
+    Returns:
+        str: One of ACCOUNT_IBAN_TEMPLATE, ACCOUNT_OTHR_TEMPLATE or ACCOUNT_FALLBACK_TEMPLATE.
+    """
     if channel_type == 'fedwire':
         if fedwire_type == 'domestic':
             # Fedwire Domestic (US -> US): Never use IBAN, always use account number
-            return f"""<Id>
-                <Othr>
-                    <Id>{account_number}</Id>
-                </Othr>
-            </Id>"""
+            return ACCOUNT_OTHR_TEMPLATE
 
         elif fedwire_type == 'international':
             if is_iban_country(country_code):
                 # Fedwire International to IBAN country: Use IBAN
-                return f"""<Id>
-                <IBAN>{account_number}</IBAN>
-            </Id>"""
+                return ACCOUNT_IBAN_TEMPLATE
             else:
                 # Fedwire International to Non-IBAN country: Use account number
-                return f"""<Id>
-                <Othr>
-                    <Id>{account_number}</Id>
-                </Othr>
-            </Id>"""
+                return ACCOUNT_OTHR_TEMPLATE
 
     elif channel_type == 'swift':
         if is_iban_country(country_code):
             # SWIFT CBPR+ to IBAN country: Use IBAN
-            return f"""<Id>
-                <IBAN>{account_number}</IBAN>
-            </Id>"""
+            return ACCOUNT_IBAN_TEMPLATE
         else:
             # SWIFT CBPR+ to Non-IBAN country: Use account number
-            return f"""<Id>
-                <Othr>
-                    <Id>{account_number}</Id>
-                </Othr>
-            </Id>"""
+            return ACCOUNT_OTHR_TEMPLATE
 
     # Default fallback - should not reach here with proper validation
-    return f"""<Id>
-        <Othr>
-            <Id>{account_number}</Id>
-        </Othr>
-    </Id>"""
+    return ACCOUNT_FALLBACK_TEMPLATE
 
 
-def generate_pacs008_xml(data, channel_type, fedwire_type):
+def get_account_xml(account_number, country_code, channel_type, fedwire_type, sender_country='US'):
     """
-    Generates a pacs.008 (FI to FI Customer Credit Transfer) XML message.
+    Generate account XML based on payment scheme rules.
 
     Args:
-        data (dict): A dictionary containing the necessary data for the XML.
-                     Expected keys: msgId, creDtTm, intrBkSttlmDt, sttlmMtd,
-                     instgAgtBICFI/instgAgtMmbId, instdAgtBICFI/instdAgtMmbId,
-                     dbtrNm, dbtrStrtNm, dbtrBldgNb, dbtrPstCd, dbtrTwnNm,
-                     dbtrCtry, dbtrAcctIBAN, dbtrAgtBICFI_tx/dbtrAgtMmbId,
-                     cdtrAgtBICFI_tx/cdtrAgtMmbId, cdtrNm, cdtrStrtNm,
-                     cdtrBldgNb, cdtrPstCd, cdtrTwnNm, cdtrCtry, cdtrAcctIBAN,
-                     instdAmt, intrBkSttlmAmt, ustrdRmtInf, primaryCurrency,
-                     secondaryCurrency, exchangeRate, plus agent address fields.
-        channel_type (str): 'fedwire' or 'swift' to determine XML structure.
-        fedwire_type (str): 'domestic' or 'international' to apply specific Fedwire rules.
+        account_number: The account number/IBAN
+        country_code: The country code for the account
+        channel_type: 'fedwire' or 'swift'
+        fedwire_type: 'domestic' or 'international' (for fedwire only)
+        sender_country: The sender country code (default 'US' for fedwire)
+
     Returns:
-        str: The generated pacs.008 XML string.
+        str: XML fragment for the account
     """
-    msg_id = data.get('msgId', '')
-    app_hdr = ""
-    cre_dt_tm_formatted = ""
+    return get_account_template(country_code, channel_type, fedwire_type).format(account=escape_text(account_number))
 
-    # Get currency information
-    if channel_type == 'fedwire' and fedwire_type != 'international':
-        primary_ccy = 'USD'
-        secondary_ccy = 'USD'
-    else:
-        primary_ccy = data.get('primaryCurrency', 'USD')
-        secondary_ccy = data.get('secondaryCurrency', 'USD')
 
-    exchange_rate = data.get('exchangeRate')
+def _account_slot(number_key, country_key, channel_type, fedwire_type):
+    """
+    Compile the account fragment for a variant. When the variant always picks the
+    same template the slot is resolved once; otherwise the IBAN/Othr choice is
+    made per transaction from the account country, and batches render that
+    choice through their FragmentCache, keyed by the account number and country.
+    """
+    resolve = _field_resolver({'account': field(number_key)})
+    iban_source = get_account_template('DE', channel_type, fedwire_type)
+    othr_source = get_account_template('US', channel_type, fedwire_type)
+    if iban_source is othr_source:
+        # A single field: cheaper to render than to look up
+        return compile_template(iban_source, resolve).as_slot()
 
-    # Get amounts
-    settlement_amount = data.get('intrBkSttlmAmt', 0.00)
-    instructed_amount = data.get('instdAmt', 0.00)
+    return cached(('account', channel_type, fedwire_type), (number_key, country_key), Switch(
+        lambda data: data.get(country_key, 'US').upper() in IBAN_COUNTRIES, {
+            True: compile_template(iban_source, resolve),
+            False: compile_template(othr_source, resolve),
+        }))
 
-    if channel_type == 'swift':
-        cre_dt_tm_formatted = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S+00:00')
-        app_hdr = f"""<?xml version="1.0" encoding="UTF-8"?>
-    <AppHdr xmlns="urn:iso:std:iso:20022:tech:xsd:head.001.001.02">
-        <Fr>
-            <FIId>
-                <FinInstnId>
-                    <BICFI>{data.get('instgAgtBICFI', '')}</BICFI>
-                </FinInstnId>
-            </FIId>    
-        </Fr>
-        <To>
-            <FIId>
-                <FinInstnId>
-                    <BICFI>{data.get('instdAgtBICFI', '')}</BICFI>
-                </FinInstnId>
-            </FIId>    
-        </To>
-        <BizMsgIdr>{msg_id}</BizMsgIdr>
-        <MsgDefIdr>pacs.008.001.08</MsgDefIdr>
-        <BizSvc>swift.cbprplus.02</BizSvc>
-        <CreDt>{cre_dt_tm_formatted}</CreDt>
-    </AppHdr>
-    """
 
-    elif channel_type == 'fedwire':
-        cre_dt_tm_formatted = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-        app_hdr = ""
-
-    def get_agent_xml(agent_type, channel_type, fedwire_type, data):
-        """
-        Helper to generate agent XML for Debtor/Creditor Agent based on the rules.
-        If BICFI or MmbId is not present, falls back to Name and Postal Address.
-        """
-        # Determine the correct keys for the agent based on type and channel
-        if agent_type == 'DbtrAgt':
-            bicfi = data.get('dbtrAgtBICFI_tx', '')
-            mmb_id = data.get('dbtrAgtMmbId', '')
-            name = data.get('dbtrAgtNm', '')
-            street = data.get('dbtrAgtStrtNm', '')
-            bldg_nb = data.get('dbtrAgtBldgNb', '')
-            pst_cd = data.get('dbtrAgtPstCd', '')
-            twn_nm = data.get('dbtrAgtTwnNm', '')
-            ctry = data.get('dbtrAgtCtry', '')
-        elif agent_type == 'CdtrAgt' and fedwire_type == "tax":
-            mmb_id = "091036164"
-            name = "Internal Revenue Service"
-            street = "West Pershing Road"
-            bldg_nb = "333"
-            pst_cd = "64108"
-            twn_nm = "Kansas City"
-            ctry = "US"
-        else:  # CdtrAgt
-            bicfi = data.get('cdtrAgtBICFI_tx', '')
-            mmb_id = data.get('cdtrAgtMmbId', '')
-            name = data.get('cdtrAgtNm', '')
-            street = data.get('cdtrAgtStrtNm', '')
-            bldg_nb = data.get('cdtrAgtBldgNb', '')
-            pst_cd = data.get('cdtrAgtPstCd', '')
-            twn_nm = data.get('cdtrAgtTwnNm', '')
-            ctry = data.get('cdtrAgtCtry', '')
-
-        # Check for BICFI or MmbId first
-        if channel_type == 'swift' and bicfi:
-            return f"<FinInstnId><BICFI>{bicfi}</BICFI></FinInstnId>"
-
-        if channel_type == 'fedwire':
-            if fedwire_type != 'international' and mmb_id:
-                return (f"""<FinInstnId>
+AGENT_BICFI_TEMPLATE = "<FinInstnId><BICFI>{bicfi}</BICFI></FinInstnId>"
+
+AGENT_USABA_TEMPLATE = """<FinInstnId>
                     <ClrSysMmbId>
                         <ClrSysId>
                             <Cd>USABA</Cd>
                         </ClrSysId>
-                        <MmbId>{mmb_id}</MmbId>
+                        <MmbId>{mmbId}</MmbId>
                     </ClrSysMmbId>
-                    <Nm>{name}</Nm>
+                    <Nm>{nm}</Nm>
                     <PstlAdr>
-                        <StrtNm>{street}</StrtNm>
-                        <BldgNb>{bldg_nb}</BldgNb>
-                        <PstCd>{pst_cd}</PstCd>
-                        <TwnNm>{twn_nm}</TwnNm>
+                        <StrtNm>{strtNm}</StrtNm>
+                        <BldgNb>{bldgNb}</BldgNb>
+                        <PstCd>{pstCd}</PstCd>
+                        <TwnNm>{twnNm}</TwnNm>
                         <Ctry>{ctry}</Ctry>
                     </PstlAdr>
-                </FinInstnId>""")
-            if fedwire_type == 'international':
-                if agent_type == 'DbtrAgt' and mmb_id:
-                    return (f"""<FinInstnId>
+                </FinInstnId>"""
+
+AGENT_USABA_INTERNATIONAL_TEMPLATE = """<FinInstnId>
                                     <ClrSysMmbId>
                                         <ClrSysId>
                                             <Cd>USABA</Cd>
                                         </ClrSysId>
-                                        <MmbId>{mmb_id}</MmbId>
+                                        <MmbId>{mmbId}</MmbId>
                                     </ClrSysMmbId>
-                                    <Nm>{name}</Nm>
+                                    <Nm>{nm}</Nm>
                                     <PstlAdr>
-                                        <StrtNm>{street}</StrtNm>
-                                        <BldgNb>{bldg_nb}</BldgNb>
-                                        <PstCd>{pst_cd}</PstCd>
-                                        <TwnNm>{twn_nm}</TwnNm>
+                                        <StrtNm>{strtNm}</StrtNm>
+                                        <BldgNb>{bldgNb}</BldgNb>
+                                        <PstCd>{pstCd}</PstCd>
+                                        <TwnNm>{twnNm}</TwnNm>
                                         <Ctry>{ctry}</Ctry>
                                     </PstlAdr>
-                                </FinInstnId>""")
-                if agent_type == 'CdtrAgt' and bicfi:
-                    return f"<FinInstnId><BICFI>{bicfi}</BICFI></FinInstnId>"
+                                </FinInstnId>"""
 
-        return ""  # Return empty string if no valid data is available
+# Creditor Agent for Fedwire US tax payments is always the IRS
+IRS_CREDITOR_AGENT = {
+    'bicfi': '',
+    'mmbId': '091036164',
+    'nm': 'Internal Revenue Service',
+    'strtNm': 'West Pershing Road',
+    'bldgNb': '333',
+    'pstCd': '64108',
+    'twnNm': 'Kansas City',
+    'ctry': 'US',
+}
 
-    def get_inst_agent_xml(agent_type, channel_type, data):
-        """Helper to generate Instructing/Instructed Agent XML based on the channel."""
-        if channel_type == 'swift':
-            bicfi_key = 'instgAgtBICFI' if agent_type == 'InstgAgt' else 'instdAgtBICFI'
-            return f"""<FinInstnId><BICFI>{data.get(bicfi_key, '')}</BICFI></FinInstnId>"""
+AGENT_FIELD_SUFFIXES = {
+    'bicfi': 'BICFI_tx',
+    'mmbId': 'MmbId',
+    'nm': 'Nm',
+    'strtNm': 'StrtNm',
+    'bldgNb': 'BldgNb',
+    'pstCd': 'PstCd',
+    'twnNm': 'TwnNm',
+    'ctry': 'Ctry',
+}
 
-        elif channel_type == 'fedwire':
-            mmb_id_key = 'instgAgtMmbId' if agent_type == 'InstgAgt' else 'instdAgtMmbId'
-            return f"""<FinInstnId><ClrSysMmbId><ClrSysId><Cd>USABA</Cd></ClrSysId><MmbId>{data.get(mmb_id_key, '')}</MmbId></ClrSysMmbId></FinInstnId>"""
 
-    # Get account XML based on scheme rules
-    dbtr_country = data.get('dbtrCtry', 'US')
-    cdtr_country = data.get('cdtrCtry', 'US')
+def get_agent_fields(agent_type, fedwire_type):
+    """
+    Map the generic agent template fields (bicfi, mmbId, nm, ...) to their source:
+    a constant for the IRS creditor agent, otherwise a data slot such as
+    data.get('dbtrAgtNm', '').
+    """
+    if agent_type == 'CdtrAgt' and fedwire_type == "tax":
+        return dict(IRS_CREDITOR_AGENT)
+    prefix = 'dbtrAgt' if agent_type == 'DbtrAgt' else 'cdtrAgt'
+    return {name: field(prefix + suffix) for name, suffix in AGENT_FIELD_SUFFIXES.items()}
 
-    dbtr_acct_xml = get_account_xml(
-        data.get('dbtrAcctIBAN', ''),
-        dbtr_country,
-        channel_type,
-        fedwire_type
-    )
 
-    cdtr_acct_xml = get_account_xml(
-        data.get('cdtrAcctIBAN', ''),
-        cdtr_country,
-        channel_type,
-        fedwire_type
-    )
+def get_agent_template(agent_type, channel_type, fedwire_type, has_bicfi, has_mmb_id):
+    """
+    Select the agent template: BICFI first, then the USABA clearing member block
+    with name and postal address. Returns "" if no valid data is available.
+    """
+    if channel_type == 'swift' and has_bicfi:
+        return AGENT_BICFI_TEMPLATE
 
-    # Generate exchange rate XML if needed
-    exchange_rate_xml = get_exchange_rate_xml(exchange_rate, primary_ccy, secondary_ccy)
+    if channel_type == 'fedwire':
+        if fedwire_type != 'international' and has_mmb_id:
+            return AGENT_USABA_TEMPLATE
+        if fedwire_type == 'international':
+            if agent_type == 'DbtrAgt' and has_mmb_id:
+                return AGENT_USABA_INTERNATIONAL_TEMPLATE
+            if agent_type == 'CdtrAgt' and has_bicfi:
+                return AGENT_BICFI_TEMPLATE
 
-    tax_xml = ""
+    return ""
 
-    # Fedwire Domestic Tax Payment special case
-    if channel_type == "fedwire" and fedwire_type == "tax":
-        charge_bearer = "DEBT"
-        tax_year = data.get("taxYear")
-        tax_year_with_date = f"{tax_year}-12-31"
 
-        tax_xml = f"""
-                <RmtInf>
-                    <Strd>
-                        <TaxRmt>
-                            <Cdtr>
-                                <TaxId>{data.get('taxId')}</TaxId>
-                            </Cdtr>
-                            <Rcrd>
-                                <Tp>{data.get('taxType')}</Tp>
-                                <Prd>
-                                    <Yr>{tax_year_with_date}</Yr>
-                                    <Tp>{data.get('taxPeriod')}</Tp>
-                                </Prd>
-                                {f"<AddtlInf>{data.get('taxInfo')}</AddtlInf>" if data.get('taxInfo') else ""}
-                            </Rcrd>
-                        </TaxRmt>
-                    </Strd>
-                </RmtInf>
-            """
-    else:
-        tax_xml = f"""
-                <RmtInf>
-                    <Ustrd>{data.get('ustrdRmtInf', '')}</Ustrd>
-                </RmtInf>
-            """
-    # Add ChrgsInf field for CRED charge bearer
+@lru_cache(maxsize=None)
+def get_agent_slot(agent_type, channel_type, fedwire_type):
+    """
+    Compile the Debtor/Creditor Agent fragment for a variant into a constant or a
+    slot choosing between the precompiled BICFI / USABA / empty fragments. Batches
+    render the slot through their FragmentCache, keyed by the agent fields.
+    """
+    fields = get_agent_fields(agent_type, fedwire_type)
+    resolve = _field_resolver(fields)
 
-    charges_info = ""
-    charge_bearer = data.get('chrgBr', 'SHAR')
-    if charge_bearer == "CRED":
-        if channel_type == 'fedwire' and fedwire_type != 'international':
-            charges_info = f"""
-            <ChrgsInf>
-                <Amt Ccy="{secondary_ccy}">10.00</Amt>
-                <Agt>
-                    {get_agent_xml('CdtrAgt', channel_type, fedwire_type, data)}
-                </Agt>
-            </ChrgsInf>
-                """
-        else:
-            charges_info = f"""
-            <ChrgsInf>
-                <Amt Ccy="{secondary_ccy}">10.00</Amt>
-                <Agt>
-                    {get_agent_xml('CdtrAgt', channel_type, fedwire_type, data)}
-                </Agt>
-            </ChrgsInf>
-                """
+    compiled = {}
+    for has_bicfi in (False, True):
+        for has_mmb_id in (False, True):
+            source = get_agent_template(agent_type, channel_type, fedwire_type, has_bicfi, has_mmb_id)
+            compiled[has_bicfi, has_mmb_id] = compile_template(source, resolve).as_slot()
 
-    # Generate the XML content
-    xml_content = f"""{app_hdr}
+    if not callable(fields['bicfi']):
+        return compiled[bool(fields['bicfi']), bool(fields['mmbId'])]
+
+    bicfi_key, mmb_id_key = fields['bicfi'].key, fields['mmbId'].key
+    return cached((agent_type, channel_type, fedwire_type), [slot.key for slot in fields.values()],
+                  Switch(lambda data: (bool(data.get(bicfi_key)), bool(data.get(mmb_id_key))), compiled))
+
+
+INST_AGENT_BICFI_TEMPLATE = """<FinInstnId><BICFI>{bicfi}</BICFI></FinInstnId>"""
+INST_AGENT_USABA_TEMPLATE = ("""<FinInstnId><ClrSysMmbId><ClrSysId><Cd>USABA</Cd></ClrSysId>"""
+                             """<MmbId>{mmbId}</MmbId></ClrSysMmbId></FinInstnId>""")
+
+
+@lru_cache(maxsize=None)
+def get_inst_agent_slot(agent_type, channel_type):
+    """Compile the Instructing/Instructed Agent fragment for a channel."""
+    if channel_type == 'swift':
+        bicfi_key = 'instgAgtBICFI' if agent_type == 'InstgAgt' else 'instdAgtBICFI'
+        return compile_template(INST_AGENT_BICFI_TEMPLATE, _field_resolver({'bicfi': field(bicfi_key)})).as_slot()
+
+    elif channel_type == 'fedwire':
+        mmb_id_key = 'instgAgtMmbId' if agent_type == 'InstgAgt' else 'instdAgtMmbId'
+        return compile_template(INST_AGENT_USABA_TEMPLATE, _field_resolver({'mmbId': field(mmb_id_key)})).as_slot()
+
+    return ""
+
+
+def get_pacs008_currencies(data, channel_type, fedwire_type):
+    """
+    Resolve the (settlement, instructed) currency pair for a pacs.008 transaction.
+    Fedwire domestic and tax payments always settle in USD.
+    """
+    if channel_type == 'fedwire' and fedwire_type != 'international':
+        return 'USD', 'USD'
+    return data.get('primaryCurrency', 'USD'), data.get('secondaryCurrency', 'USD')
+
+
+CREATION_TIME_FORMATS = {
+    'swift': '%Y-%m-%dT%H:%M:%S+00:00',
+    'fedwire': '%Y-%m-%dT%H:%M:%SZ',
+}
+
+# channel_type -> (second, formatted timestamp); the value only changes once per second
+_creation_time_cache = {}
+
+
+def get_pacs008_creation_time(channel_type):
+    """Return the CreDtTm/CreDt value in the format expected by the channel."""
+    time_format = CREATION_TIME_FORMATS.get(channel_type)
+    if time_format is None:
+        return ""
+
+    second = int(time.time())
+    cached = _creation_time_cache.get(channel_type)
+    if cached is None or cached[0] != second:
+        cached = (second, datetime.datetime.fromtimestamp(second).strftime(time_format))
+        _creation_time_cache[channel_type] = cached
+    return cached[1]
+
+
+PACS008_APP_HDR_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+    <AppHdr xmlns="urn:iso:std:iso:20022:tech:xsd:head.001.001.02">
+        <Fr>
+            <FIId>
+                <FinInstnId>
+                    <BICFI>{instgAgtBICFI}</BICFI>
+                </FinInstnId>
+            </FIId>
+        </Fr>
+        <To>
+            <FIId>
+                <FinInstnId>
+                    <BICFI>{instdAgtBICFI}</BICFI>
+                </FinInstnId>
+            </FIId>
+        </To>
+        <BizMsgIdr>{msgId}</BizMsgIdr>
+        <MsgDefIdr>pacs.008.001.08</MsgDefIdr>
+        <BizSvc>swift.cbprplus.02</BizSvc>
+        <CreDt>{_creDtTm}</CreDt>
+    </AppHdr>
+    """
+
+PACS008_HEADER_TEMPLATE = """{appHdr}
 <Document xmlns="urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08"
     xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
     xsi:schemaLocation="urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08 pacs.008.001.08.xsd">
     <FIToFICstmrCdtTrf>
         <GrpHdr>
-            <MsgId>{data.get('msgId', '')}</MsgId>
-            <CreDtTm>{cre_dt_tm_formatted}</CreDtTm>
-            <NbOfTxs>1</NbOfTxs>
+            <MsgId>{msgId}</MsgId>
+            <CreDtTm>{_creDtTm}</CreDtTm>
+            <NbOfTxs>{_nbOfTxs}</NbOfTxs>{_ttlIntrBkSttlmAmt}
             <SttlmInf>
-                <SttlmMtd>{data.get('sttlmMtd', '')}</SttlmMtd>
-                {f"<ClrSys><Cd>{'FDW' if channel_type == 'fedwire' else 'UNKN'}</Cd></ClrSys>" if channel_type == 'fedwire' else ""}
-            </SttlmInf>            
+                <SttlmMtd>{sttlmMtd}</SttlmMtd>
+                {clrSys}
+            </SttlmInf>
         </GrpHdr>
-        <CdtTrfTxInf>
+"""
+
+PACS008_TOTAL_TEMPLATE = """
+            <TtlIntrBkSttlmAmt Ccy="{ccy}">{amount:.2f}</TtlIntrBkSttlmAmt>"""
+
+PACS008_FOOTER_XML = """    </FIToFICstmrCdtTrf>
+</Document>
+"""
+
+PACS008_TOTAL_COMPACT_TEMPLATE = compact_text(PACS008_TOTAL_TEMPLATE)
+PACS008_FOOTER_COMPACT_XML = compact_text(PACS008_FOOTER_XML)
+
+
+def _pacs008_header_specials(channel_type):
+    app_hdr = ""
+    if channel_type == 'swift':
+        app_hdr = compile_template(PACS008_APP_HDR_TEMPLATE, _field_resolver({})).as_slot()
+    return {
+        'appHdr': app_hdr,
+        'clrSys': "<ClrSys><Cd>FDW</Cd></ClrSys>" if channel_type == 'fedwire' else "",
+    }
+
+
+@lru_cache(maxsize=None)
+def get_pacs008_header_template(channel_type, compact=False):
+    """Compile the AppHdr/Document/GrpHdr template for a channel (once per process and output mode)."""
+    if compact:
+        return compact_template(get_pacs008_header_template(channel_type))
+    return compile_template(PACS008_HEADER_TEMPLATE, _field_resolver(_pacs008_header_specials(channel_type)))
+
+
+def get_pacs008_header_xml(data, channel_type, cre_dt_tm_formatted, nb_of_txs=1, total_settlement=None,
+                           compact=False):
+    """
+    Generate everything up to and including the closing GrpHdr tag: the optional
+    SWIFT AppHdr, the Document envelope and the Group Header.
+
+    Args:
+        data (dict): Group level data (msgId, sttlmMtd, instgAgtBICFI, instdAgtBICFI).
+        channel_type (str): 'fedwire' or 'swift'.
+        cre_dt_tm_formatted (str): Creation timestamp shared by AppHdr and GrpHdr.
+        nb_of_txs (int): Value for GrpHdr/NbOfTxs.
+        total_settlement (tuple): Optional (amount, currency) emitted as
+                                  GrpHdr/TtlIntrBkSttlmAmt.
+        compact (bool): Omit indentation and line breaks.
+    Returns:
+        str: XML fragment ending with the GrpHdr closing tag.
+    """
+    total_xml = ""
+    if total_settlement is not None:
+        total_amount, total_ccy = total_settlement
+        total_template = PACS008_TOTAL_COMPACT_TEMPLATE if compact else PACS008_TOTAL_TEMPLATE
+        total_xml = total_template.format(ccy=escape_attribute(total_ccy), amount=total_amount)
+
+    return get_pacs008_header_template(channel_type, compact).render(
+        data, {'creDtTm': cre_dt_tm_formatted, 'nbOfTxs': nb_of_txs, 'ttlIntrBkSttlmAmt': total_xml})
+
+
+PACS008_TRANSACTION_TEMPLATE = """        <CdtTrfTxInf>
             <PmtId>
-                <InstrId>INSTID{data.get('msgId', '')[:10]}</InstrId>
-                <EndToEndId>E2EID{data.get('msgId', '')[:10]}</EndToEndId>
-                <UETR>{str(uuid.uuid4())}</UETR>
+                <InstrId>{instrId}</InstrId>
+                <EndToEndId>{endToEndId}</EndToEndId>
+                <UETR>{uetr}</UETR>
             </PmtId>
             <PmtTpInf>
                 <SvcLvl>
                     <Cd>NURG</Cd>
                 </SvcLvl>
-                {f"<LclInstrm><Prtry>CTRC</Prtry></LclInstrm>" if channel_type == 'fedwire' else ""}
+                {lclInstrm}
             </PmtTpInf>
-            <IntrBkSttlmAmt Ccy="{primary_ccy}">{settlement_amount:.2f}</IntrBkSttlmAmt>
-            <IntrBkSttlmDt>{data.get('intrBkSttlmDt', '')}</IntrBkSttlmDt>
-            <InstdAmt Ccy="{secondary_ccy}">{instructed_amount:.2f}</InstdAmt>
-            {exchange_rate_xml}
-            <ChrgBr>{data.get('chrgBr', 'SHAR')}</ChrgBr>
-            {charges_info}
+            <IntrBkSttlmAmt Ccy="{primaryCcy}">{intrBkSttlmAmt:.2f}</IntrBkSttlmAmt>
+            <IntrBkSttlmDt>{intrBkSttlmDt}</IntrBkSttlmDt>
+            <InstdAmt Ccy="{secondaryCcy}">{instdAmt:.2f}</InstdAmt>
+            {xchgRate}
+            <ChrgBr>{chrgBr}</ChrgBr>
+            {chrgsInf}
             <InstgAgt>
-                {get_inst_agent_xml('InstgAgt', channel_type, data)}
+                {instgAgt}
             </InstgAgt>
             <InstdAgt>
-                {get_inst_agent_xml('InstdAgt', channel_type, data)}
+                {instdAgt}
             </InstdAgt>
-            {f"<UltmtDbtr><Nm>{data.get('ultmtDbtrNm')}</Nm></UltmtDbtr>" if data.get('ultmtDbtrNm') and not (
-                channel_type == 'fedwire')else ""}
-            {f"<InitgPty><Nm>{data.get('initgPtyNm')}</Nm></InitgPty>" if data.get('initgPtyNm') else ""}
+            {ultmtDbtr}
+            {initgPty}
             <Dbtr>
-                <Nm>{data.get('dbtrNm', '')}</Nm>
+                <Nm>{dbtrNm}</Nm>
                 <PstlAdr>
-                    <StrtNm>{data.get('dbtrStrtNm', '')}</StrtNm>
-                    <BldgNb>{data.get('dbtrBldgNb', '')}</BldgNb>
-                    <PstCd>{data.get('dbtrPstCd', '')}</PstCd>
-                    <TwnNm>{data.get('dbtrTwnNm', '')}</TwnNm>
-                    <Ctry>{data.get('dbtrCtry', '')}</Ctry>
+                    <StrtNm>{dbtrStrtNm}</StrtNm>
+                    <BldgNb>{dbtrBldgNb}</BldgNb>
+                    <PstCd>{dbtrPstCd}</PstCd>
+                    <TwnNm>{dbtrTwnNm}</TwnNm>
+                    <Ctry>{dbtrCtry}</Ctry>
                 </PstlAdr>
             </Dbtr>
             <DbtrAcct>
-                {dbtr_acct_xml}
+                {dbtrAcct}
             </DbtrAcct>
             <DbtrAgt>
-                {get_agent_xml('DbtrAgt', channel_type, fedwire_type, data)}
+                {dbtrAgt}
             </DbtrAgt>
             <CdtrAgt>
-                {get_agent_xml('CdtrAgt', channel_type, fedwire_type, data)}
+                {cdtrAgt}
             </CdtrAgt>
             <Cdtr>
-                <Nm>{data.get('cdtrNm', '')}</Nm>
+                <Nm>{cdtrNm}</Nm>
                 <PstlAdr>
-                    <StrtNm>{data.get('cdtrStrtNm', '')}</StrtNm>
-                    <BldgNb>{data.get('cdtrBldgNb', '')}</BldgNb>
-                    <PstCd>{data.get('cdtrPstCd', '')}</PstCd>
-                    <TwnNm>{data.get('cdtrTwnNm', '')}</TwnNm>
-                    <Ctry>{data.get('cdtrCtry', '')}</Ctry>
+                    <StrtNm>{cdtrStrtNm}</StrtNm>
+                    <BldgNb>{cdtrBldgNb}</BldgNb>
+                    <PstCd>{cdtrPstCd}</PstCd>
+                    <TwnNm>{cdtrTwnNm}</TwnNm>
+                    <Ctry>{cdtrCtry}</Ctry>
                 </PstlAdr>
-            </Cdtr>            
+            </Cdtr>
             <CdtrAcct>
-                {cdtr_acct_xml}
+                {cdtrAcct}
             </CdtrAcct>
-            {f"<UltmtCdtr><Nm>{data.get('ultmtCdtrNm')}</Nm></UltmtCdtr>" if data.get('ultmtCdtrNm') else ""}
-            {tax_xml}
+            {ultmtCdtr}
+            {rmtInf}
         </CdtTrfTxInf>
-    </FIToFICstmrCdtTrf>
-</Document>
 """
-    return xml_content
\ No newline at end of file
+
+PACS008_CHARGES_TEMPLATE = """
+            <ChrgsInf>
+                <Amt Ccy="{secondaryCcy}">10.00</Amt>
+                <Agt>
+                    {cdtrAgt}
+                </Agt>
+            </ChrgsInf>
+                """
+
+PACS008_TAX_RMT_INF_TEMPLATE = """
+                <RmtInf>
+                    <Strd>
+                        <TaxRmt>
+                            <Cdtr>
+                                <TaxId>{taxId}</TaxId>
+                            </Cdtr>
+                            <Rcrd>
+                                <Tp>{taxType}</Tp>
+                                <Prd>
+                                    <Yr>{taxYear}-12-31</Yr>
+                                    <Tp>{taxPeriod}</Tp>
+                                </Prd>
+                                {addtlInf}
+                            </Rcrd>
+                        </TaxRmt>
+                    </Strd>
+                </RmtInf>
+            """
+
+PACS008_USTRD_RMT_INF_TEMPLATE = """
+                <RmtInf>
+                    <Ustrd>{ustrdRmtInf}</Ustrd>
+                </RmtInf>
+            """
+
+
+def _pacs008_transaction_specials(channel_type, fedwire_type):
+    """
+    Resolve the CdtTrfTxInf placeholders for one (channel_type, fedwire_type) variant.
+
+    Everything fixed by the variant (currencies for Fedwire domestic/tax, the
+    local instrument, ClrSys, the IRS creditor agent, account formats) becomes
+    static text; only transaction data remains as slots.
+    """
+    if channel_type == 'fedwire' and fedwire_type != 'international':
+        primary_ccy = secondary_ccy = 'USD'
+
+        def exchange_rate_xml(data):
+            return get_exchange_rate_xml(data.get('exchangeRate'), 'USD', 'USD')
+    else:
+        primary_ccy = field('primaryCurrency', 'USD')
+        secondary_ccy = field('secondaryCurrency', 'USD')
+
+        def exchange_rate_xml(data):
+            return get_exchange_rate_xml(data.get('exchangeRate'), data.get('primaryCurrency', 'USD'),
+                                         data.get('secondaryCurrency', 'USD'))
+
+    specials = {
+        # IDs set on the transaction (see ids.IdGenerator.fill) win over the MsgId-derived defaults
+        'instrId': value(lambda data: data.get('instrId') or f"INSTID{data.get('msgId', '')[:10]}"),
+        'endToEndId': value(lambda data: data.get('endToEndId') or f"E2EID{data.get('msgId', '')[:10]}"),
+        'uetr': value(lambda data: data.get('uetr') or DEFAULT_ID_GENERATOR.uetr()),
+        'lclInstrm': "<LclInstrm><Prtry>CTRC</Prtry></LclInstrm>" if channel_type == 'fedwire' else "",
+        'primaryCcy': primary_ccy,
+        'secondaryCcy': secondary_ccy,
+        'xchgRate': exchange_rate_xml,
+        'instgAgt': get_inst_agent_slot('InstgAgt', channel_type),
+        'instdAgt': get_inst_agent_slot('InstdAgt', channel_type),
+        'ultmtDbtr': "" if channel_type == 'fedwire' else _optional_name('ultmtDbtrNm', ULTMT_DBTR_TEMPLATE),
+        'initgPty': _optional_name('initgPtyNm', INITG_PTY_TEMPLATE),
+        'ultmtCdtr': _optional_name('ultmtCdtrNm', ULTMT_CDTR_TEMPLATE),
+        'dbtrAcct': _account_slot('dbtrAcctIBAN', 'dbtrCtry', channel_type, fedwire_type),
+        'cdtrAcct': _account_slot('cdtrAcctIBAN', 'cdtrCtry', channel_type, fedwire_type),
+        'dbtrAgt': get_agent_slot('DbtrAgt', channel_type, fedwire_type),
+        'cdtrAgt': get_agent_slot('CdtrAgt', channel_type, fedwire_type),
+        'addtlInf': _optional_name('taxInfo', "<AddtlInf>{taxInfo}</AddtlInf>"),
+    }
+    for key in ('taxId', 'taxType', 'taxYear', 'taxPeriod'):
+        specials[key] = field(key, None)
+    resolve = _field_resolver(specials)
+
+    # Add ChrgsInf field for CRED charge bearer
+    specials['chrgsInf'] = optional(lambda data: data.get('chrgBr', 'SHAR') == "CRED",
+                                    compile_template(PACS008_CHARGES_TEMPLATE, resolve))
+
+    # Fedwire Domestic Tax Payment special case
+    if channel_type == "fedwire" and fedwire_type == "tax":
+        specials['rmtInf'] = compile_template(PACS008_TAX_RMT_INF_TEMPLATE, resolve).as_slot()
+    else:
+        specials['rmtInf'] = compile_template(PACS008_USTRD_RMT_INF_TEMPLATE, resolve).as_slot()
+
+    return specials
+
+
+@lru_cache(maxsize=None)
+def get_pacs008_transaction_template(channel_type, fedwire_type, compact=False):
+    """Compile the CdtTrfTxInf template for one (channel_type, fedwire_type) variant and output mode."""
+    if compact:
+        return compact_template(get_pacs008_transaction_template(channel_type, fedwire_type))
+    return compile_template(PACS008_TRANSACTION_TEMPLATE,
+                            _field_resolver(_pacs008_transaction_specials(channel_type, fedwire_type)))
+
+
+@lru_cache(maxsize=None)
+def get_pacs008_message_template(channel_type, fedwire_type, compact=False):
+    """Compile a complete single-transaction pacs.008 message for a variant into one template."""
+    if compact:
+        return compact_template(get_pacs008_message_template(channel_type, fedwire_type))
+    specials = _pacs008_header_specials(channel_type)
+    specials.update(_pacs008_transaction_specials(channel_type, fedwire_type))
+    # One transaction: NbOfTxs is always 1 and no group total is emitted
+    specials['_nbOfTxs'] = 1
+    specials['_ttlIntrBkSttlmAmt'] = ""
+    return compile_template(PACS008_HEADER_TEMPLATE + PACS008_TRANSACTION_TEMPLATE + PACS008_FOOTER_XML,
+                            _field_resolver(specials))
+
+
+def get_pacs008_transaction_xml(data, channel_type, fedwire_type, compact=False):
+    """
+    Generate a single CdtTrfTxInf block for a pacs.008 message.
+
+    Args:
+        data (dict): Transaction data, same keys as generate_pacs008_xml.
+        channel_type (str): 'fedwire' or 'swift'.
+        fedwire_type (str): 'domestic', 'international' or 'tax' (for fedwire only).
+        compact (bool): Omit indentation and line breaks.
+    Returns:
+        str: The CdtTrfTxInf XML fragment.
+    """
+    return get_pacs008_transaction_template(channel_type, fedwire_type, compact).render(data)
+
+
+def generate_pacs008_xml(data, channel_type, fedwire_type, compact=False):
+    """
+    Generates a pacs.008 (FI to FI Customer Credit Transfer) XML message.
+
+    Args:
+        data (dict): A dictionary containing the necessary data for the XML.
+                     Expected keys: msgId, creDtTm, intrBkSttlmDt, sttlmMtd,
+                     instgAgtBICFI/instgAgtMmbId, instdAgtBICFI/instdAgtMmbId,
+                     dbtrNm, dbtrStrtNm, dbtrBldgNb, dbtrPstCd, dbtrTwnNm,
+                     dbtrCtry, dbtrAcctIBAN, dbtrAgtBICFI_tx/dbtrAgtMmbId,
+                     cdtrAgtBICFI_tx/cdtrAgtMmbId, cdtrNm, cdtrStrtNm,
+                     cdtrBldgNb, cdtrPstCd, cdtrTwnNm, cdtrCtry, cdtrAcctIBAN,
+                     instdAmt, intrBkSttlmAmt, ustrdRmtInf, primaryCurrency,
+                     secondaryCurrency, exchangeRate, plus agent address fields.
+                     Optional instrId, endToEndId and uetr override the
+                     defaults (INSTID/E2EID + msgId[:10], a random UETR).
+        channel_type (str): 'fedwire' or 'swift' to determine XML structure.
+        fedwire_type (str): 'domestic' or 'international' to apply specific Fedwire rules.
+        compact (bool): Omit indentation and line breaks (minified output).
+    Returns:
+        str: The generated pacs.008 XML string.
+    """
+    started = time.perf_counter()
+    cre_dt_tm_formatted = get_pacs008_creation_time(channel_type)
+
+    # Generate the XML content
+    xml = get_pacs008_message_template(channel_type, fedwire_type, compact).render(
+        data, {'creDtTm': cre_dt_tm_formatted})
+    get_render_histogram('pacs008', channel_type, fedwire_type).observe(time.perf_counter() - started)
+    return xml
+
+
+def generate_pacs008_batch_xml(transactions, channel_type, fedwire_type, group_data=None, compact=False, ids=None):
+    """
+    Generates a single pacs.008 message carrying one CdtTrfTxInf per transaction.
+
+    The AppHdr, Document envelope and GrpHdr are rendered once and shared by all
+    transactions. NbOfTxs is the number of transactions rendered, and
+    TtlIntrBkSttlmAmt is emitted when every transaction settles in the same
+    currency (the schema does not allow a mixed-currency total).
+
+    Args:
+        transactions (iterable): Transaction dicts, same keys as generate_pacs008_xml.
+        channel_type (str): 'fedwire' or 'swift' to determine XML structure.
+        fedwire_type (str): 'domestic', 'international' or 'tax' (for fedwire only).
+        group_data (dict): Group level data (msgId, sttlmMtd, instgAgtBICFI,
+                           instdAgtBICFI). Defaults to the first transaction.
+        compact (bool): Omit indentation and line breaks (minified output).
+        ids (IdGenerator): Fills in InstrId, EndToEndId and UETR for transactions
+                           that do not carry them, unique across the batch.
+    Returns:
+        str: The generated pacs.008 XML string.
+    Raises:
+        ValueError: If transactions is empty.
+    """
+    return ''.join(iter_pacs008_xml(list(transactions), channel_type, fedwire_type, group_data, compact, ids))
+
+
+# Rendered transactions from one-shot iterators are spooled here until the
+# control totals are known; past this many characters the spool moves to disk.
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_batch_chunks(transactions, render_header, render_transaction, footer, amount_of, currency_of=None,
+                       labels=None):
+    """
+    Yield header, transaction and footer chunks for a multi-transaction message.
+
+    The group header carries control totals (NbOfTxs, CtrlSum/TtlIntrBkSttlmAmt)
+    that are only known once every transaction has been seen. Re-iterable inputs
+    (lists, tuples, ...) are walked twice: a cheap first pass sums the amounts and
+    a second pass renders. One-shot iterators are rendered once into a spool file
+    and copied out after the header, so memory stays flat either way.
+
+    render_header is called as render_header(first_data, count, total, currencies).
+    The transactions are counted in METRICS as batch_transactions with labels.
+    """
+    totals = {'first': None, 'count': 0, 'total': 0.0, 'currencies': set()}
+
+    def tally(data):
+        if totals['first'] is None:
+            totals['first'] = data
+        totals['count'] += 1
+        totals['total'] += amount_of(data)
+        if currency_of:
+            totals['currencies'].add(currency_of(data))
+
+    def header():
+        if not totals['count']:
+            raise ValueError("At least one transaction is required to generate a batch message")
+        return render_header(totals['first'], totals['count'], round(totals['total'], 2), totals['currencies'])
+
+    if iter(transactions) is not transactions:
+        for data in transactions:
+            tally(data)
+        yield header()
+        for data in transactions:
+            yield render_transaction(data)
+    else:
+        # Imported here: tempfile pulls in shutil/random and is only needed for one-shot iterators
+        import tempfile
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8') as spool:
+            for data in transactions:
+                tally(data)
+                spool.write(render_transaction(data))
+            yield header()
+            spool.seek(0)
+            while True:
+                chunk = spool.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    METRICS.increment('batch_transactions', totals['count'], **(labels or {}))
+    yield footer
+
+
+def _with_ids(render_transaction, ids):
+    """Wrap a transaction renderer so each transaction first gets its IDs from ids (if given)."""
+    if ids is None:
+        return render_transaction
+    fill = ids.fill
+    return lambda data: render_transaction(fill(data))
+
+
+def write_chunks(stream, chunks):
+    """Write str chunks to a text stream, encoding them for binary streams (gzip, sockets)."""
+    binary = not isinstance(stream, io.TextIOBase)
+    for chunk in chunks:
+        stream.write(chunk.encode('utf-8') if binary else chunk)
+
+
+# File name suffix -> compression accepted by open_output
+COMPRESSION_SUFFIXES = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compression_for_path(path):
+    """Guess the output compression from a file name: 'gzip' for .gz, 'zstd' for .zst, else None."""
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def open_output(path, compression=None):
+    """
+    Open a message file for writing, optionally compressed.
+
+    Args:
+        path (str): Output file.
+        compression (str): None (plain UTF-8 text), 'gzip' or 'zstd'. zstd uses
+                           compression.zstd (Python 3.14+) or the optional
+                           zstandard package (pip install zstandard).
+    Returns:
+        file object: A text file, or a binary stream that write_chunks,
+                     write_pacs008_xml and write_pain001_xml encode for.
+                     Close it (or use it in a with block) to flush the output.
+    """
+    if compression is None:
+        return open(path, 'w', encoding='utf-8')
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, 'wb', compresslevel=GZIP_LEVEL)
+    if compression == 'zstd':
+        try:
+            from compression import zstd
+            return zstd.open(path, 'wb', level=ZSTD_LEVEL)
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd output needs Python 3.14+ or zstandard: pip install zstandard") from None
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(open(path, 'wb'), closefd=True)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def iter_pacs008_xml(transactions, channel_type, fedwire_type, group_data=None, compact=False, ids=None,
+                     fragments=None):
+    """
+    Lazily render a multi-transaction pacs.008 message as a sequence of str chunks.
+
+    Debtor/creditor agent and account fragments are rendered through a
+    FragmentCache for the batch, so a party that repeats across transactions
+    is rendered once. Its hits and misses are counted in METRICS as
+    fragment_cache_hits / fragment_cache_misses.
+
+    Args:
+        transactions (iterable): Transaction dicts, same keys as generate_pacs008_xml.
+                                 Lists are read twice; iterators are spooled.
+        channel_type (str): 'fedwire' or 'swift' to determine XML structure.
+        fedwire_type (str): 'domestic', 'international' or 'tax' (for fedwire only).
+        group_data (dict): Group level data. Defaults to the first transaction.
+        compact (bool): Omit indentation and line breaks (minified output).
+        ids (IdGenerator): Fills in missing InstrId/EndToEndId/UETR (see ids.IdGenerator.fill).
+        fragments (FragmentCache): The batch's fragment cache. Default: a new one
+                                   for this message; pass one in to read its stats.
+    Yields:
+        str: XML chunks; the header, one chunk per CdtTrfTxInf, then the footer.
+    """
+    if fragments is None:
+        fragments = FragmentCache()
+    labels = metric_labels('pacs008', channel_type, fedwire_type)
+
+    def currency_of(data):
+        return get_pacs008_currencies(data, channel_type, fedwire_type)[0]
+
+    def render_header(first, count, total, currencies):
+        total_settlement = (total, next(iter(currencies))) if len(currencies) == 1 else None
+        return get_pacs008_header_xml(group_data or first, channel_type, get_pacs008_creation_time(channel_type),
+                                      nb_of_txs=count, total_settlement=total_settlement, compact=compact)
+
+    render = get_pacs008_transaction_template(channel_type, fedwire_type, compact).render
+    params = {'fragments': fragments}
+
+    def render_transaction(data):
+        return render(data, params)
+
+    def amount_of(data):
+        return data.get('intrBkSttlmAmt', 0.00)
+
+    hits, misses = fragments.stats['hits'], fragments.stats['misses']
+    yield from _iter_batch_chunks(transactions, render_header, _with_ids(render_transaction, ids),
+                                  PACS008_FOOTER_COMPACT_XML if compact else PACS008_FOOTER_XML, amount_of,
+                                  currency_of, labels)
+    METRICS.increment('fragment_cache_hits', fragments.stats['hits'] - hits, **labels)
+    METRICS.increment('fragment_cache_misses', fragments.stats['misses'] - misses, **labels)
+
+
+def write_pacs008_xml(stream, transactions, channel_type, fedwire_type, group_data=None, compact=False, ids=None):
+    """
+    Stream a multi-transaction pacs.008 message to a file-like object.
+
+    Text streams receive str, binary streams (gzip.open(..., 'wb'), socket.makefile('wb'))
+    receive UTF-8 bytes. See iter_pacs008_xml for the arguments.
+    """
+    with METRICS.span('write', **metric_labels('pacs008', channel_type, fedwire_type)):
+        write_chunks(stream, iter_pacs008_xml(transactions, channel_type, fedwire_type, group_data, compact, ids))
+
+
+def iter_pain001_xml(transactions, group_data=None, compact=False, ids=None):
+    """
+    Lazily render a pain.001 message with one CdtTrfTxInf per transaction.
+
+    The GrpHdr/PmtInf blocks (debtor, agents, requested execution date) come from
+    group_data, or the first transaction when omitted. PmtInf/CtrlSum is the sum
+    of every transaction's instdAmt.
+
+    Args:
+        transactions (iterable): Transaction dicts, same keys as generate_pain001_xml.
+                                 Lists are read twice; iterators are spooled.
+        group_data (dict): Group/payment level data. Defaults to the first transaction.
+        compact (bool): Omit indentation and line breaks (minified output).
+        ids (IdGenerator): Fills in a unique EndToEndId for transactions without one.
+    Yields:
+        str: XML chunks; the header, one chunk per CdtTrfTxInf, then the footer.
+    """
+    def render_header(first, count, total, currencies):
+        return get_pain001_header_xml(group_data or first, nb_of_txs=count, ctrl_sum=total, compact=compact)
+
+    def amount_of(data):
+        return data.get('instdAmt', 0.00)
+
+    return _iter_batch_chunks(transactions, render_header, _with_ids(get_pain001_templates(compact)[1].render, ids),
+                              PAIN001_FOOTER_COMPACT_XML if compact else PAIN001_FOOTER_XML, amount_of,
+                              labels=metric_labels('pain001'))
+
+
+def write_pain001_xml(stream, transactions, group_data=None, compact=False, ids=None):
+    """
+    Stream a multi-transaction pain.001 message to a file-like object.
+
+    Text streams receive str, binary streams receive UTF-8 bytes. See
+    iter_pain001_xml for the arguments.
+    """
+    with METRICS.span('write', **metric_labels('pain001')):
+        write_chunks(stream, iter_pain001_xml(transactions, group_data, compact, ids))
@@ -0,0 +1,399 @@
+"""
+Read pacs.008 / pain.001 messages back into form data.
+
+MessageReader is the inverse of xml_generator: it is fed a message in chunks
+(e.g. a file read 64 KB at a time) and hands out one dict per CdtTrfTxInf,
+keyed like the Streamlit form and the CLI input (msgId, dbtrNm, cdtrAcctIBAN,
+instdAmt, ...). Group level data (MsgId, settlement method, the pain.001
+PmtInf block) is merged into every transaction, so each dict can be passed
+straight back to generate_pacs008_xml / generate_pain001_xml or written as a
+CLI input row.
+
+Messages are parsed with the standard library's incremental XMLPullParser;
+every finished transaction is detached from the tree, so files of any size are
+read with flat memory. A SWIFT pacs.008 starts with the Business Application
+Header (AppHdr) before the Document, as generate_pacs008_xml writes it; that
+prefix is parsed on its own. The variant (channel_type, fedwire_type) is
+recognised from the content: the AppHdr means SWIFT, ClrSys FDW means Fedwire,
+a structured tax remittance means a tax payment and a creditor agent with a
+BICFI means an international one.
+
+Command line (JSONL for python -m cli, regression diffs or replay):
+    python -m xml_reader out/pacs008_batch.xml.gz -o rows.jsonl
+"""
+import argparse
+import json
+import sys
+import xml.etree.ElementTree as ET
+
+READ_SIZE = 64 * 1024
+
+# Elements whose children are read one by one; their transactions are dropped once read
+CONTAINERS = frozenset({'FIToFICstmrCdtTrf', 'CstmrCdtTrfInitn', 'PmtInf'})
+MESSAGE_TYPES = {'FIToFICstmrCdtTrf': 'pacs008', 'CstmrCdtTrfInitn': 'pain001'}
+
+ADDRESS_FIELDS = (('PstlAdr/StrtNm', 'StrtNm'), ('PstlAdr/BldgNb', 'BldgNb'), ('PstlAdr/PstCd', 'PstCd'),
+                  ('PstlAdr/TwnNm', 'TwnNm'), ('PstlAdr/Ctry', 'Ctry'))
+
+
+def _party_fields(element, prefix):
+    """Nm and postal address of a party, e.g. Dbtr/Nm -> dbtrNm."""
+    fields = {f"{element}/Nm": prefix + 'Nm'}
+    fields.update((f"{element}/{path}", prefix + suffix) for path, suffix in ADDRESS_FIELDS)
+    return fields
+
+
+def _agent_fields(element, prefix, bicfi_suffix='BICFI_tx'):
+    """BICFI or USABA member ID with name and address of a debtor/creditor agent."""
+    fields = {
+        f"{element}/FinInstnId/BICFI": prefix + bicfi_suffix,
+        f"{element}/FinInstnId/ClrSysMmbId/MmbId": prefix + 'MmbId',
+    }
+    fields.update(_party_fields(f"{element}/FinInstnId", prefix))
+    return fields
+
+
+def _account_fields(element, key):
+    return {f"{element}/Id/IBAN": key, f"{element}/Id/Othr/Id": key}
+
+
+# Element path (relative to the GrpHdr's parent / the CdtTrfTxInf) -> form data key
+PACS008_GROUP_FIELDS = {
+    'GrpHdr/MsgId': 'msgId',
+    'GrpHdr/CreDtTm': 'creDtTm',
+    'GrpHdr/SttlmInf/SttlmMtd': 'sttlmMtd',
+}
+
+PACS008_TRANSACTION_FIELDS = {
+    'PmtId/InstrId': 'instrId',
+    'PmtId/EndToEndId': 'endToEndId',
+    'PmtId/UETR': 'uetr',
+    'IntrBkSttlmAmt': 'intrBkSttlmAmt',
+    'IntrBkSttlmAmt@Ccy': 'primaryCurrency',
+    'IntrBkSttlmDt': 'intrBkSttlmDt',
+    'InstdAmt': 'instdAmt',
+    'InstdAmt@Ccy': 'secondaryCurrency',
+    'XchgRate': 'exchangeRate',
+    'ChrgBr': 'chrgBr',
+    'InstgAgt/FinInstnId/BICFI': 'instgAgtBICFI',
+    'InstgAgt/FinInstnId/ClrSysMmbId/MmbId': 'instgAgtMmbId',
+    'InstdAgt/FinInstnId/BICFI': 'instdAgtBICFI',
+    'InstdAgt/FinInstnId/ClrSysMmbId/MmbId': 'instdAgtMmbId',
+    'UltmtDbtr/Nm': 'ultmtDbtrNm',
+    'InitgPty/Nm': 'initgPtyNm',
+    **_party_fields('Dbtr', 'dbtr'),
+    **_account_fields('DbtrAcct', 'dbtrAcctIBAN'),
+    **_agent_fields('DbtrAgt', 'dbtrAgt'),
+    **_agent_fields('CdtrAgt', 'cdtrAgt'),
+    **_party_fields('Cdtr', 'cdtr'),
+    **_account_fields('CdtrAcct', 'cdtrAcctIBAN'),
+    'UltmtCdtr/Nm': 'ultmtCdtrNm',
+    'RmtInf/Ustrd': 'ustrdRmtInf',
+    'RmtInf/Strd/TaxRmt/Cdtr/TaxId': 'taxId',
+    'RmtInf/Strd/TaxRmt/Rcrd/Tp': 'taxType',
+    'RmtInf/Strd/TaxRmt/Rcrd/Prd/Yr': 'taxYear',
+    'RmtInf/Strd/TaxRmt/Rcrd/Prd/Tp': 'taxPeriod',
+    'RmtInf/Strd/TaxRmt/Rcrd/AddtlInf': 'taxInfo',
+}
+
+PAIN001_GROUP_FIELDS = {
+    'GrpHdr/MsgId': 'msgId',
+    'GrpHdr/CreDtTm': 'creDtTm',
+    'GrpHdr/InitgPty/Nm': 'initgPtyNm',
+    'PmtInfId': 'pmtInfId',
+    'PmtMtd': 'pmtMtd',
+    'BtchBookg': 'btchBookg',
+    'ReqdExctnDt': 'reqdExctnDt',
+    'ReqdExctnDt/Dt': 'reqdExctnDt',
+    **_party_fields('Dbtr', 'dbtr'),
+    **_account_fields('DbtrAcct', 'dbtrAcctIBAN'),
+    'UltmtDbtr/Nm': 'ultmtDbtrNm',
+    'DbtrAgt/FinInstnId/BICFI': 'dbtrAgtBICFI',
+    # Creditor fields at PmtInf level appear in messages written before the creditor moved into CdtTrfTxInf
+    'CdtrAgt/FinInstnId/BICFI': 'cdtrAgtBICFI',
+    **_party_fields('Cdtr', 'cdtr'),
+    'UltmtCdtr/Nm': 'ultmtCdtrNm',
+    **_account_fields('CdtrAcct', 'cdtrAcctIBAN'),
+    'RmtInf/Ustrd': 'ustrdRmtInf',
+}
+
+PAIN001_TRANSACTION_FIELDS = {
+    'PmtId/EndToEndId': 'endToEndId',
+    'Amt/InstdAmt': 'instdAmt',
+    'Amt/InstdAmt@Ccy': 'currency',
+    'CdtrAgt/FinInstnId/BICFI': 'cdtrAgtBICFI',
+    **_party_fields('Cdtr', 'cdtr'),
+    **_account_fields('CdtrAcct', 'cdtrAcctIBAN'),
+    'UltmtCdtr/Nm': 'ultmtCdtrNm',
+    'RmtInf/Ustrd': 'ustrdRmtInf',
+}
+
+APP_HDR_FIELDS = {
+    'Fr/FIId/FinInstnId/BICFI': 'instgAgtBICFI',
+    'To/FIId/FinInstnId/BICFI': 'instdAgtBICFI',
+    'BizMsgIdr': 'msgId',
+}
+
+# Value types the generators expect (see cli.prepare_row)
+CONVERSIONS = {
+    'intrBkSttlmAmt': float,
+    'instdAmt': float,
+    'exchangeRate': float,
+    'btchBookg': lambda value: value.lower() == 'true',
+    # <Yr> is an ISODate (2024-12-31); the form keeps the year only
+    'taxYear': lambda value: value[:4],
+}
+
+
+def _defaults(*field_tables):
+    """Every key of the tables, empty, so each dict has the full form data schema."""
+    defaults = {key: '' for table in field_tables for key in table.values()}
+    defaults.update({key: 0.0 for key in ('instdAmt', 'intrBkSttlmAmt') if key in defaults})
+    if 'exchangeRate' in defaults:
+        defaults['exchangeRate'] = None
+    return defaults
+
+
+PACS008_DEFAULTS = _defaults(APP_HDR_FIELDS, PACS008_GROUP_FIELDS, PACS008_TRANSACTION_FIELDS)
+PAIN001_DEFAULTS = _defaults(PAIN001_GROUP_FIELDS, PAIN001_TRANSACTION_FIELDS)
+
+
+_LOCAL_NAMES = {}
+
+
+def _local_name(tag):
+    """Tag without its {namespace}; memoised, the same few dozen tags repeat in every transaction."""
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = _LOCAL_NAMES[tag] = tag.rpartition('}')[2]
+    return name
+
+
+def flatten(element, path='', out=None):
+    """
+    Flatten an element's subtree into {path: text}: 'Dbtr/PstlAdr/TwnNm' for
+    leaf text and 'InstdAmt@Ccy' for attributes. path is the element's own path.
+    """
+    if out is None:
+        out = {}
+    for name, value in element.attrib.items():
+        out[f"{path}@{name}"] = value
+    children = list(element)
+    if not children:
+        out[path] = (element.text or '').strip()
+    for child in children:
+        tag = _local_name(child.tag)
+        flatten(child, f"{path}/{tag}" if path else tag, out)
+    return out
+
+
+def map_fields(flat, fields, data):
+    """Copy the mapped values of a flattened subtree into data, converted to the form's types."""
+    for path, value in flat.items():
+        key = fields.get(path)
+        if key is not None:
+            convert = CONVERSIONS.get(key)
+            data[key] = convert(value) if convert and value else value
+    return data
+
+
+class MessageReader:
+    """
+    Incremental reader for one pacs.008 or pain.001 message.
+
+    Usage:
+        reader = MessageReader()
+        for chunk in chunks:
+            for data in reader.feed(chunk):
+                ...
+        for data in reader.close():
+            ...
+
+    After the first transaction, message_type ('pacs008' / 'pain001'),
+    channel_type and fedwire_type describe the message, and group holds its
+    group level fields.
+    """
+
+    def __init__(self):
+        self.message_type = None
+        self.channel_type = None
+        self.fedwire_type = None
+        self.group = {}
+        self.transactions = 0
+        self._prefix = b''
+        self._parser = None
+        self._stack = []
+        self._clearing_system = None
+
+    def feed(self, chunk):
+        """
+        Read the next piece of the message (str or UTF-8 bytes).
+
+        Returns:
+            list: The transactions completed by this chunk, as form data dicts.
+        Raises:
+            xml.etree.ElementTree.ParseError: If the message is not well-formed.
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+
+        if self._parser is None:
+            # Hold back the text before <Document>: the XML declaration and the optional AppHdr
+            self._prefix += chunk
+            start = self._prefix.find(b'<Document')
+            if start < 0:
+                return []
+            self._read_app_header(self._prefix[:start])
+            chunk, self._prefix = self._prefix[start:], b''
+            self._parser = ET.XMLPullParser(events=('start', 'end'))
+
+        self._parser.feed(chunk)
+        return self._read_events()
+
+    def close(self):
+        """
+        Finish the message.
+
+        Returns:
+            list: The remaining transactions.
+        Raises:
+            xml.etree.ElementTree.ParseError: If the message is incomplete.
+            ValueError: If there is no <Document> element.
+        """
+        if self._parser is None:
+            raise ValueError("No <Document> element found")
+        self._parser.close()
+        return self._read_events()
+
+    def _read_app_header(self, text):
+        text = text.strip()
+        if b'<AppHdr' not in text:
+            return
+        self.channel_type = 'swift'
+        map_fields(flatten(ET.fromstring(text)), APP_HDR_FIELDS, self.group)
+
+    def _read_events(self):
+        transactions = []
+        stack = self._stack
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                stack.append(element)
+                if len(stack) == 2:
+                    self.message_type = MESSAGE_TYPES.get(_local_name(element.tag))
+                    if self.message_type is None:
+                        raise ValueError(f"Not a pacs.008 or pain.001 message: {_local_name(element.tag)}")
+                continue
+
+            stack.pop()
+            # Only children of the message element (depth 2) or of a PmtInf (depth 3) are read
+            if not 2 <= len(stack) <= 3 or _local_name(stack[-1].tag) not in CONTAINERS:
+                continue
+            tag = _local_name(element.tag)
+            if tag == 'CdtTrfTxInf':
+                transactions.append(self._transaction(flatten(element)))
+            elif tag != 'PmtInf':
+                self._group_element(tag, element)
+            # Detach what has been read so memory does not grow with the message
+            stack[-1].remove(element)
+        return transactions
+
+    def _group_element(self, tag, element):
+        """A GrpHdr, or one of the pain.001 PmtInf fields before the first transaction."""
+        flat = flatten(element, tag)
+        self._clearing_system = flat.get('GrpHdr/SttlmInf/ClrSys/Cd', self._clearing_system)
+        group_fields = PACS008_GROUP_FIELDS if self.message_type == 'pacs008' else PAIN001_GROUP_FIELDS
+        map_fields(flat, group_fields, self.group)
+
+    def _transaction(self, flat):
+        self.transactions += 1
+        if self.message_type == 'pain001':
+            data = dict(PAIN001_DEFAULTS)
+            data.update(self.group)
+            return map_fields(flat, PAIN001_TRANSACTION_FIELDS, data)
+
+        data = dict(PACS008_DEFAULTS)
+        data.update(self.group)
+        map_fields(flat, PACS008_TRANSACTION_FIELDS, data)
+        if self.channel_type is None:
+            fedwire = self._clearing_system == 'FDW' or flat.get('PmtTpInf/LclInstrm/Prtry') == 'CTRC'
+            self.channel_type = 'fedwire' if fedwire else 'swift'
+        if self.channel_type == 'fedwire' and self.fedwire_type is None:
+            if 'RmtInf/Strd/TaxRmt/Cdtr/TaxId' in flat:
+                self.fedwire_type = 'tax'
+            elif 'CdtrAgt/FinInstnId/BICFI' in flat:
+                self.fedwire_type = 'international'
+            else:
+                self.fedwire_type = 'domestic'
+        return data
+
+
+def iter_transactions(chunks, reader=None):
+    """
+    Lazily read the transactions of a message given as str/bytes chunks.
+
+    Args:
+        chunks (iterable): The message, e.g. the output of xml_generator.iter_pacs008_xml.
+        reader (MessageReader): Pass one in to inspect message_type, channel_type,
+                                fedwire_type and group while or after reading.
+    Yields:
+        dict: One form data dict per CdtTrfTxInf.
+    """
+    if reader is None:
+        reader = MessageReader()
+    for chunk in chunks:
+        yield from reader.feed(chunk)
+    yield from reader.close()
+
+
+def read_message(xml):
+    """Read a complete message (str or bytes). Returns the list of transaction dicts."""
+    return list(iter_transactions((xml,)))
+
+
+def open_input(path):
+    """Open a message file for binary reading; .gz and .zst files are decompressed."""
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        try:
+            from compression import zstd
+            return zstd.open(path, 'rb')
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading .zst files needs Python 3.14+ or zstandard: pip install zstandard") from None
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def iter_file(path, reader=None):
+    """Lazily read the transactions of a message file (see iter_transactions), 64 KB at a time."""
+    with open_input(path) as f:
+        yield from iter_transactions(iter(lambda: f.read(READ_SIZE), b''), reader)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m xml_reader',
+                                     description='Read pacs.008 / pain.001 messages back into JSONL form data rows.')
+    parser.add_argument('inputs', nargs='+', help='Message files (.xml, .xml.gz, .xml.zst)')
+    parser.add_argument('-o', '--output', default='-', help="Output JSONL file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        for path in args.inputs:
+            reader = MessageReader()
+            for data in iter_file(path, reader):
+                out.write(json.dumps(data, separators=(',', ':')) + '\n')
+            print(f"{path}: {reader.transactions} {reader.message_type} transaction(s), "
+                  f"{reader.channel_type or '-'}/{reader.fedwire_type or '-'}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()